@@ -1,4 +1,5 @@
 from django.contrib import admin
+from django.utils import timezone
 
 from mooringlicensing.components.approvals import models
 from mooringlicensing.ledger_api_utils import retrieve_email_userro
@@ -57,4 +58,34 @@ class MooringOnApprovalAdmin(admin.ModelAdmin):
         return False
     
     def has_delete_permission(self, request, obj=None):
-        return False
\ No newline at end of file
+        return False
+
+@admin.register(models.MooringBookingsExport)
+class MooringBookingsExportAdmin(admin.ModelAdmin):
+    list_display = ['id', 'approval', 'vessel_rego', 'status', 'attempts', 'next_attempt_at', 'date_sent', 'last_error',]
+    search_fields = ['approval__lodgement_number', 'vessel_rego',]
+    readonly_fields = ['approval', 'vessel',]
+    list_filter = ['status',]
+    ordering = ['-id', ]
+    actions = ['retry']
+
+    @admin.action(description='Retry the selected updates now')
+    def retry(self, request, queryset):
+        queryset.exclude(status=models.MooringBookingsExport.STATUS_SENT).update(
+            status=models.MooringBookingsExport.STATUS_PENDING, attempts=0, next_attempt_at=timezone.now(),
+        )
+
+@admin.register(models.ApprovalStatusTransition)
+class ApprovalStatusTransitionAdmin(admin.ModelAdmin):
+    list_display = ['id', 'approval', 'transition', 'from_status', 'to_status', 'status', 'attempts', 'date_created', 'date_processed', 'last_error',]
+    search_fields = ['approval__lodgement_number',]
+    readonly_fields = ['approval',]
+    list_filter = ['status', 'transition',]
+    ordering = ['-id', ]
+    actions = ['retry']
+
+    @admin.action(description='Retry the selected status changes on the next run')
+    def retry(self, request, queryset):
+        queryset.filter(status=models.ApprovalStatusTransition.STATUS_FAILED).update(
+            status=models.ApprovalStatusTransition.STATUS_PENDING, attempts=0,
+        )
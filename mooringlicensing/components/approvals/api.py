@@ -43,7 +43,8 @@ from mooringlicensing.components.approvals.models import (
     Approval,
     DcvPermit, DcvOrganisation, DcvVessel, DcvAdmission, DcvAdmissionArrival, AdmissionType, AgeGroup,
     WaitingListAllocation, Sticker, MooringLicence,AuthorisedUserPermit, AnnualAdmissionPermit,
-    MooringOnApproval, VesselOwnershipOnApproval, ApprovalUserAction, StickerActionDetail
+    MooringOnApproval, ApprovalUserAction, StickerActionDetail,
+    ApprovalSearchDocument, StickerSearchDocument,
 )
 from mooringlicensing.components.approvals.utils import get_wla_allowed
 from mooringlicensing.components.main.process_document import (
@@ -307,24 +308,8 @@ class ApprovalFilterBackend(DatatablesFilterBackend):
             # Custom search
             search_text= request.data.get('search[value]')  # This has a search term.
             if search_text:
-                # User can search by a fullname, too
-                system_user_ids = list(SystemUser.objects.annotate(full_name=Concat('legal_first_name',Value(" "),'legal_last_name',output_field=CharField()))
-                .filter(
-                    Q(legal_first_name__icontains=search_text) | Q(legal_last_name__icontains=search_text) | Q(email__icontains=search_text) | Q(full_name__icontains=search_text)
-                ).values_list("ledger_id", flat=True))
-
-                proposal_applicant_proposals = list(ProposalApplicant.objects.annotate(full_name=Concat('first_name',Value(" "),'last_name',output_field=CharField()))
-                .filter(
-                    Q(first_name__icontains=search_text) | Q(last_name__icontains=search_text) | Q(email__icontains=search_text) | Q(full_name__icontains=search_text)
-                ).values_list("proposal_id", flat=True))
-
-                #Search by vessel registration
-                queryset = queryset.filter(
-                    Q(current_proposal__id__in=proposal_applicant_proposals)|
-                    Q(current_proposal__submitter__in=system_user_ids)|
-                    Q(id__in=VesselOwnershipOnApproval.objects.filter(vessel_ownership__vessel__rego_no__icontains=search_text).values_list('approval__id', flat=True))|
-                    Q(current_proposal__vessel_details__vessel__rego_no__icontains=search_text)
-                )
+                # User can search by a fullname and by vessel registration, too
+                queryset = queryset.filter(id__in=ApprovalSearchDocument.search(search_text).values('approval_id'))
 
                 queryset = queryset.distinct() | super_queryset 
         except Exception as e:
@@ -428,6 +413,8 @@ class ApprovalPaginatedViewSet(viewsets.ReadOnlyModelViewSet):
         queryset = self.filter_queryset(queryset)
         setattr(self, '_datatables_total_count', total_count)
 
+        # The sticker and mooring details are read from the summary stored for each approval
+        queryset = queryset.select_related('list_summary')
         page = self.paginate_queryset(queryset)
         if page is not None:
             serializer = self.get_serializer(page, many=True)
@@ -1842,18 +1829,7 @@ class StickerFilterBackend(DatatablesFilterBackend):
             super_queryset = super(StickerFilterBackend, self).filter_queryset(request, queryset, view)
 
             if search_text:
-
-                system_user_ids = list(SystemUser.objects.annotate(full_name=Concat('legal_first_name',Value(" "),'legal_last_name',output_field=CharField()))
-                .filter(
-                    Q(legal_first_name__icontains=search_text) | Q(legal_last_name__icontains=search_text) | Q(email__icontains=search_text) | Q(full_name__icontains=search_text)
-                ).values_list("ledger_id", flat=True))
-
-                proposal_applicant_proposals = list(ProposalApplicant.objects.annotate(full_name=Concat('first_name',Value(" "),'last_name',output_field=CharField()))
-                .filter(
-                    Q(first_name__icontains=search_text) | Q(last_name__icontains=search_text) | Q(email__icontains=search_text) | Q(full_name__icontains=search_text)
-                ).values_list("proposal_id", flat=True))
-
-                q_set = queryset.filter(Q(approval__current_proposal__id__in=proposal_applicant_proposals)|Q(approval__submitter__in=system_user_ids)|Q(vessel_ownership__vessel__rego_no__icontains=search_text))
+                q_set = queryset.filter(id__in=StickerSearchDocument.search(search_text).values('sticker_id'))
                 queryset = super_queryset.union(q_set)
         except Exception as e:
             print(e)
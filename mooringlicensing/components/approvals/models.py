@@ -14,6 +14,7 @@ from django.db.models.signals import pre_delete
 from django.db.models import Count
 from django.core.exceptions import ValidationError, ObjectDoesNotExist
 from django.db.models import JSONField
+from django.contrib.postgres.indexes import GinIndex
 from django.utils import timezone
 from django.conf import settings
 from django.db.models import Q
@@ -35,7 +36,7 @@ from mooringlicensing.components.proposals.models import (
 )
 from mooringlicensing.components.main.models import (
     CommunicationsLogEntry, UserAction, Document,
-    GlobalSettings, RevisionedMixin, ApplicationType, SanitiseMixin
+    GlobalSettings, RevisionedMixin, ApplicationType, SanitiseMixin, NumberSequence, SearchDocument
 )
 from mooringlicensing.components.approvals.email import (
     send_approval_expire_email_notification,
@@ -47,7 +48,7 @@ from mooringlicensing.components.approvals.email import (
     send_swap_moorings_application_created_notification,
 )
 from mooringlicensing.settings import PROPOSAL_TYPE_RENEWAL, PROPOSAL_TYPE_AMENDMENT, PROPOSAL_TYPE_NEW
-from ledger_api_client.utils import calculate_excl_gst, get_invoice_properties
+from ledger_api_client.utils import calculate_excl_gst
 
 from django.core.files.storage import FileSystemStorage
 
@@ -266,6 +267,8 @@ class ApprovalHistory(RevisionedMixin):
 
 
 class Approval(RevisionedMixin):
+    LODGEMENT_NUMBER_SEQUENCE = 'approval'
+
     APPROVAL_STATUS_CURRENT = 'current'
     APPROVAL_STATUS_EXPIRED = 'expired'
     APPROVAL_STATUS_CANCELLED = 'cancelled'
@@ -340,6 +343,11 @@ class Approval(RevisionedMixin):
         app_label = 'mooringlicensing'
         unique_together = ('lodgement_number', 'issue_date')
         ordering = ['-id',]
+        indexes = [
+            # The approvals due for a status change, see update_approval_status
+            models.Index(fields=['status', 'expiry_date'], name='approval_status_expiry_idx'),
+            models.Index(fields=['status'], name='approval_scheduled_change_idx', condition=Q(set_to_suspend=True) | Q(set_to_cancel=True) | Q(set_to_surrender=True)),
+        ]
 
     @property
     def grace_period_end_date(self):
@@ -680,11 +688,17 @@ class Approval(RevisionedMixin):
     def title(self):
         return self.current_proposal.title
 
-    @property
-    def next_id(self):
+    @staticmethod
+    def get_max_lodgement_id():
+        # All the approval types share one number sequence regardless of the prefix
         ids = map(int, [re.sub('^[A-Za-z]*', '', i) for i in Approval.objects.all().values_list('lodgement_number', flat=True) if i])
         ids = list(ids)
-        return max(ids) + 1 if ids else 1
+        return max(ids) if ids else 0
+
+    @classmethod
+    def get_next_id(cls):
+        # Each call consumes a number of the sequence
+        return NumberSequence.next_value(Approval.LODGEMENT_NUMBER_SEQUENCE, Approval.get_max_lodgement_id)
 
     def save(self, *args, **kwargs):
         kwargs.pop('version_user', None)
@@ -913,30 +927,34 @@ class Approval(RevisionedMixin):
                 if self.status == Approval.APPROVAL_STATUS_CURRENT and self.expiry_date < today:
                     self.status = Approval.APPROVAL_STATUS_EXPIRED
                     self.save()
-                    #expire any associated sticker
-                    do_not_expire = [Sticker.STICKER_STATUS_EXPIRED,Sticker.STICKER_STATUS_CANCELLED,Sticker.STICKER_STATUS_RETURNED,Sticker.STICKER_STATUS_LOST]
-                    stickers = Sticker.objects.filter(approval=self).exclude(status__in=do_not_expire)
 
                     send_approval_expire_email_notification(self)
                     proposal = self.current_proposal
                     ApprovalUserAction.log_action(self, ApprovalUserAction.ACTION_EXPIRE_APPROVAL.format(self.id), user)
                     ProposalUserAction.log_action(proposal, ProposalUserAction.ACTION_EXPIRED_APPROVAL_.format(proposal.id), user)
 
-                    for sticker in stickers:
-                        if sticker.status in [Sticker.STICKER_STATUS_NOT_READY_YET, Sticker.STICKER_STATUS_READY, Sticker.STICKER_STATUS_CANCELLED]:
-                            sticker.status = Sticker.STICKER_STATUS_CANCELLED
-                        else:
-                            sticker.status = Sticker.STICKER_STATUS_EXPIRED
-                        sticker.save()
-                        logger.info(f'Status: [{sticker.status}] has been set to the sticker: [{sticker}]')
-
-                    #NOTE: post-cancel and post-expiry functionality identitical for these license types
-                    if (type(self.child_obj) == MooringLicence or 
-                        type(self.child_obj) == AuthorisedUserPermit):
-                        self.child_obj.processes_after_cancel()
+                    self.processes_after_expiry()
             except:
                 raise
 
+    def processes_after_expiry(self):
+        #expire any associated sticker
+        do_not_expire = [Sticker.STICKER_STATUS_EXPIRED,Sticker.STICKER_STATUS_CANCELLED,Sticker.STICKER_STATUS_RETURNED,Sticker.STICKER_STATUS_LOST]
+        stickers = Sticker.objects.filter(approval=self).exclude(status__in=do_not_expire)
+
+        for sticker in stickers:
+            if sticker.status in [Sticker.STICKER_STATUS_NOT_READY_YET, Sticker.STICKER_STATUS_READY, Sticker.STICKER_STATUS_CANCELLED]:
+                sticker.status = Sticker.STICKER_STATUS_CANCELLED
+            else:
+                sticker.status = Sticker.STICKER_STATUS_EXPIRED
+            sticker.save()
+            logger.info(f'Status: [{sticker.status}] has been set to the sticker: [{sticker}]')
+
+        #NOTE: post-cancel and post-expiry functionality identitical for these license types
+        if (type(self.child_obj) == MooringLicence or 
+            type(self.child_obj) == AuthorisedUserPermit):
+            self.child_obj.processes_after_cancel()
+
     def approval_cancellation(self, request, details):
         logger.debug(f'in approval_cancellation().  self: [{self}] details: [{details}]')
         with transaction.atomic():
@@ -1448,7 +1466,7 @@ class WaitingListAllocation(Approval):
 
     def save(self, *args, **kwargs):
         if self.lodgement_number == '':
-            self.lodgement_number = self.prefix + '{0:06d}'.format(self.next_id)
+            self.lodgement_number = self.prefix + '{0:06d}'.format(self.get_next_id())
         kwargs.pop('version_user', None)
         kwargs.pop('version_comment', None)
         #kwargs['no_revision'] = True
@@ -1569,7 +1587,7 @@ class AnnualAdmissionPermit(Approval):
 
     def save(self, *args, **kwargs):
         if self.lodgement_number == '':
-            self.lodgement_number = self.prefix + '{0:06d}'.format(self.next_id)
+            self.lodgement_number = self.prefix + '{0:06d}'.format(self.get_next_id())
         kwargs.pop('version_user', None)
         kwargs.pop('version_comment', None)
         #kwargs['no_revision'] = True
@@ -1815,7 +1833,7 @@ class AuthorisedUserPermit(Approval):
 
     def save(self, *args, **kwargs):
         if self.lodgement_number == '':
-            self.lodgement_number = self.prefix + '{0:06d}'.format(self.next_id)
+            self.lodgement_number = self.prefix + '{0:06d}'.format(self.get_next_id())
         kwargs.pop('version_user', None)
         kwargs.pop('version_comment', None)
         #kwargs['no_revision'] = True
@@ -2389,7 +2407,7 @@ class MooringLicence(Approval):
 
     def save(self, *args, **kwargs):
         if self.lodgement_number == '':
-            self.lodgement_number = self.prefix + '{0:06d}'.format(self.next_id)
+            self.lodgement_number = self.prefix + '{0:06d}'.format(self.get_next_id())
         kwargs.pop('version_user', None)
         kwargs.pop('version_comment', None)
         #kwargs['no_revision'] = True
@@ -3200,6 +3218,10 @@ class DcvAdmission(RevisionedMixin):
 
     class Meta:
         app_label = 'mooringlicensing'
+        indexes = [
+            # The invoice properties refreshed are written back to the records holding the invoices
+            GinIndex(fields=['invoice_property_cache'], name='dcvadmission_invoice_props_gin'),
+        ]
 
     @property
     def submitter_obj(self):
@@ -3220,24 +3242,16 @@ class DcvAdmission(RevisionedMixin):
         return Invoice.objects.filter(reference__in=invoice_references)
 
     def get_invoice_property_cache(self):
-        if len(self.invoice_property_cache) == 0:
-            self.update_invoice_property_cache()
-        return self.invoice_property_cache
-    
+        from mooringlicensing.components.payments_ml.utils import read_invoice_property_cache
+        return read_invoice_property_cache(self, self.invoices_display)
+
     def update_invoice_property_cache(self, save=True):
-        for inv in self.invoices_display():
-            inv_props = ledger_api_client.utils.get_invoice_properties(inv.id)
-
-            self.invoice_property_cache[inv.id] = {
-                'payment_status': inv_props['data']['invoice']['payment_status'],
-                'reference': inv_props['data']['invoice']['reference'],
-                'amount': inv_props['data']['invoice']['amount'],
-                'settlement_date': inv_props['data']['invoice']['settlement_date'],
-            }
-            
-        if save:
-           self.save()
-        return self.invoice_property_cache
+        from mooringlicensing.components.payments_ml.utils import sync_invoice_property_cache
+        return sync_invoice_property_cache(self, self.invoices_display(), save=save)
+
+    def mark_invoice_property_cache_stale(self):
+        from mooringlicensing.components.payments_ml.utils import mark_invoice_property_cache_stale
+        mark_invoice_property_cache_stale(self, self.invoices_display())
 
     @property
     def fee_paid(self):
@@ -3258,16 +3272,20 @@ class DcvAdmission(RevisionedMixin):
         return invoice
 
     @classmethod
-    def get_next_id(cls):
+    def get_max_lodgement_id(cls):
         ids = map(int, [i.split(cls.LODGEMENT_NUMBER_PREFIX)[1] for i in cls.objects.all().values_list('lodgement_number', flat=True) if i])
         ids = list(ids)
-        return max(ids) + 1 if len(ids) else 1
+        return max(ids) if len(ids) else 0
+
+    @classmethod
+    def get_next_id(cls):
+        return NumberSequence.next_value(cls.LODGEMENT_NUMBER_PREFIX, cls.get_max_lodgement_id)
 
     def save(self, **kwargs):
         if self.lodgement_number in ['', None]:
             self.lodgement_number = self.LODGEMENT_NUMBER_PREFIX + '{0:06d}'.format(self.get_next_id())
         if self.pk:
-            self.update_invoice_property_cache(save=False)
+            self.mark_invoice_property_cache_stale()
         super(DcvAdmission, self).save(**kwargs)
 
     def generate_dcv_admission_doc(self):
@@ -3605,24 +3623,16 @@ class DcvPermit(RevisionedMixin):
         return Invoice.objects.filter(reference__in=invoice_references)
 
     def get_invoice_property_cache(self):
-        if len(self.invoice_property_cache) == 0:
-            self.update_invoice_property_cache()
-        return self.invoice_property_cache
-    
+        from mooringlicensing.components.payments_ml.utils import read_invoice_property_cache
+        return read_invoice_property_cache(self, self.invoices_display)
+
     def update_invoice_property_cache(self, save=True):
-        for inv in self.invoices_display():
-            inv_props = ledger_api_client.utils.get_invoice_properties(inv.id)
-
-            self.invoice_property_cache[inv.id] = {
-                'payment_status': inv_props['data']['invoice']['payment_status'],
-                'reference': inv_props['data']['invoice']['reference'],
-                'amount': inv_props['data']['invoice']['amount'],
-                'settlement_date': inv_props['data']['invoice']['settlement_date'],
-            }
-            
-        if save:
-           self.save()
-        return self.invoice_property_cache
+        from mooringlicensing.components.payments_ml.utils import sync_invoice_property_cache
+        return sync_invoice_property_cache(self, self.invoices_display(), save=save)
+
+    def mark_invoice_property_cache_stale(self):
+        from mooringlicensing.components.payments_ml.utils import mark_invoice_property_cache_stale
+        mark_invoice_property_cache_stale(self, self.invoices_display())
 
     @property
     def fee_paid(self):
@@ -3646,10 +3656,14 @@ class DcvPermit(RevisionedMixin):
         return invoice
 
     @classmethod
-    def get_next_id(cls):
+    def get_max_lodgement_id(cls):
         ids = map(int, [i.split(cls.LODGEMENT_NUMBER_PREFIX)[1] for i in cls.objects.all().values_list('lodgement_number', flat=True) if i])
         ids = list(ids)
-        return max(ids) + 1 if len(ids) else 1
+        return max(ids) if len(ids) else 0
+
+    @classmethod
+    def get_next_id(cls):
+        return NumberSequence.next_value(cls.LODGEMENT_NUMBER_PREFIX, cls.get_max_lodgement_id)
 
     def save(self, **kwargs):
         logger.info(f"Saving DcvPermit: {self}...")
@@ -3658,7 +3672,7 @@ class DcvPermit(RevisionedMixin):
             logger.info(f'DcvPermit: [{self}] has no lodgement number.')
             self.lodgement_number = self.LODGEMENT_NUMBER_PREFIX + '{0:06d}'.format(self.get_next_id())
         if self.pk:
-            self.update_invoice_property_cache(save=False)
+            self.mark_invoice_property_cache_stale()
         super(DcvPermit, self).save(**kwargs)
         logger.info(f"DcvPermit: [{self}] has been updated with the lodgement_number: [{self.lodgement_number}].")
 
@@ -3671,6 +3685,9 @@ class DcvPermit(RevisionedMixin):
 
     class Meta:
         app_label = 'mooringlicensing'
+        indexes = [
+            GinIndex(fields=['invoice_property_cache'], name='dcvpermit_invoice_props_gin'),
+        ]
 
     def __str__(self):
         lodgement_number = '---'
@@ -3741,6 +3758,8 @@ class DcvPermitDocument(Document):
 
 
 class Sticker(RevisionedMixin):
+    NUMBER_SEQUENCE = 'sticker'
+
     STICKER_STATUS_NOT_READY_YET = 'not_ready_yet'  # This status is assigned to the new replacement sticker.  Once the old sticker is returned, the status changes to STICKER_STATUS_READY.
     STICKER_STATUS_READY = 'ready'  # This status is assigned to the new sticker.  Cron job picks up the sticker with this status and process it.
     STICKER_STATUS_AWAITING_PRINTING = 'awaiting_printing'
@@ -3838,27 +3857,22 @@ class Sticker(RevisionedMixin):
     class Meta:
         app_label = 'mooringlicensing'
         ordering = ['-date_updated', '-date_created', '-number',]
+        indexes = [
+            GinIndex(fields=['invoice_property_cache'], name='sticker_invoice_props_gin'),
+        ]
 
 
     def get_invoice_property_cache(self):
-        if len(self.invoice_property_cache) == 0:
-            self.update_invoice_property_cache()
-        return self.invoice_property_cache
-    
+        from mooringlicensing.components.payments_ml.utils import read_invoice_property_cache
+        return read_invoice_property_cache(self, self.get_invoices)
+
     def update_invoice_property_cache(self, save=True):
-        for inv in self.get_invoices():
-            inv_props = get_invoice_properties(inv.id)
-
-            self.invoice_property_cache[inv.id] = {
-                'payment_status': inv_props['data']['invoice']['payment_status'],
-                'reference': inv_props['data']['invoice']['reference'],
-                'amount': inv_props['data']['invoice']['amount'],
-                'settlement_date': inv_props['data']['invoice']['settlement_date'],
-            }
-            
-        if save:
-           self.save()
-        return self.invoice_property_cache
+        from mooringlicensing.components.payments_ml.utils import sync_invoice_property_cache
+        return sync_invoice_property_cache(self, self.get_invoices(), save=save)
+
+    def mark_invoice_property_cache_stale(self):
+        from mooringlicensing.components.payments_ml.utils import mark_invoice_property_cache_stale
+        mark_invoice_property_cache_stale(self, self.get_invoices())
 
     def get_invoices(self):
         invoices = []
@@ -4008,24 +4022,39 @@ class Sticker(RevisionedMixin):
             vessel_length = self.vessel_applicable_length
         return Sticker.get_vessel_size_colour_by_length(vessel_length)
 
-    @property
-    def next_number(self):
+    @staticmethod
+    def get_max_number():
+        ids = [int(i) for i in Sticker.objects.all().values_list('number', flat=True) if i and i.isdigit()]
+        return max(ids) if ids else 0
+
+    @staticmethod
+    def reserve_numbers(count):
+        """
+        Reserve count contiguous sticker numbers and return the first one
+        """
+        return NumberSequence.reserve(Sticker.NUMBER_SEQUENCE, count, Sticker.get_max_number)
+
+    @staticmethod
+    def reserve_number():
+        """
+        Reserve a single sticker number and return it.  Each call consumes a number of the sequence.
+        """
         try:
-            ids = [int(i) for i in Sticker.objects.all().values_list('number', flat=True) if i]
-            return max(ids) + 1 if ids else 1
-        except Exception as e:
-            print(e)
+            return Sticker.reserve_numbers(1)
+        except Exception:
+            logger.exception('Failed to reserve a sticker number.')
+            raise
 
     def save(self, *args, **kwargs):
         if self.pk:
-            self.update_invoice_property_cache(save=False)
+            self.mark_invoice_property_cache_stale()
         super(Sticker, self).save(*args, **kwargs)
         if self.status not in [Sticker.STICKER_STATUS_NOT_READY_YET, Sticker.STICKER_STATUS_READY,]:
             # We don't want to assign a number yet to not_ready_yet sticker.
             if self.number == '':
                 # Should not reach here, a new number is assigned to a sticker when exporting sticker data to the sticker company.
                 # Ref: export_and_email_sticker_data.py
-                self.number = '{0:07d}'.format(self.next_number)
+                self.number = '{0:07d}'.format(Sticker.reserve_number())
                 self.save()
 
     @property
@@ -4075,6 +4104,289 @@ class StickerActionDetail(SanitiseMixin):
         app_label = 'mooringlicensing'
         ordering = ['-date_created']
 
+class ApprovalSearchDocument(SearchDocument):
+    approval = models.OneToOneField(Approval, on_delete=models.CASCADE, related_name='search_document')
+
+    class Meta:
+        app_label = 'mooringlicensing'
+        indexes = [
+            GinIndex(fields=['people'], name='approval_search_people_trgm', opclasses=['gin_trgm_ops']),
+            GinIndex(fields=['vessels'], name='approval_search_vessels_trgm', opclasses=['gin_trgm_ops']),
+        ]
+
+    @classmethod
+    def refresh(cls, approval_ids):
+        approvals = list(Approval.objects.filter(id__in=approval_ids).select_related('current_proposal__proposal_applicant', 'current_proposal__vessel_details__vessel'))
+        system_users = cls.get_system_user_values(
+            [approval.submitter for approval in approvals] +
+            [approval.current_proposal.submitter for approval in approvals if approval.current_proposal]
+        )
+        vessels_on_approvals = {}
+        for approval_id, rego_no in VesselOwnershipOnApproval.objects.filter(approval_id__in=approval_ids).values_list('approval_id', 'vessel_ownership__vessel__rego_no'):
+            vessels_on_approvals.setdefault(approval_id, []).append(rego_no)
+
+        documents = {}
+        for approval in approvals:
+            people = system_users.get(approval.submitter, [])[:]
+            vessels = vessels_on_approvals.get(approval.id, [])
+            proposal = approval.current_proposal
+            if proposal:
+                people += system_users.get(proposal.submitter, [])
+                applicant = getattr(proposal, 'proposal_applicant', None)
+                if applicant:
+                    people += cls.person_values(applicant.first_name, applicant.last_name, applicant.email)
+                if proposal.vessel_details and proposal.vessel_details.vessel:
+                    vessels.append(proposal.vessel_details.vessel.rego_no)
+            documents[approval.id] = (people, vessels)
+        cls.save_documents('approval', documents)
+
+
+class StickerSearchDocument(SearchDocument):
+    sticker = models.OneToOneField(Sticker, on_delete=models.CASCADE, related_name='search_document')
+
+    class Meta:
+        app_label = 'mooringlicensing'
+        indexes = [
+            GinIndex(fields=['people'], name='sticker_search_people_trgm', opclasses=['gin_trgm_ops']),
+            GinIndex(fields=['vessels'], name='sticker_search_vessels_trgm', opclasses=['gin_trgm_ops']),
+        ]
+
+    @classmethod
+    def refresh(cls, sticker_ids):
+        stickers = list(Sticker.objects.filter(id__in=sticker_ids).select_related('approval__current_proposal__proposal_applicant', 'vessel_ownership__vessel'))
+        system_users = cls.get_system_user_values([sticker.approval.submitter for sticker in stickers if sticker.approval])
+
+        documents = {}
+        for sticker in stickers:
+            people, vessels = [], []
+            if sticker.approval:
+                people += system_users.get(sticker.approval.submitter, [])
+                applicant = getattr(sticker.approval.current_proposal, 'proposal_applicant', None) if sticker.approval.current_proposal else None
+                if applicant:
+                    people += cls.person_values(applicant.first_name, applicant.last_name, applicant.email)
+            if sticker.vessel_ownership and sticker.vessel_ownership.vessel:
+                vessels.append(sticker.vessel_ownership.vessel.rego_no)
+            documents[sticker.id] = (people, vessels)
+        cls.save_documents('sticker', documents)
+
+
+class ApprovalListSummary(models.Model):
+    """
+    Sticker and mooring details shown on the approvals dashboard.  Computing them takes several queries per approval,
+    therefore they are stored here when the approval, its stickers or its moorings change, and the dashboard reads
+    one row per approval.
+    """
+    approval = models.OneToOneField(Approval, on_delete=models.CASCADE, related_name='list_summary')
+    has_sticker = models.BooleanField(default=False)
+    is_missing_sticker = models.BooleanField(default=False)
+    missing_sticker_message = models.TextField(null=True, blank=True)
+    mooring_offered = JSONField(default=dict, blank=True)
+    moorings = JSONField(default=list, blank=True)
+    date_updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        app_label = 'mooringlicensing'
+
+    def __str__(self):
+        return f'Summary of {self.approval}'
+
+    @classmethod
+    def get_for(cls, approval):
+        try:
+            return approval.list_summary
+        except cls.DoesNotExist:
+            # Not built yet (the signals and the rebuild_approval_list_summaries command store it), compute the values
+            # without saving them
+            approval.list_summary = cls.build(approval)
+            return approval.list_summary
+
+    @classmethod
+    def build(cls, approval, summary=None):
+        """
+        Compute the values of the summary of the approval.  The summary is not saved.
+        """
+        if summary is None:
+            summary = cls(approval=approval)
+        summary.has_sticker = cls.compute_has_sticker(approval)
+        summary.is_missing_sticker = cls.compute_is_missing_sticker(approval)
+        summary.missing_sticker_message = cls.compute_missing_sticker_message(approval)
+        summary.mooring_offered = cls.compute_mooring_offered(approval)
+        summary.moorings = cls.compute_moorings(approval)
+        summary.date_updated = timezone.now()
+        return summary
+
+    @classmethod
+    def refresh(cls, approval_ids):
+        summaries = {summary.approval_id: summary for summary in cls.objects.filter(approval_id__in=approval_ids)}
+        to_create, to_update = [], []
+        for approval in Approval.objects.filter(id__in=approval_ids):
+            summary = cls.build(approval, summaries.get(approval.id))
+            if summary.pk:
+                to_update.append(summary)
+            else:
+                to_create.append(summary)
+        cls.objects.bulk_create(to_create, ignore_conflicts=True)
+        cls.objects.bulk_update(to_update, ['has_sticker', 'is_missing_sticker', 'missing_sticker_message', 'mooring_offered', 'moorings', 'date_updated',])
+
+    @staticmethod
+    def compute_mooring_offered(obj):
+        mooring = {}
+        if type(obj.child_obj) == WaitingListAllocation:
+            proposal = obj.child_obj.ria_generated_proposal.first()
+            if proposal and proposal.allocated_mooring:
+                mooring = {
+                    'id': proposal.allocated_mooring.id,
+                    'name': proposal.allocated_mooring.name,
+                }
+        return mooring
+
+    @staticmethod
+    def compute_has_sticker(obj):
+        return Sticker.objects.filter(approval=obj).exclude(status__in=[Sticker.STICKER_STATUS_EXPIRED,Sticker.STICKER_STATUS_CANCELLED,Sticker.STICKER_STATUS_RETURNED,Sticker.STICKER_STATUS_TO_BE_RETURNED,Sticker.STICKER_STATUS_LOST]).exists()
+
+    #we only consider a sticker missing if the only stickers that exist for the season are lost or cancelled
+    @staticmethod
+    def compute_is_missing_sticker(obj):
+        season = obj.latest_applied_season
+        if type(obj.child_obj) == AuthorisedUserPermit:
+            #check moas
+            #if there is a moa with a null sticker or the moa has a sticker that is cancelled, lost, or returned - that moa has not got a valid sticker
+            return MooringOnApproval.objects.filter(
+                    approval=obj,active=True
+                ).filter(
+                    Q(sticker__isnull=True)|
+                    (
+                     Q(sticker__status__in=[Sticker.STICKER_STATUS_CANCELLED,Sticker.STICKER_STATUS_LOST, Sticker.STICKER_STATUS_RETURNED])
+                     &Q(sticker__fee_season=season)
+                    )
+                ).exists()
+        elif type(obj.child_obj) == MooringLicence:
+            #check vos
+            vo_ids = list(VesselOwnershipOnApproval.objects.filter(approval=obj, end_date__isnull=True, vessel_ownership__end_date__isnull=True).values_list("vessel_ownership__id",flat=True))
+            vos = VesselOwnership.objects.filter(id__in=vo_ids)
+            for vo in vos:
+                #NOTE: we exclude returned from the check because a vessel can be re-added to a permit, but we never replace a returned sticker
+                if not Sticker.objects.filter(approval=obj,vessel_ownership=vo).filter(fee_season=season).exclude(status__in=[Sticker.STICKER_STATUS_CANCELLED,Sticker.STICKER_STATUS_LOST, Sticker.STICKER_STATUS_RETURNED]).exists():
+                    return True
+        elif type(obj.child_obj) == WaitingListAllocation:
+            return False
+        return not Sticker.objects.filter(approval=obj).filter(fee_season=season).exclude(status__in=[Sticker.STICKER_STATUS_CANCELLED,Sticker.STICKER_STATUS_LOST, Sticker.STICKER_STATUS_RETURNED]).exists()
+
+
+    @staticmethod
+    def compute_missing_sticker_message(obj):
+        #specified WHICH valid sticker(s) is/are missing (and what invalid stikcers will be replaced)
+        #OR what vessel/mooring is missing a sticker (and will have a sticker made for)
+        season = obj.latest_applied_season
+        if type(obj.child_obj) == AuthorisedUserPermit:
+            moas = MooringOnApproval.objects.filter(
+                    approval=obj,active=True
+                ).filter(
+                    Q(sticker__isnull=True)|(Q(sticker__status__in=[Sticker.STICKER_STATUS_CANCELLED,Sticker.STICKER_STATUS_LOST, Sticker.STICKER_STATUS_RETURNED])&Q(sticker__fee_season=season))
+                ).order_by("-id")
+
+            message = ""
+            stickers = []
+            if moas.exists():
+                message = "The following moorings do not have a valid sticker record assigned: "
+                for moa in moas:
+                    #We do not want to replace a returned sticker, we treat it as if there is no sticker
+                    if moa.sticker and moa.sticker.status != Sticker.STICKER_STATUS_RETURNED:
+                        stickers.append(moa.sticker.number)
+                    if moa.mooring and moa.mooring.name:
+                        message += f"{str(moa.mooring.name)}, "
+
+                message = f"{message[:-2]}."
+                stickers = list(set(stickers))
+                if stickers:
+                    message += f" Stickers that need to be replaced: {','.join(stickers)}."
+                    if len(stickers) > 1:
+                        message += " New sticker will replace first in list." 
+                return message
+            else:
+                return ""
+
+        elif type(obj.child_obj) == MooringLicence:
+            vo_ids = list(VesselOwnershipOnApproval.objects.filter(approval=obj, end_date__isnull=True, vessel_ownership__end_date__isnull=True).values_list("vessel_ownership__id",flat=True))
+            vos = VesselOwnership.objects.filter(id__in=vo_ids)
+            vo_stickers = Sticker.objects.filter(vessel_ownership_id__in=vo_ids,approval=obj).filter(fee_season=season).order_by('-id')
+            
+            bad_vos = []
+            bad_stickers = []
+
+            for vo in vos:
+                sticker_check = vo_stickers.filter(vessel_ownership=vo,approval=obj)
+
+                if sticker_check.exclude(status__in=[Sticker.STICKER_STATUS_CANCELLED,Sticker.STICKER_STATUS_LOST, Sticker.STICKER_STATUS_RETURNED]).exists():
+                    #vo is fine
+                    continue
+                elif not sticker_check.exclude(status=Sticker.STICKER_STATUS_RETURNED).exists():
+                    #vo has no stickers at all
+                    bad_vos.append(vo)
+                elif sticker_check.filter(status__in=[Sticker.STICKER_STATUS_CANCELLED,Sticker.STICKER_STATUS_LOST]).exists():
+                    #vo has bad stickers
+                    bad_vos.append(vo)
+                    bad_stickers.append(sticker_check.filter(status__in=[Sticker.STICKER_STATUS_CANCELLED,Sticker.STICKER_STATUS_LOST]).first().number)
+
+            if bad_vos:
+                message = "The following vessels do not have a valid sticker record assigned: "
+                for vo in bad_vos:
+                    if vo.vessel:
+                        message += f"{str(vo.vessel.rego_no)}, "
+                message = f"{message[:-2]}."
+
+                if bad_stickers:
+                    message += f" Stickers that need to be replaced: {','.join(bad_stickers)}."
+                    if len(bad_stickers) > 1:
+                        message += " New sticker will replace first in list." 
+                return message
+            else:
+                return ""
+
+        elif type(obj.child_obj) == AnnualAdmissionPermit:
+            stickers = Sticker.objects.filter(approval=obj).filter(fee_season=season).exclude(status=Sticker.STICKER_STATUS_RETURNED).order_by('-id')
+            bad_vo = None
+            bad_sticker = None
+            if not stickers.exists():
+                #AA has no stickers at all
+                bad_vo = obj.current_proposal.vessel_ownership if obj.current_proposal else None
+            elif not stickers.exclude(status__in=[Sticker.STICKER_STATUS_CANCELLED,Sticker.STICKER_STATUS_LOST]).exists():
+                #AA has no valid stickers
+                bad_vo = obj.current_proposal.vessel_ownership if obj.current_proposal else None
+                bad_sticker = stickers.filter(status__in=[Sticker.STICKER_STATUS_CANCELLED,Sticker.STICKER_STATUS_LOST]).first()
+            
+            if bad_vo and bad_vo.vessel:
+                message = f"{bad_vo.vessel.rego_no} has no valid sticker record assigned."
+                if bad_sticker:
+                    message += f" Sticker {bad_sticker.number} will need to be replaced."
+                return message
+        else:
+            return ""
+        
+
+    @staticmethod
+    def compute_moorings(obj):
+        links = []
+        if obj.child_obj:
+            if type(obj.child_obj) == AuthorisedUserPermit:
+                moas = MooringOnApproval.get_current_moas_by_approval(obj)
+                for moa in moas:
+                    if moa.mooring and moa.mooring.mooring_bay:
+                        links.append({
+                            'id': moa.mooring.id,
+                            'bay_name': moa.mooring.mooring_bay.name,
+                            'mooring_name': moa.mooring.name,
+                        })
+            elif type(obj.child_obj) == MooringLicence and hasattr(obj.child_obj,'mooring') and obj.child_obj.mooring.mooring_bay: 
+                links.append({
+                    'id': obj.child_obj.mooring.id,
+                    'bay_name': obj.child_obj.mooring.mooring_bay.name,
+                    'mooring_name': obj.child_obj.mooring.name,
+                })
+
+        return links
+
+
 @receiver(pre_delete, sender=Approval)
 def delete_documents(sender, instance, *args, **kwargs):
     if hasattr(instance, 'approval_documents'):
@@ -4115,4 +4427,90 @@ reversion.register(Sticker, follow=['mooringonapproval_set'])
 #reversion.register(NumberOfPeople, follow=[])
 #reversion.register(DcvPermit, follow=['dcv_permit_documents', 'stickers'])
 #reversion.register(DcvAdmissionDocument, follow=[])
-#reversion.register(DcvPermitDocument, follow=[])
\ No newline at end of file
+#reversion.register(DcvPermitDocument, follow=[])
+
+class MooringBookingsExport(models.Model):
+    """
+    Outbox of the vessel licence updates to be sent to Mooring Bookings.  There is at most one pending update per
+    approval and vessel, which holds the latest state; it is sent by dispatch_mooring_bookings_exports() and retried
+    with an increasing delay until it is sent or has failed too many times.
+    """
+    STATUS_PENDING = 'pending'
+    STATUS_SENT = 'sent'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = (
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_SENT, 'Sent'),
+        (STATUS_FAILED, 'Failed'),
+    )
+
+    approval = models.ForeignKey(Approval, on_delete=models.CASCADE, related_name='mooring_bookings_exports')
+    vessel = models.ForeignKey('Vessel', null=True, blank=True, on_delete=models.SET_NULL)
+    vessel_rego = models.CharField(max_length=200)
+    payload = JSONField(default=dict)
+    # Incremented whenever the payload is replaced, so that a newer payload isn't marked as sent by an older attempt
+    version = models.PositiveIntegerField(default=1)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(null=True, blank=True)
+    date_created = models.DateTimeField(auto_now_add=True)
+    date_sent = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        app_label = 'mooringlicensing'
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='mb_export_status_next_idx'),
+            models.Index(fields=['approval', 'vessel_rego', 'status'], name='mb_export_approval_idx'),
+        ]
+
+    def __str__(self):
+        return f'Approval: [{self.approval_id}], vessel: [{self.vessel_rego}], status: [{self.status}]'
+
+
+class ApprovalStatusTransition(models.Model):
+    """
+    A status change applied by update_approval_status.  The new status is written in bulk together with this row,
+    and the side effects of the change (stickers, emails, the processes of the licence type and the update to
+    Mooring Bookings) are run per row afterwards, and retried on the next run when they fail.
+    """
+    TRANSITION_EXPIRE = 'expire'
+    TRANSITION_SUSPEND = 'suspend'
+    TRANSITION_CANCEL = 'cancel'
+    TRANSITION_SURRENDER = 'surrender'
+    TRANSITION_REINSTATE = 'reinstate'
+    TRANSITION_CHOICES = (
+        (TRANSITION_EXPIRE, 'Expire'),
+        (TRANSITION_SUSPEND, 'Suspend'),
+        (TRANSITION_CANCEL, 'Cancel'),
+        (TRANSITION_SURRENDER, 'Surrender'),
+        (TRANSITION_REINSTATE, 'Reinstate'),
+    )
+
+    STATUS_PENDING = 'pending'
+    STATUS_PROCESSED = 'processed'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = (
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_PROCESSED, 'Processed'),
+        (STATUS_FAILED, 'Failed'),
+    )
+
+    approval = models.ForeignKey(Approval, on_delete=models.CASCADE, related_name='status_transitions')
+    transition = models.CharField(max_length=20, choices=TRANSITION_CHOICES)
+    from_status = models.CharField(max_length=40, choices=Approval.STATUS_CHOICES)
+    to_status = models.CharField(max_length=40, choices=Approval.STATUS_CHOICES)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(null=True, blank=True)
+    date_created = models.DateTimeField(auto_now_add=True)
+    date_processed = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        app_label = 'mooringlicensing'
+        indexes = [
+            models.Index(fields=['status', 'id'], name='approval_transition_status_idx'),
+        ]
+
+    def __str__(self):
+        return f'Approval: [{self.approval_id}], transition: [{self.transition}], status: [{self.status}]'
@@ -27,10 +27,10 @@ from mooringlicensing.components.approvals.models import (
     MooringLicence,
     AnnualAdmissionPermit,
     AuthorisedUserPermit, StickerActionDetail, 
-    ApprovalHistory, MooringOnApproval, VesselOwnershipOnApproval,
+    ApprovalHistory, MooringOnApproval, VesselOwnershipOnApproval, ApprovalListSummary,
 )
 
-from mooringlicensing.components.main.serializers import CommunicationLogEntrySerializer
+from mooringlicensing.components.main.serializers import CommunicationLogEntrySerializer, IdentityResolverMixin, IdentityPrefetchListSerializer
 from mooringlicensing.components.proposals.serializers import (
     InternalProposalSerializer, 
     MooringSimpleSerializer, 
@@ -725,158 +725,19 @@ class ListApprovalSerializer(serializers.ModelSerializer):
         }
 
     def get_mooring_offered(self, obj):
-        mooring = {}
-        if type(obj.child_obj) == WaitingListAllocation:
-            proposal = obj.child_obj.ria_generated_proposal.first()
-            if proposal and proposal.allocated_mooring:
-                mooring = {
-                    'id': proposal.allocated_mooring.id,
-                    'name': proposal.allocated_mooring.name,
-                }
-        return mooring
+        return ApprovalListSummary.get_for(obj).mooring_offered
 
     def get_has_sticker(self,obj):
-        return Sticker.objects.filter(approval=obj).exclude(status__in=[Sticker.STICKER_STATUS_EXPIRED,Sticker.STICKER_STATUS_CANCELLED,Sticker.STICKER_STATUS_RETURNED,Sticker.STICKER_STATUS_TO_BE_RETURNED,Sticker.STICKER_STATUS_LOST]).exists()
+        return ApprovalListSummary.get_for(obj).has_sticker
 
-    #we only consider a sticker missing if the only stickers that exist for the season are lost or cancelled
     def get_is_missing_sticker(self,obj):
-        season = obj.latest_applied_season
-        if type(obj.child_obj) == AuthorisedUserPermit:
-            #check moas
-            #if there is a moa with a null sticker or the moa has a sticker that is cancelled, lost, or returned - that moa has not got a valid sticker
-            return MooringOnApproval.objects.filter(
-                    approval=obj,active=True
-                ).filter(
-                    Q(sticker__isnull=True)|
-                    (
-                     Q(sticker__status__in=[Sticker.STICKER_STATUS_CANCELLED,Sticker.STICKER_STATUS_LOST, Sticker.STICKER_STATUS_RETURNED])
-                     &Q(sticker__fee_season=season)
-                    )
-                ).exists()
-        elif type(obj.child_obj) == MooringLicence:
-            #check vos
-            vo_ids = list(VesselOwnershipOnApproval.objects.filter(approval=obj, end_date__isnull=True, vessel_ownership__end_date__isnull=True).values_list("vessel_ownership__id",flat=True))
-            vos = VesselOwnership.objects.filter(id__in=vo_ids)
-            for vo in vos:
-                #NOTE: we exclude returned from the check because a vessel can be re-added to a permit, but we never replace a returned sticker
-                if not Sticker.objects.filter(approval=obj,vessel_ownership=vo).filter(fee_season=season).exclude(status__in=[Sticker.STICKER_STATUS_CANCELLED,Sticker.STICKER_STATUS_LOST, Sticker.STICKER_STATUS_RETURNED]).exists():
-                    return True
-        elif type(obj.child_obj) == WaitingListAllocation:
-            return False
-        return not Sticker.objects.filter(approval=obj).filter(fee_season=season).exclude(status__in=[Sticker.STICKER_STATUS_CANCELLED,Sticker.STICKER_STATUS_LOST, Sticker.STICKER_STATUS_RETURNED]).exists()
-
+        return ApprovalListSummary.get_for(obj).is_missing_sticker
 
     def get_missing_sticker_message(self,obj):
-        #specified WHICH valid sticker(s) is/are missing (and what invalid stikcers will be replaced)
-        #OR what vessel/mooring is missing a sticker (and will have a sticker made for)
-        season = obj.latest_applied_season
-        if type(obj.child_obj) == AuthorisedUserPermit:
-            moas = MooringOnApproval.objects.filter(
-                    approval=obj,active=True
-                ).filter(
-                    Q(sticker__isnull=True)|(Q(sticker__status__in=[Sticker.STICKER_STATUS_CANCELLED,Sticker.STICKER_STATUS_LOST, Sticker.STICKER_STATUS_RETURNED])&Q(sticker__fee_season=season))
-                ).order_by("-id")
-
-            message = ""
-            stickers = []
-            if moas.exists():
-                message = "The following moorings do not have a valid sticker record assigned: "
-                for moa in moas:
-                    #We do not want to replace a returned sticker, we treat it as if there is no sticker
-                    if moa.sticker and moa.sticker.status != Sticker.STICKER_STATUS_RETURNED:
-                        stickers.append(moa.sticker.number)
-                    if moa.mooring and moa.mooring.name:
-                        message += f"{str(moa.mooring.name)}, "
-
-                message = f"{message[:-2]}."
-                stickers = list(set(stickers))
-                if stickers:
-                    message += f" Stickers that need to be replaced: {','.join(stickers)}."
-                    if len(stickers) > 1:
-                        message += " New sticker will replace first in list." 
-                return message
-            else:
-                return ""
-
-        elif type(obj.child_obj) == MooringLicence:
-            vo_ids = list(VesselOwnershipOnApproval.objects.filter(approval=obj, end_date__isnull=True, vessel_ownership__end_date__isnull=True).values_list("vessel_ownership__id",flat=True))
-            vos = VesselOwnership.objects.filter(id__in=vo_ids)
-            vo_stickers = Sticker.objects.filter(vessel_ownership_id__in=vo_ids,approval=obj).filter(fee_season=season).order_by('-id')
-            
-            bad_vos = []
-            bad_stickers = []
-
-            for vo in vos:
-                sticker_check = vo_stickers.filter(vessel_ownership=vo,approval=obj)
-
-                if sticker_check.exclude(status__in=[Sticker.STICKER_STATUS_CANCELLED,Sticker.STICKER_STATUS_LOST, Sticker.STICKER_STATUS_RETURNED]).exists():
-                    #vo is fine
-                    continue
-                elif not sticker_check.exclude(status=Sticker.STICKER_STATUS_RETURNED).exists():
-                    #vo has no stickers at all
-                    bad_vos.append(vo)
-                elif sticker_check.filter(status__in=[Sticker.STICKER_STATUS_CANCELLED,Sticker.STICKER_STATUS_LOST]).exists():
-                    #vo has bad stickers
-                    bad_vos.append(vo)
-                    bad_stickers.append(sticker_check.filter(status__in=[Sticker.STICKER_STATUS_CANCELLED,Sticker.STICKER_STATUS_LOST]).first().number)
-
-            if bad_vos:
-                message = "The following vessels do not have a valid sticker record assigned: "
-                for vo in bad_vos:
-                    if vo.vessel:
-                        message += f"{str(vo.vessel.rego_no)}, "
-                message = f"{message[:-2]}."
-
-                if bad_stickers:
-                    message += f" Stickers that need to be replaced: {','.join(bad_stickers)}."
-                    if len(bad_stickers) > 1:
-                        message += " New sticker will replace first in list." 
-                return message
-            else:
-                return ""
-
-        elif type(obj.child_obj) == AnnualAdmissionPermit:
-            stickers = Sticker.objects.filter(approval=obj).filter(fee_season=season).exclude(status=Sticker.STICKER_STATUS_RETURNED).order_by('-id')
-            bad_vo = None
-            bad_sticker = None
-            if not stickers.exists():
-                #AA has no stickers at all
-                bad_vo = obj.current_proposal.vessel_ownership if obj.current_proposal else None
-            elif not stickers.exclude(status__in=[Sticker.STICKER_STATUS_CANCELLED,Sticker.STICKER_STATUS_LOST]).exists():
-                #AA has no valid stickers
-                bad_vo = obj.current_proposal.vessel_ownership if obj.current_proposal else None
-                bad_sticker = stickers.filter(status__in=[Sticker.STICKER_STATUS_CANCELLED,Sticker.STICKER_STATUS_LOST]).first()
-            
-            if bad_vo and bad_vo.vessel:
-                message = f"{bad_vo.vessel.rego_no} has no valid sticker record assigned."
-                if bad_sticker:
-                    message += f" Sticker {bad_sticker.number} will need to be replaced."
-                return message
-        else:
-            return ""
-        
+        return ApprovalListSummary.get_for(obj).missing_sticker_message
 
     def get_moorings(self, obj):
-        links = []
-        request = self.context.get('request')
-        if obj.child_obj:
-            if type(obj.child_obj) == AuthorisedUserPermit:
-                moas = MooringOnApproval.get_current_moas_by_approval(obj)
-                for moa in moas:
-                    if moa.mooring and moa.mooring.mooring_bay:
-                        links.append({
-                            'id': moa.mooring.id,
-                            'bay_name': moa.mooring.mooring_bay.name,
-                            'mooring_name': moa.mooring.name,
-                        })
-            elif type(obj.child_obj) == MooringLicence and hasattr(obj.child_obj,'mooring') and obj.child_obj.mooring.mooring_bay: 
-                links.append({
-                    'id': obj.child_obj.mooring.id,
-                    'bay_name': obj.child_obj.mooring.mooring_bay.name,
-                    'mooring_name': obj.child_obj.mooring.name,
-                })
-
-        return links
+        return ApprovalListSummary.get_for(obj).moorings
 
     def get_licence_document(self, obj):
         if obj.licence_document and obj.licence_document._file:
@@ -1620,7 +1481,7 @@ class StickerPostalAddressSaveSerializer(serializers.ModelSerializer):
         )
         read_only = ('id',)
 
-class ListDcvPermitSerializer(serializers.ModelSerializer):
+class ListDcvPermitSerializer(IdentityResolverMixin, serializers.ModelSerializer):
     dcv_organisation_name = serializers.SerializerMethodField()
     status = serializers.SerializerMethodField()
     fee_season = serializers.SerializerMethodField()
@@ -1676,6 +1537,11 @@ class ListDcvPermitSerializer(serializers.ModelSerializer):
             'vessel_rego',
             'payment_status',
         )
+        list_serializer_class = IdentityPrefetchListSerializer
+
+    def get_identity_ids(self, obj):
+        email_user_ids = [] if obj.dcv_organisation_id else [obj.submitter,]
+        return [], email_user_ids
 
     def get_payment_status(self, obj):
         try:
@@ -1683,7 +1549,7 @@ class ListDcvPermitSerializer(serializers.ModelSerializer):
             if dcv_permit_fee:
                 invoice = Invoice.objects.get(reference=dcv_permit_fee.invoice_reference)
                 inv_props = obj.get_invoice_property_cache()
-                invoice_payment_status = inv_props[str(invoice.id)]["payment_status"]
+                invoice_payment_status = inv_props[invoice.id]["payment_status"]
                 if invoice_payment_status == 'unpaid':
                     return 'Unpaid'
                 elif invoice_payment_status == 'partially_paid':
@@ -1768,7 +1634,7 @@ class ListDcvPermitSerializer(serializers.ModelSerializer):
             if obj.dcv_organisation:
                 return obj.dcv_organisation.name
             else:
-                return obj.submitter_obj.get_full_name() + ' (P)'
+                return self.identity_resolver.get_email_userro(obj.submitter).get_full_name() + ' (P)'
         except:
             return ''
 
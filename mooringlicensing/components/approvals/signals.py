@@ -1,8 +1,12 @@
 import logging
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from django.db.models import Q
-from mooringlicensing.components.approvals.models import Sticker, ApprovalHistory
+from mooringlicensing.components.approvals.models import (
+    Sticker, ApprovalHistory, Approval, WaitingListAllocation, AnnualAdmissionPermit, AuthorisedUserPermit,
+    MooringLicence, VesselOwnershipOnApproval, MooringOnApproval,
+)
+from mooringlicensing.components.approvals.utils import refresh_search_documents, refresh_approval_list_summaries
 from mooringlicensing.components.proposals.models import Proposal
 
 logger = logging.getLogger(__name__)
@@ -117,3 +121,54 @@ class StickerListener(object):
             # Somehow there is no approval history object
             logger.warning('Active ApprovalHistory object for the sticker: {} not found'.format(sticker_saved))
 
+
+class ApprovalSearchDocumentListener(object):
+    """
+    Keep the search documents of the approvals and stickers up to date
+    """
+    @staticmethod
+    @receiver(post_save, sender=Approval)
+    @receiver(post_save, sender=WaitingListAllocation)
+    @receiver(post_save, sender=AnnualAdmissionPermit)
+    @receiver(post_save, sender=AuthorisedUserPermit)
+    @receiver(post_save, sender=MooringLicence)
+    def _approval_post_save(sender, instance, **kwargs):
+        refresh_search_documents(approval_ids=[instance.id])
+
+    @staticmethod
+    @receiver(post_save, sender=VesselOwnershipOnApproval)
+    @receiver(post_delete, sender=VesselOwnershipOnApproval)
+    def _vessel_ownership_on_approval_changed(sender, instance, **kwargs):
+        refresh_search_documents(approval_ids=[instance.approval_id])
+
+    @staticmethod
+    @receiver(post_save, sender=Sticker)
+    def _sticker_post_save(sender, instance, **kwargs):
+        refresh_search_documents(sticker_ids=[instance.id])
+
+
+class ApprovalListSummaryListener(object):
+    """
+    Keep the approvals dashboard summaries up to date
+    """
+    @staticmethod
+    @receiver(post_save, sender=Approval)
+    @receiver(post_save, sender=WaitingListAllocation)
+    @receiver(post_save, sender=AnnualAdmissionPermit)
+    @receiver(post_save, sender=AuthorisedUserPermit)
+    @receiver(post_save, sender=MooringLicence)
+    def _approval_post_save(sender, instance, **kwargs):
+        approval_ids = [instance.id]
+        if sender == MooringLicence:
+            # The moorings of the authorised user permits depend on the status of the mooring licence
+            approval_ids += list(MooringOnApproval.objects.filter(mooring__mooring_licence=instance).values_list('approval_id', flat=True))
+        refresh_approval_list_summaries(approval_ids)
+
+    @staticmethod
+    @receiver(post_save, sender=Sticker)
+    @receiver(post_save, sender=MooringOnApproval)
+    @receiver(post_delete, sender=MooringOnApproval)
+    @receiver(post_save, sender=VesselOwnershipOnApproval)
+    @receiver(post_delete, sender=VesselOwnershipOnApproval)
+    def _approval_detail_changed(sender, instance, **kwargs):
+        refresh_approval_list_summaries([instance.approval_id])
@@ -1,12 +1,37 @@
+import datetime
+import logging
+
 from mooringlicensing.components.proposals.models import (
     WaitingListApplication,
     MooringLicenceApplication
 )
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from mooringlicensing.components.proposals.models import Proposal, ProposalSearchDocument, ProposalUserAction
 from mooringlicensing.components.approvals.models import (
     WaitingListAllocation, 
-    MooringLicence
+    MooringLicence,
+    AuthorisedUserPermit,
+    AnnualAdmissionPermit,
+    Approval,
+    ApprovalUserAction,
+    ApprovalStatusTransition,
+    Sticker,
+    ApprovalSearchDocument,
+    StickerSearchDocument,
+    ApprovalListSummary,
+)
+from mooringlicensing.components.approvals.email import (
+    send_approval_expire_email_notification,
+    send_approval_cancel_email_notification,
+    send_approval_suspend_email_notification,
+    send_approval_surrender_email_notification,
 )
 
+logger = logging.getLogger(__name__)
+
 def get_wla_allowed(user_id):
     wla_allowed = True
     # Person can have only one WLA, Waiting Liast application, Mooring Licence and Mooring Licence application
@@ -18,4 +43,228 @@ def get_wla_allowed(user_id):
     if rule1 or rule2 or rule3 or rule4:
         wla_allowed = False
 
-    return wla_allowed
\ No newline at end of file
+    return wla_allowed
+
+
+def refresh_search_documents(proposal_ids=(), approval_ids=(), sticker_ids=()):
+    """
+    Refresh the search documents of the records given and of the records whose documents are built from them
+    (proposal -> approvals it is the current proposal of -> stickers of those approvals).
+    Done once the transaction is committed, so the document sees the related records saved in the same transaction.
+    """
+    def refresh():
+        approvals = set(approval_ids) | set(Approval.objects.filter(current_proposal_id__in=proposal_ids).values_list('id', flat=True)) if proposal_ids else set(approval_ids)
+        stickers = set(sticker_ids) | set(Sticker.objects.filter(approval_id__in=approvals).values_list('id', flat=True)) if approvals else set(sticker_ids)
+        if proposal_ids:
+            ProposalSearchDocument.refresh(proposal_ids)
+        if approvals:
+            ApprovalSearchDocument.refresh(approvals)
+        if stickers:
+            StickerSearchDocument.refresh(stickers)
+    transaction.on_commit(refresh)
+
+
+def refresh_search_documents_for_user(ledger_id):
+    """
+    Refresh the search documents which contain the name and email of the system user
+    """
+    refresh_search_documents(
+        proposal_ids=list(Proposal.objects.filter(submitter=ledger_id).values_list('id', flat=True)),
+        approval_ids=list(Approval.objects.filter(Q(submitter=ledger_id) | Q(current_proposal__submitter=ledger_id)).values_list('id', flat=True)),
+    )
+
+
+def refresh_approval_list_summaries(approval_ids):
+    """
+    Rebuild the dashboard summaries of the approvals once the transaction is committed
+    """
+    approval_ids = set(approval_ids)
+    if approval_ids:
+        transaction.on_commit(lambda: ApprovalListSummary.refresh(approval_ids))
+
+
+APPROVAL_STATUS_TRANSITIONS = {
+    ApprovalStatusTransition.TRANSITION_EXPIRE: (Approval.APPROVAL_STATUS_EXPIRED, ApprovalUserAction.ACTION_EXPIRE_APPROVAL, ProposalUserAction.ACTION_EXPIRED_APPROVAL_),
+    ApprovalStatusTransition.TRANSITION_SUSPEND: (Approval.APPROVAL_STATUS_SUSPENDED, ApprovalUserAction.ACTION_SUSPEND_APPROVAL, ProposalUserAction.ACTION_SUSPEND_APPROVAL),
+    ApprovalStatusTransition.TRANSITION_CANCEL: (Approval.APPROVAL_STATUS_CANCELLED, ApprovalUserAction.ACTION_CANCEL_APPROVAL, ProposalUserAction.ACTION_CANCEL_APPROVAL),
+    ApprovalStatusTransition.TRANSITION_SURRENDER: (Approval.APPROVAL_STATUS_SURRENDERED, ApprovalUserAction.ACTION_SURRENDER_APPROVAL, ProposalUserAction.ACTION_SURRENDER_APPROVAL),
+    ApprovalStatusTransition.TRANSITION_REINSTATE: (Approval.APPROVAL_STATUS_CURRENT, ApprovalUserAction.ACTION_REINSTATE_APPROVAL, ProposalUserAction.ACTION_REINSTATE_APPROVAL),
+}
+
+
+def _get_details_date(details, key):
+    value = (details or {}).get(key)
+    return datetime.datetime.strptime(value, '%d/%m/%Y').date() if value else None
+
+
+def get_due_approval_status_transition(approval, today):
+    """
+    Return (transition, flags to be cleared) of the status change of the approval due today, or None.
+    When more than one scheduled change is due, all their flags are cleared and the last one wins, in the order
+    suspension, cancellation, surrender.
+    """
+    transition = None
+    flags = []
+    if approval.status == Approval.APPROVAL_STATUS_CURRENT:
+        if approval.expiry_date and approval.expiry_date < today:
+            return ApprovalStatusTransition.TRANSITION_EXPIRE, flags
+        if approval.set_to_suspend:
+            from_date = _get_details_date(approval.suspension_details, 'from_date')
+            if from_date and from_date <= today:
+                transition = ApprovalStatusTransition.TRANSITION_SUSPEND
+                flags.append('set_to_suspend')
+    elif approval.status == Approval.APPROVAL_STATUS_SUSPENDED:
+        to_date = _get_details_date(approval.suspension_details, 'to_date')
+        if to_date and approval.expiry_date and to_date <= today < approval.expiry_date:
+            transition = ApprovalStatusTransition.TRANSITION_REINSTATE
+    else:
+        return None
+
+    if approval.set_to_cancel and approval.cancellation_date and approval.cancellation_date <= today:
+        transition = ApprovalStatusTransition.TRANSITION_CANCEL
+        flags.append('set_to_cancel')
+    if approval.set_to_surrender:
+        surrender_date = _get_details_date(approval.surrender_details, 'surrender_date')
+        if surrender_date and surrender_date <= today:
+            transition = ApprovalStatusTransition.TRANSITION_SURRENDER
+            flags.append('set_to_surrender')
+    return (transition, flags) if transition else None
+
+
+def apply_approval_status_transitions(today):
+    """
+    Change the status of the approvals due today with a bulk update per kind of change, and queue the side effects
+    of each change as an ApprovalStatusTransition in the same transaction.  Only the approvals which can be due are
+    read, through the indexes on the status, the expiry date and the scheduled change flags.
+    Return (errors, the ApprovalStatusTransitions created).
+    """
+    errors = []
+    due = (
+        Q(status=Approval.APPROVAL_STATUS_CURRENT, expiry_date__lt=today) |
+        Q(status=Approval.APPROVAL_STATUS_CURRENT, set_to_suspend=True) |
+        Q(status__in=Approval.APPROVED_STATUSES, set_to_cancel=True, cancellation_date__lte=today) |
+        Q(status__in=Approval.APPROVED_STATUSES, set_to_surrender=True) |
+        Q(status=Approval.APPROVAL_STATUS_SUSPENDED, expiry_date__gt=today)
+    )
+    with transaction.atomic():
+        approvals = Approval.objects.select_for_update(skip_locked=True).filter(due).only(
+            'id', 'lodgement_number', 'status', 'current_proposal', 'expiry_date', 'cancellation_date', 'suspension_details',
+            'surrender_details', 'set_to_suspend', 'set_to_cancel', 'set_to_surrender',
+        ).order_by('id')
+
+        groups = {}
+        for approval in approvals:
+            try:
+                due_transition = get_due_approval_status_transition(approval, today)
+            except Exception as e:
+                err_msg = 'Error updating Approval {} status'.format(approval.lodgement_number)
+                logger.error('{}\n{}'.format(err_msg, str(e)))
+                errors.append(err_msg)
+                continue
+            if due_transition:
+                transition, flags = due_transition
+                groups.setdefault((approval.status, transition, tuple(flags)), []).append(approval)
+
+        approval_status_transitions = []
+        approval_user_actions = []
+        proposal_user_actions = []
+        for (from_status, transition, flags), approvals_in_group in groups.items():
+            to_status, approval_action, proposal_action = APPROVAL_STATUS_TRANSITIONS[transition]
+            Approval.objects.filter(id__in=[approval.id for approval in approvals_in_group]).update(status=to_status, **{flag: False for flag in flags})
+            for approval in approvals_in_group:
+                approval_status_transitions.append(ApprovalStatusTransition(approval=approval, transition=transition, from_status=from_status, to_status=to_status))
+                approval_user_actions.append(ApprovalUserAction(approval=approval, what=approval_action.format(approval.id)))
+                if approval.current_proposal_id:
+                    proposal_user_actions.append((approval.current_proposal_id, transition, proposal_action))
+
+        lodgement_numbers = dict(Proposal.objects.filter(id__in=[proposal_id for proposal_id, transition, action in proposal_user_actions]).values_list('id', 'lodgement_number'))
+        ProposalUserAction.objects.bulk_create([
+            # The expiry has always been logged with the id of the proposal
+            ProposalUserAction(proposal_id=proposal_id, what=action.format(proposal_id if transition == ApprovalStatusTransition.TRANSITION_EXPIRE else lodgement_numbers.get(proposal_id)))
+            for proposal_id, transition, action in proposal_user_actions
+        ])
+        ApprovalUserAction.objects.bulk_create(approval_user_actions)
+        approval_status_transitions = ApprovalStatusTransition.objects.bulk_create(approval_status_transitions)
+
+    for approval_status_transition in approval_status_transitions:
+        logger.info('Updated Approval {} status to {}'.format(approval_status_transition.approval_id, approval_status_transition.to_status))
+    return errors, approval_status_transitions
+
+
+def process_approval_status_transition(approval_status_transition):
+    """
+    Run the side effects of a status change applied by apply_approval_status_transitions()
+    """
+    from mooringlicensing.components.main.utils import enqueue_mooring_bookings_exports
+
+    approval = Approval.objects.get(id=approval_status_transition.approval_id)
+    transition = approval_status_transition.transition
+    child_obj = approval.child_obj
+    with transaction.atomic():
+        # What saving the new status would have done: the revision, the stickers of a mooring licence, the
+        # authorised user permits on its moorings and the listeners
+        approval.save()
+
+        stickers_to_be_returned = []
+        if transition == ApprovalStatusTransition.TRANSITION_EXPIRE:
+            approval.processes_after_expiry()
+        elif transition == ApprovalStatusTransition.TRANSITION_CANCEL:
+            if type(child_obj) in [WaitingListAllocation, AuthorisedUserPermit, MooringLicence]:
+                child_obj.processes_after_cancel()
+        elif transition == ApprovalStatusTransition.TRANSITION_SURRENDER:
+            stickers_to_be_returned = approval._process_stickers()
+            if type(child_obj) == WaitingListAllocation:
+                child_obj.processes_after_surrender()
+            if type(child_obj) in [AuthorisedUserPermit, MooringLicence]:
+                child_obj.processes_after_cancel()
+
+        if type(child_obj) in [AnnualAdmissionPermit, AuthorisedUserPermit, MooringLicence]:
+            enqueue_mooring_bookings_exports([approval.id])
+
+        # Sent last, so that a failure above doesn't leave an email sent for a change to be retried
+        if transition == ApprovalStatusTransition.TRANSITION_EXPIRE:
+            send_approval_expire_email_notification(approval)
+        elif transition == ApprovalStatusTransition.TRANSITION_SUSPEND:
+            send_approval_suspend_email_notification(approval)
+        elif transition == ApprovalStatusTransition.TRANSITION_CANCEL:
+            send_approval_cancel_email_notification(approval)
+        elif transition == ApprovalStatusTransition.TRANSITION_SURRENDER:
+            send_approval_surrender_email_notification(approval, stickers_to_be_returned=stickers_to_be_returned)
+
+
+def process_approval_status_transitions():
+    """
+    Run the side effects of the pending status changes one by one.  Each is locked while it runs, so that another run
+    at the same time skips it.  A failed one is retried on the next run, until it has failed
+    APPROVAL_STATUS_TRANSITION_MAX_ATTEMPTS times.
+    Return (errors, updates).
+    """
+    errors = []
+    updates = []
+    last_id = 0
+    while True:
+        with transaction.atomic():
+            approval_status_transition = ApprovalStatusTransition.objects.select_for_update(skip_locked=True).filter(
+                status=ApprovalStatusTransition.STATUS_PENDING, id__gt=last_id,
+            ).select_related('approval').order_by('id').first()
+            if not approval_status_transition:
+                break
+            last_id = approval_status_transition.id
+            lodgement_number = approval_status_transition.approval.lodgement_number
+
+            approval_status_transition.attempts += 1
+            try:
+                process_approval_status_transition(approval_status_transition)
+                approval_status_transition.status = ApprovalStatusTransition.STATUS_PROCESSED
+                approval_status_transition.date_processed = timezone.now()
+                approval_status_transition.last_error = None
+                updates.append({approval_status_transition.to_status: lodgement_number})
+            except Exception as e:
+                err_msg = 'Error processing the {} of Approval {}'.format(approval_status_transition.transition, lodgement_number)
+                logger.error('{}\n{}'.format(err_msg, str(e)))
+                errors.append(err_msg)
+                approval_status_transition.last_error = str(e)
+                if approval_status_transition.attempts >= settings.APPROVAL_STATUS_TRANSITION_MAX_ATTEMPTS:
+                    approval_status_transition.status = ApprovalStatusTransition.STATUS_FAILED
+            approval_status_transition.save()
+    return errors, updates
@@ -1,7 +1,7 @@
 import logging
 
 from rest_framework_datatables.filters import DatatablesFilterBackend
-from django.db.models import Q, CharField, Value
+from django.db.models import Q, Value
 from django.db.models.functions import Concat
 from django.db import transaction
 from django.conf import settings
@@ -11,7 +11,6 @@ from rest_framework.response import Response
 from django.core.cache import cache
 from ledger_api_client.ledger_models import EmailUserRO as EmailUser
 from mooringlicensing.components.main.decorators import basic_exception_handler
-from ledger_api_client.managed_models import SystemUser
 
 from mooringlicensing.components.compliances.models import (
    Compliance,
@@ -27,7 +26,7 @@ from mooringlicensing.components.compliances.serializers import (
     ComplianceAmendmentRequestSerializer,
     CompAmendmentRequestDisplaySerializer, ListComplianceSerializer
 )
-from mooringlicensing.components.proposals.models import ProposalApplicant
+from mooringlicensing.components.approvals.models import ApprovalSearchDocument
 from mooringlicensing.helpers import is_customer, is_internal
 from rest_framework_datatables.pagination import DatatablesPageNumberPagination
 
@@ -289,15 +288,7 @@ class ComplianceFilterBackend(DatatablesFilterBackend):
             # Custom search 
             search_text = request.GET.get('search[value]')  # This has a search term.
             if search_text:
-                system_user_ids = list(SystemUser.objects.annotate(full_name=Concat('legal_first_name',Value(" "),'legal_last_name',output_field=CharField()))
-                .filter(
-                    Q(legal_first_name__icontains=search_text) | Q(legal_last_name__icontains=search_text) | Q(email__icontains=search_text) | Q(full_name__icontains=search_text)
-                ).values_list("ledger_id", flat=True))
-                proposal_applicant_proposals = list(ProposalApplicant.objects.annotate(full_name=Concat('first_name',Value(" "),'last_name',output_field=CharField()))
-                .filter(
-                    Q(first_name__icontains=search_text) | Q(last_name__icontains=search_text) | Q(email__icontains=search_text) | Q(full_name__icontains=search_text)
-                ).values_list("proposal_id", flat=True))
-                q_set = queryset.filter(Q(approval__current_proposal__id__in=proposal_applicant_proposals)|Q(approval__current_proposal__submitter__in=system_user_ids))
+                q_set = queryset.filter(approval_id__in=ApprovalSearchDocument.search(search_text, fields=('people',)).values('approval_id'))
                 
                 queryset = super_queryset.union(q_set)
 
@@ -84,6 +84,10 @@ class Compliance(RevisionedMixin):
 
     class Meta:
         app_label = 'mooringlicensing'
+        indexes = [
+            # The compliances due for a status change or a reminder, see update_compliance_status and send_compliance_reminder
+            models.Index(fields=['processing_status', 'due_date'], name='compliance_status_due_idx'),
+        ]
 
     @property
     def submitter_obj(self):
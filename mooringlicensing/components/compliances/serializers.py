@@ -2,6 +2,7 @@ from ledger_api_client.managed_models import SystemUser
 from mooringlicensing.components.compliances.models import (
     Compliance, ComplianceUserAction, ComplianceLogEntry, ComplianceAmendmentRequest
 )
+from mooringlicensing.components.main.serializers import IdentityResolverMixin, IdentityPrefetchListSerializer
 from mooringlicensing.components.users.serializers import UserSerializer
 from mooringlicensing.components.proposals.serializers import ProposalRequirementSerializer
 from rest_framework import serializers
@@ -218,7 +219,7 @@ class CompAmendmentRequestDisplaySerializer(serializers.ModelSerializer):
         return obj.reason.reason if obj.reason else None
 
 
-class ListComplianceSerializer(serializers.ModelSerializer):
+class ListComplianceSerializer(IdentityResolverMixin, serializers.ModelSerializer):
     status = serializers.SerializerMethodField()
     approval_number = serializers.SerializerMethodField()
     requirement = ProposalRequirementSerializer()
@@ -255,6 +256,10 @@ class ListComplianceSerializer(serializers.ModelSerializer):
             'due_date_display',
             'can_user_view',
         )
+        list_serializer_class = IdentityPrefetchListSerializer
+
+    def get_identity_ids(self, obj):
+        return [obj.assigned_to,], []
 
     def get_due_date_display(self, obj):
         due_date_str = ''
@@ -283,7 +288,7 @@ class ListComplianceSerializer(serializers.ModelSerializer):
         request = self.context.get('request')
         assigned_to = ''
         if is_internal(request) and obj.assigned_to:
-            system_user = retrieve_system_user(obj.assigned_to)
+            system_user = self.identity_resolver.get_system_user(obj.assigned_to)
             if system_user:
                 user_name = get_user_name(system_user)
                 assigned_to = user_name["full_name"]
@@ -0,0 +1,72 @@
+import logging
+
+from django.db import transaction
+from django.db.models import Q
+
+from mooringlicensing.components.compliances.models import Compliance, ComplianceUserAction
+
+logger = logging.getLogger(__name__)
+
+
+def change_compliance_statuses(queries, processing_status, customer_status):
+    """
+    Change the status of the compliances matching the queries with one update, and log the change with one insert.
+    Return the lodgement numbers of the compliances changed.
+    """
+    with transaction.atomic():
+        compliances = list(Compliance.objects.select_for_update(skip_locked=True).filter(queries).values_list('id', 'lodgement_number'))
+        compliance_ids = [compliance_id for compliance_id, lodgement_number in compliances]
+        Compliance.objects.filter(id__in=compliance_ids).update(processing_status=processing_status, customer_status=customer_status)
+        ComplianceUserAction.objects.bulk_create([
+            ComplianceUserAction(compliance_id=compliance_id, what=ComplianceUserAction.ACTION_STATUS_CHANGE.format(compliance_id))
+            for compliance_id in compliance_ids
+        ])
+
+    for compliance_id, lodgement_number in compliances:
+        logger.info('updated Compliance {} status to {}'.format(compliance_id, processing_status))
+    return [lodgement_number for compliance_id, lodgement_number in compliances]
+
+
+def update_compliance_statuses(today, compare_date):
+    """
+    Future --> Due for the compliances due by the compare_date, and Future/Due --> Overdue for the ones past their
+    due date.  Return the lodgement numbers of the compliances changed.
+    """
+    updates = []
+
+    # Future --> Due
+    queries = Q()
+    queries &= Q(due_date__gte=today)
+    queries &= Q(due_date__lte=compare_date)
+    queries &= Q(lodgement_date__isnull=True)
+    queries &= Q(processing_status__in=[Compliance.PROCESSING_STATUS_FUTURE,])
+    updates += change_compliance_statuses(queries, Compliance.PROCESSING_STATUS_DUE, Compliance.CUSTOMER_STATUS_DUE)
+
+    # Future/Due --> Overdue
+    queries = Q()
+    queries &= Q(due_date__lt=today)
+    queries &= Q(lodgement_date__isnull=True)
+    queries &= Q(processing_status__in=[Compliance.PROCESSING_STATUS_DUE, Compliance.PROCESSING_STATUS_FUTURE,])
+    updates += change_compliance_statuses(queries, Compliance.PROCESSING_STATUS_OVERDUE, Compliance.CUSTOMER_STATUS_OVERDUE)
+
+    return updates
+
+
+def get_compliance_reminder_candidates(due_dates):
+    """
+    Return (the due compliances whose due date is one of the reminder dates, the overdue compliances whose post due
+    date reminder hasn't been sent), with what the reminder emails need
+    """
+    related = ('proposal', 'proposal__proposal_applicant', 'approval')
+
+    queries = Q()
+    queries &= Q(processing_status = Compliance.PROCESSING_STATUS_DUE)
+    queries &= Q(due_date__in=due_dates)
+    compliance_due_reminder = Compliance.objects.filter(queries).select_related(*related).order_by('id')
+
+    queries = Q()
+    queries &= Q(processing_status = Compliance.PROCESSING_STATUS_OVERDUE)
+    queries &= Q(post_reminder_sent = False)
+    compliance_overdue_reminder = Compliance.objects.filter(queries).select_related(*related).order_by('id')
+
+    return compliance_due_reminder, compliance_overdue_reminder
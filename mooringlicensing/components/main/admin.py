@@ -4,7 +4,7 @@ from django.contrib import admin
 from mooringlicensing.components.main.models import (
     VesselSizeCategory, VesselSizeCategoryGroup, ApplicationType, 
     NumberOfDaysSetting, NumberOfDaysType, Document, 
-    FileExtensionWhitelist, Notice, JobQueue
+    FileExtensionWhitelist, Notice, JobQueue, RecordIssue
 )
 from mooringlicensing.components.payments_ml.models import OracleCodeItem
 from django.utils.html import mark_safe
@@ -21,6 +21,8 @@ class JobQueueAdmin(admin.ModelAdmin):
         'status',
         'created',
         'processed_dt',
+        'worker',
+        'attempts',
     ]
     readonly_fields = [
         'id',
@@ -31,6 +33,11 @@ class JobQueueAdmin(admin.ModelAdmin):
         'user',
         'created',
         'system_id',
+        'worker',
+        'started_dt',
+        'heartbeat_dt',
+        'attempts',
+        'error',
     ]
     list_filter = ['status']
     ordering = ['-id', ]
@@ -44,6 +51,20 @@ class JobQueueAdmin(admin.ModelAdmin):
     def has_change_permission(self, request, obj=None):
         return False
 
+@admin.register(RecordIssue)
+class RecordIssueAdmin(admin.ModelAdmin):
+    list_display = ['id', 'check_name', 'finding', 'first_seen', 'last_seen', 'resolved_at',]
+    readonly_fields = ['check_name', 'finding', 'first_seen', 'last_seen', 'resolved_at',]
+    list_filter = ['check_name',]
+    search_fields = ['finding',]
+    ordering = ['-last_seen', ]
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
 class NoticeForm(forms.ModelForm):
     message = forms.CharField(
         widget=SummernoteWidget(
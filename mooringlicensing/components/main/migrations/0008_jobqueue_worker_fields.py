@@ -0,0 +1,38 @@
+# Generated by Django 5.2.15 on 2026-10-18 10:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0007_numbersequence'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='jobqueue',
+            name='attempts',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='jobqueue',
+            name='error',
+            field=models.TextField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='jobqueue',
+            name='heartbeat_dt',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='jobqueue',
+            name='started_dt',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='jobqueue',
+            name='worker',
+            field=models.CharField(blank=True, max_length=255, null=True),
+        ),
+    ]
@@ -2,9 +2,9 @@ from __future__ import unicode_literals
 import pytz
 import os
 
-from django.db import models
-from django.core.exceptions import ValidationError
-from datetime import datetime
+from django.db import models, transaction, IntegrityError, connection
+from django.core.exceptions import ValidationError, FieldDoesNotExist
+from datetime import datetime, timedelta
 from django.dispatch import receiver
 from django.db.models.signals import post_save, post_delete
 from mooringlicensing import settings
@@ -18,6 +18,8 @@ from django.utils import timezone
 from django.utils.html import strip_tags
 
 import uuid
+import json
+import threading
 
 private_storage = FileSystemStorage(  # We want to store files in secure place (outside of the media folder)
     location=settings.PRIVATE_MEDIA_STORAGE_LOCATION,
@@ -34,9 +36,30 @@ class SanitiseMixin(models.Model):
         #sanitise
         exclude = kwargs.pop("exclude_sanitise", []) #fields that should not be subject to full tag removal
         error_on_change = kwargs.pop("error_on_sanitise", []) #fields that should not be modified through tag removal (and should throw and error if they are)
-        self = sanitise_fields(self, exclude, error_on_change)
+        self = sanitise_fields(self, exclude, error_on_change, fields=self.get_fields_to_sanitise(kwargs.get("update_fields")))
         super(SanitiseMixin, self).save(**kwargs)
 
+    def get_fields_to_sanitise(self, update_fields=None):
+        """
+        Return the attributes which may hold unsanitised values, or None for all of them.  The values loaded from
+        the database have been sanitised when they were saved, therefore only the fields being saved (update_fields)
+        and, for the models tracking them, the dirty fields need checking.
+        """
+        def get_attname(name):
+            try:
+                return self._meta.get_field(name).attname
+            except FieldDoesNotExist:
+                return name
+
+        fields = None
+        if update_fields is not None:
+            fields = set(get_attname(name) for name in update_fields)
+        if isinstance(self, DirtyFieldsMixin) and not self._state.adding:
+            # Relations hold ids, which are never sanitised
+            dirty_fields = set(get_attname(name) for name in self.get_dirty_fields(check_relationship=False))
+            fields = dirty_fields if fields is None else fields & dirty_fields
+        return fields
+
     class Meta:
         abstract = True
 
@@ -565,11 +588,15 @@ class NumberOfDaysSetting(RevisionedMixin):
         return setting
 
 class JobQueue(models.Model):
+    STATUS_PENDING = 0
+    STATUS_RUNNING = 1
+    STATUS_COMPLETED = 2
+    STATUS_FAILED = 3
     STATUS = (
-       (0, 'Pending'),
-       (1, 'Running'),
-       (2, 'Completed'),
-       (3, 'Failed'),
+       (STATUS_PENDING, 'Pending'),
+       (STATUS_RUNNING, 'Running'),
+       (STATUS_COMPLETED, 'Completed'),
+       (STATUS_FAILED, 'Failed'),
     )
 
     job_cmd = models.CharField(max_length=1000, null=True, blank=True)
@@ -579,10 +606,241 @@ class JobQueue(models.Model):
     processed_dt = models.DateTimeField(default=None,null=True, blank=True )
     user = models.IntegerField(blank=True, null=True)
     created = models.DateTimeField(auto_now_add=True)
+    worker = models.CharField(max_length=255, null=True, blank=True)  # Worker which claimed this job
+    started_dt = models.DateTimeField(null=True, blank=True)
+    heartbeat_dt = models.DateTimeField(null=True, blank=True)  # Updated by the worker while the job is running
+    attempts = models.PositiveSmallIntegerField(default=0)
+    error = models.TextField(null=True, blank=True)
 
     def __str__(self):
         return self.job_cmd   
 
+    @classmethod
+    def claim_pending_jobs(cls, worker, limit):
+        """
+        Mark up to limit pending jobs as running for the worker and return them.
+        Rows locked by another worker are skipped, so a job is never claimed twice.
+        """
+        if limit <= 0:
+            return []
+        now = timezone.now()
+        with transaction.atomic():
+            job_ids = list(cls.objects.select_for_update(skip_locked=True).filter(status=cls.STATUS_PENDING).order_by('created', 'id').values_list('id', flat=True)[:limit])
+            cls.objects.filter(id__in=job_ids).update(
+                status=cls.STATUS_RUNNING,
+                worker=worker,
+                started_dt=now,
+                heartbeat_dt=now,
+                attempts=models.F('attempts') + 1,
+            )
+        return list(cls.objects.filter(id__in=job_ids).order_by('created', 'id'))
+
+    @classmethod
+    def record_heartbeats(cls, job_ids):
+        return cls.objects.filter(id__in=job_ids, status=cls.STATUS_RUNNING).update(heartbeat_dt=timezone.now())
+
+    @classmethod
+    def requeue_stale_jobs(cls):
+        """
+        Running jobs whose worker stopped sending heartbeats are retried (or failed once the attempts are used up).
+        """
+        threshold = timezone.now() - timedelta(seconds=settings.JOB_QUEUE_HEARTBEAT_TIMEOUT)
+        stale_jobs = cls.objects.filter(status=cls.STATUS_RUNNING, heartbeat_dt__lt=threshold)
+        for job in stale_jobs:
+            job.record_failure(f'No heartbeat from the worker: [{job.worker}] since {job.heartbeat_dt}.')
+
+    def run(self):
+        """
+        Run the job command and record the result
+        """
+        from django.core import management
+        try:
+            parameters = json.dumps(self.parameters_json)
+        except Exception as e:
+            self.status = JobQueue.STATUS_FAILED
+            self.error = str(e)
+            self.save()
+            return False
+
+        # Keep sending heartbeats while the command is running
+        stop_heartbeat = threading.Event()
+        def send_heartbeats():
+            while not stop_heartbeat.wait(settings.JOB_QUEUE_HEARTBEAT_TIMEOUT / 3):
+                JobQueue.record_heartbeats([self.id])
+            connection.close()
+        heartbeat_thread = threading.Thread(target=send_heartbeats, daemon=True)
+        heartbeat_thread.start()
+
+        try:
+            management.call_command(self.job_cmd, parameters, self.user)
+        except Exception as e:
+            self.record_failure(str(e))
+            return False
+        finally:
+            stop_heartbeat.set()
+            heartbeat_thread.join()
+
+        self.processed_dt = timezone.now()
+        self.status = JobQueue.STATUS_COMPLETED
+        self.error = None
+        self.save()
+        return True
+
+    def record_failure(self, error):
+        """
+        Put the job back to the queue until the maximum number of attempts is reached
+        """
+        self.error = error
+        self.status = JobQueue.STATUS_PENDING if self.attempts < settings.JOB_QUEUE_MAX_ATTEMPTS else JobQueue.STATUS_FAILED
+        if self.status == JobQueue.STATUS_FAILED:
+            self.processed_dt = timezone.now()
+        self.save()
+
+
+class NumberSequence(models.Model):
+    """
+    Counter used to allocate the lodgement numbers.
+    The row is locked while a number is allocated, so concurrent requests never get the same number.
+    """
+    name = models.CharField(max_length=50, unique=True)
+    last_value = models.PositiveIntegerField(default=0)
+    date_updated = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'{self.name}: {self.last_value}'
+
+    @classmethod
+    def next_value(cls, name, get_initial_value=None):
+        """
+        Return the next number of the sequence.
+        When the sequence does not exist yet, it is created from get_initial_value() (e.g. the current maximum number).
+        """
+        return cls.reserve(name, 1, get_initial_value)
+
+    @classmethod
+    def reserve(cls, name, count, get_initial_value=None):
+        """
+        Reserve a contiguous block of count numbers in one atomic operation and return the first number of the block.
+        """
+        with transaction.atomic():
+            sequence = cls.objects.select_for_update().filter(name=name).first()
+            if sequence is None:
+                initial_value = get_initial_value() if get_initial_value else 0
+                try:
+                    with transaction.atomic():
+                        cls.objects.create(name=name, last_value=initial_value)
+                except IntegrityError:
+                    # Created by a concurrent request
+                    pass
+                sequence = cls.objects.select_for_update().get(name=name)
+            first_value = sequence.last_value + 1
+            sequence.last_value += count
+            sequence.save(update_fields=['last_value', 'date_updated',])
+            return first_value
+
+    @classmethod
+    def backfill(cls, name, current_max):
+        """
+        Make sure the sequence never issues a number lower than or equal to current_max.
+        """
+        with transaction.atomic():
+            sequence, created = cls.objects.select_for_update().get_or_create(name=name, defaults={'last_value': current_max})
+            if not created and sequence.last_value < current_max:
+                sequence.last_value = current_max
+                sequence.save(update_fields=['last_value', 'date_updated',])
+            return sequence
+
+
+class SearchDocument(models.Model):
+    """
+    Lower-cased names, emails and vessel registrations of a record, kept in one row so that the dashboards can search
+    them through a trigram index instead of joining the user and applicant tables on each request.
+    """
+    SEPARATOR = '|'
+
+    people = models.TextField(blank=True, default='')
+    vessels = models.TextField(blank=True, default='')
+    date_updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def build_text(cls, values):
+        return cls.SEPARATOR.join(sorted({str(value).strip().lower() for value in values if value and str(value).strip()}))
+
+    @staticmethod
+    def person_values(first_name, last_name, email):
+        return ['{} {}'.format(first_name or '', last_name or ''), email]
+
+    @staticmethod
+    def get_system_user_values(ledger_ids):
+        """
+        Return {ledger_id: [full name, email]} of the system users in one query
+        """
+        from ledger_api_client.managed_models import SystemUser
+        ledger_ids = [ledger_id for ledger_id in set(ledger_ids) if ledger_id]
+        if not ledger_ids:
+            return {}
+        return {
+            ledger_id: SearchDocument.person_values(first_name, last_name, email)
+            for ledger_id, first_name, last_name, email in SystemUser.objects.filter(ledger_id__in=ledger_ids).values_list('ledger_id', 'legal_first_name', 'legal_last_name', 'email')
+        }
+
+    @classmethod
+    def search(cls, search_text, fields=('people', 'vessels',)):
+        """
+        Return the documents containing the search text in any of the fields.  The fields are stored lower-cased,
+        so a plain LIKE is used, which the trigram indexes can serve.
+        """
+        search_text = search_text.strip().lower()
+        query = models.Q()
+        for field in fields:
+            query |= models.Q(**{f'{field}__contains': search_text})
+        return cls.objects.filter(query)
+
+    @classmethod
+    def save_documents(cls, key_field, documents):
+        """
+        Create or update the documents given as {key id: (people values, vessel values)}
+        """
+        existing = {getattr(document, key_field + '_id'): document for document in cls.objects.filter(**{key_field + '_id__in': documents.keys()})}
+        now = timezone.now()
+        to_create, to_update = [], []
+        for key, (people, vessels) in documents.items():
+            people, vessels = cls.build_text(people), cls.build_text(vessels)
+            document = existing.get(key)
+            if document is None:
+                to_create.append(cls(**{key_field + '_id': key, 'people': people, 'vessels': vessels}))
+            elif document.people != people or document.vessels != vessels:
+                document.people, document.vessels, document.date_updated = people, vessels, now
+                to_update.append(document)
+        cls.objects.bulk_create(to_create, ignore_conflicts=True)
+        cls.objects.bulk_update(to_update, ['people', 'vessels', 'date_updated',])
+
+
+class RecordIssue(models.Model):
+    """
+    A finding of a record_issues_report check, e.g. the lodgement number of an approval late to be expired.
+    A finding is kept open while the check keeps finding it, and resolved when a full run no longer does, so the report
+    can tell the new findings from the ones which have been there for a while.
+    """
+    check_name = models.CharField(max_length=100)
+    finding = models.CharField(max_length=255)
+    first_seen = models.DateTimeField()
+    last_seen = models.DateTimeField()
+    resolved_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        app_label = 'mooringlicensing'
+        constraints = [
+            models.UniqueConstraint(fields=['check_name', 'finding'], condition=models.Q(resolved_at=None), name='record_issue_open_unique'),
+        ]
+
+    def __str__(self):
+        return f'{self.check_name}: {self.finding}'
+
+
 import reversion
 #reversion.register(GlobalSettings, follow=[])
 #reversion.register(VesselSizeCategoryGroup, follow=['vessel_size_categories', 'fee_constructors']) - cannot be changed after use
@@ -1,6 +1,7 @@
 from rest_framework import serializers
 from mooringlicensing.components.main.models import CommunicationsLogEntry
 from ledger_api_client.ledger_models import EmailUserRO
+from mooringlicensing.ledger_api_utils import IdentityResolver
 
 
 class CommunicationLogEntrySerializer(serializers.ModelSerializer):
@@ -25,4 +26,37 @@ class CommunicationLogEntrySerializer(serializers.ModelSerializer):
         )
 
     def get_documents(self,obj):
-        return [[d.name,d._file.url] for d in obj.documents.all()]
\ No newline at end of file
+        return [[d.name,d._file.url] for d in obj.documents.all()]
+
+
+class IdentityPrefetchListSerializer(serializers.ListSerializer):
+    """
+    Collect the user ids required by every item of the page from the child serializer,
+    then fetch the SystemUser/EmailUserRO objects in one query per type before serializing the items.
+    """
+    def to_representation(self, data):
+        items = list(data.all() if hasattr(data, 'all') else data)
+        system_user_ids = set()
+        email_user_ids = set()
+        for item in items:
+            item_system_user_ids, item_email_user_ids = self.child.get_identity_ids(item)
+            system_user_ids.update(item_system_user_ids)
+            email_user_ids.update(item_email_user_ids)
+        IdentityResolver.from_context(self.child.context).prefetch(system_user_ids, email_user_ids)
+        return super().to_representation(items)
+
+
+class IdentityResolverMixin:
+    """
+    Used with the list serializers to look up users through the IdentityResolver shared in the serializer context.
+    Subclasses override get_identity_ids() and set Meta.list_serializer_class = IdentityPrefetchListSerializer.
+    """
+    @property
+    def identity_resolver(self):
+        return IdentityResolver.from_context(self.context)
+
+    def get_identity_ids(self, obj):
+        """
+        Return a tuple of (ids of the SystemUsers (ledger_id), ids of the EmailUserROs) required to serialize the obj
+        """
+        return [], []
@@ -1,4 +1,9 @@
+import hashlib
+import math
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
 from django.core.files.base import ContentFile
 import csv
 from ledger_api_client.settings_base import TIME_ZONE
@@ -7,6 +12,7 @@ from confy import env
 import re
 
 import requests
+from requests.adapters import HTTPAdapter
 from requests.auth import HTTPBasicAuth
 import json
 import pytz
@@ -27,17 +33,17 @@ from mooringlicensing.components.proposals.models import (
     StickerPrintingBatch,
     Proposal, VesselDetails, VesselOwnership
 )
-from mooringlicensing.components.payments_ml.models import ApplicationFee, StickerActionFee
+from mooringlicensing.components.main.models import VesselSizeCategory
+from mooringlicensing.components.payments_ml.models import ApplicationFee, StickerActionFee, FeeItem, PaymentChain
 
 from ledger_api_client.ledger_models import Invoice
 from ledger_api_client.managed_models import SystemUser
 from rest_framework import serializers
-from copy import deepcopy
 import logging
-from mooringlicensing.settings import MAX_NUM_ROWS_MODEL_EXPORT
-from django.db.models import Case, Value, When, CharField, Count, OuterRef, Subquery, Min, Max
+from mooringlicensing.settings import MAX_NUM_ROWS_MODEL_EXPORT, MODEL_EXPORT_CHUNK_SIZE
+from django.db.models import Case, Value, When, CharField, Count, OuterRef, Subquery, Min, Max, Window
 from django.contrib.postgres.fields import ArrayField
-from django.db.models.functions import Concat, Cast
+from django.db.models.functions import Concat, Cast, RowNumber
 import csv
 import xlsxwriter
 import datetime
@@ -45,11 +51,6 @@ import uuid
 from django.contrib.postgres.aggregates import ArrayAgg
 from urllib import parse
 
-from mooringlicensing.settings import (
-    PROPOSAL_TYPE_RENEWAL, 
-    PROPOSAL_TYPE_NEW,
-)
-
 logger = logging.getLogger(__name__)
 
 
@@ -213,85 +214,184 @@ def generate_pdf_files():
     return errors, updates
 
 ## Mooring Bookings API interactions
+MOORING_SYNC_FIELDS = [
+    'name',
+    'mooring_bay_id',
+    'vessel_size_limit',
+    'vessel_draft_limit',
+    'vessel_beam_limit',
+    'vessel_weight_limit',
+    'mooring_bookings_mooring_specification',
+    'mooring_bookings_bay_id',
+]
+
+
+def get_mooring_group_id():
+    # get mooring_group_id from MB admin Mooring Groups, Rottnest Is Auth and store as env var
+    if not env('MOORING_GROUP_ID'):
+        raise Exception('You must set MOORING_GROUP_ID env var')
+    return env('MOORING_GROUP_ID')
+
+
+def get_mooring_bookings_data(path):
+    url = settings.MOORING_BOOKINGS_API_URL + path + settings.MOORING_BOOKINGS_API_KEY
+    res = requests.get(url)
+    res.raise_for_status()
+    return res.json().get('data')
+
+
+def is_value_changed(current_value, new_value):
+    if isinstance(current_value, Decimal):
+        # The API returns the limits as numbers or strings, e.g. 2.5 for Decimal('2.50')
+        try:
+            return current_value != Decimal(str(new_value))
+        except Exception:
+            return True
+    return current_value != new_value
+
+
+def log_sync_stats(name, stats):
+    logger.info('Mooring Bookings sync [{}]: {}'.format(name, ', '.join('{}: {}'.format(key, value) for key, value in stats.items())))
+
+
+def sync_moorings(data):
+    """
+    Apply the moorings from Mooring Bookings to the Mooring table.  The existing rows are indexed by their
+    mooring_bookings_id, only the rows which have changed are written, and all the changes are written in bulk in
+    one transaction.
+    """
+    mooring_group_id = get_mooring_group_id()
+    stats = {'received': len(data), 'created': 0, 'updated': 0, 'activated': 0, 'deactivated': 0, 'skipped': 0}
+    records_updated = []
+
+    # The active bays, by the mooring_bookings_id.  A bay which can't be identified (none or more than one) is left out.
+    bays = {}
+    for mooring_bay in MooringBay.objects.filter(active=True):
+        bays[mooring_bay.mooring_bookings_id] = None if mooring_bay.mooring_bookings_id in bays else mooring_bay
+
+    moorings = list(Mooring.objects.order_by('id'))
+    moorings_by_mooring_bookings_id = {}
+    for mooring in moorings:
+        moorings_by_mooring_bookings_id.setdefault(mooring.mooring_bookings_id, mooring)
+
+    to_create = []
+    to_update = {}
+    for mooring_data in data:
+        if mooring_data.get('mooring_specification') != 2 or mooring_group_id not in mooring_data.get('mooring_group'):
+            continue
+        mooring_bay = bays.get(mooring_data.get('marine_park_id'))
+        if not mooring_bay:
+            stats['skipped'] += 1
+            continue
+
+        values = {
+            'name': remove_html_tags(mooring_data.get('name')),
+            'mooring_bay_id': mooring_bay.id,
+            'vessel_size_limit': mooring_data.get('vessel_size_limit'),
+            'vessel_draft_limit': mooring_data.get('vessel_draft_limit'),
+            'vessel_beam_limit': mooring_data.get('vessel_beam_limit'),
+            'vessel_weight_limit': mooring_data.get('vessel_weight_limit'),
+            'mooring_bookings_mooring_specification': mooring_data.get('mooring_specification'),
+            'mooring_bookings_bay_id': mooring_data.get('marine_park_id'),
+        }
+        mooring = moorings_by_mooring_bookings_id.get(mooring_data.get('id'))
+        if mooring:
+            changed = [field for field, value in values.items() if is_value_changed(getattr(mooring, field), value)]
+            if changed:
+                for field in changed:
+                    setattr(mooring, field, values[field])
+                to_update[mooring.id] = mooring
+                stats['updated'] += 1
+                records_updated.append(str(mooring.name))
+        else:
+            mooring = Mooring(mooring_bookings_id=mooring_data.get('id'), **values)
+            to_create.append(mooring)
+            # In case the same mooring is sent twice
+            moorings_by_mooring_bookings_id[mooring.mooring_bookings_id] = mooring
+            stats['created'] += 1
+            records_updated.append(str(mooring.name))
+
+    # Active only when Mooring Bookings still has it
+    mooring_bookings_ids = set(mooring_data.get('id') for mooring_data in data)
+    for mooring in moorings:
+        active = mooring.mooring_bookings_id in mooring_bookings_ids
+        if mooring.active != active:
+            mooring.active = active
+            to_update[mooring.id] = mooring
+            stats['activated' if active else 'deactivated'] += 1
+
+    with transaction.atomic():
+        Mooring.objects.bulk_create(to_create)
+        Mooring.objects.bulk_update(to_update.values(), MOORING_SYNC_FIELDS + ['active'], batch_size=500)
+
+    # bulk_update() doesn't send post_save, therefore refresh the dashboard of the mooring licences here
+    from mooringlicensing.components.approvals.utils import refresh_approval_list_summaries
+    refresh_approval_list_summaries([mooring.mooring_licence_id for mooring in to_update.values() if mooring.mooring_licence_id])
+
+    for mooring in to_create:
+        logger.info("Mooring created: {}".format(str(mooring)))
+    logger.info("Moorings updated: {}".format(str(records_updated)))
+    log_sync_stats('moorings', stats)
+    return records_updated, stats
+
+
+def sync_mooring_bays(data):
+    """
+    Apply the marine parks from Mooring Bookings to the MooringBay table, in the same way as sync_moorings()
+    """
+    mooring_group_id = get_mooring_group_id()
+    stats = {'received': len(data), 'created': 0, 'updated': 0, 'deactivated': 0}
+    records_updated = []
+
+    mooring_bays = list(MooringBay.objects.order_by('id'))
+    mooring_bays_by_mooring_bookings_id = {}
+    for mooring_bay in mooring_bays:
+        mooring_bays_by_mooring_bookings_id.setdefault(mooring_bay.mooring_bookings_id, mooring_bay)
+
+    to_create = []
+    to_update = {}
+    for bay in data:
+        if mooring_group_id != bay.get('mooring_group'):
+            continue
+        name = remove_html_tags(bay.get('name'))
+        mooring_bay = mooring_bays_by_mooring_bookings_id.get(bay.get('id'))
+        if mooring_bay:
+            if mooring_bay.name != name:
+                mooring_bay.name = name
+                to_update[mooring_bay.id] = mooring_bay
+                stats['updated'] += 1
+                records_updated.append(str(mooring_bay.name))
+        else:
+            mooring_bay = MooringBay(mooring_bookings_id=bay.get('id'), name=name)
+            to_create.append(mooring_bay)
+            mooring_bays_by_mooring_bookings_id[mooring_bay.mooring_bookings_id] = mooring_bay
+            stats['created'] += 1
+            records_updated.append(str(mooring_bay.name))
+
+    # update active status of any MooringBay records not found in api data
+    mooring_bookings_ids = set(bay.get('id') for bay in data)
+    for mooring_bay in mooring_bays:
+        if mooring_bay.active and mooring_bay.mooring_bookings_id not in mooring_bookings_ids:
+            mooring_bay.active = False
+            to_update[mooring_bay.id] = mooring_bay
+            stats['deactivated'] += 1
+
+    with transaction.atomic():
+        MooringBay.objects.bulk_create(to_create)
+        MooringBay.objects.bulk_update(to_update.values(), ['name', 'active'], batch_size=500)
+
+    for mooring_bay in to_create:
+        logger.info("Mooring Bay created: {}".format(str(mooring_bay)))
+    log_sync_stats('mooring bays', stats)
+    return records_updated, stats
+
+
 def retrieve_mooring_areas():
     records_updated = []
     try:
-        url = settings.MOORING_BOOKINGS_API_URL + "all-mooring/" + settings.MOORING_BOOKINGS_API_KEY
-        res = requests.get(url)
-        res.raise_for_status()
-        data = res.json().get('data')
-        # update Mooring records
-        with transaction.atomic():
-            for mooring in data:
-                # get mooring_group_id from MB admin Mooring Groups, Rottnest Is Auth and store as env var
-                if not env('MOORING_GROUP_ID'):
-                    raise Exception('You must set MOORING_GROUP_ID env var')
-                else:
-                    mooring_group_id = env('MOORING_GROUP_ID')
-
-                if mooring.get('mooring_specification') != 2 or mooring_group_id not in mooring.get('mooring_group'):
-                    continue
-                mooring_qs = Mooring.objects.filter(mooring_bookings_id=mooring.get("id"))
-                if mooring_qs.count() > 0:
-                    mo = mooring_qs[0]
-                    orig_mo = deepcopy(mo)
-                    mo.mooring_bookings_id=mooring.get("id")
-                    mo.name=mooring.get("name")
-                    try:
-                        mo.mooring_bay = MooringBay.objects.get(
-                            mooring_bookings_id=mooring.get('marine_park_id'), 
-                            active=True
-                        )
-                    except:
-                        continue
-                    mo.vessel_size_limit = mooring.get('vessel_size_limit')
-                    mo.vessel_draft_limit = mooring.get('vessel_draft_limit')
-                    mo.vessel_beam_limit = mooring.get('vessel_beam_limit')
-                    mo.vessel_weight_limit = mooring.get('vessel_weight_limit')
-                    mo.mooring_bookings_mooring_specification = mooring.get('mooring_specification')
-                    mo.mooring_bookings_bay_id = mooring.get('marine_park_id')
-                    mo.save()
-                    
-                    if (float(mo.vessel_size_limit) != float(orig_mo.vessel_size_limit) or
-                        float(mo.vessel_draft_limit) != float(orig_mo.vessel_draft_limit) or
-                        float(mo.vessel_beam_limit) != float(orig_mo.vessel_beam_limit) or
-                        float(mo.vessel_weight_limit) != float(orig_mo.vessel_weight_limit) or
-                        float(mo.mooring_bookings_mooring_specification) != float(orig_mo.mooring_bookings_mooring_specification) or
-                        float(mo.mooring_bookings_bay_id) != float(orig_mo.mooring_bookings_bay_id)):
-                        records_updated.append(str(mo.name))
-                else:
-                    try:
-                        mooring_bay = MooringBay.objects.get(
-                            mooring_bookings_id=mooring.get('marine_park_id'), 
-                            active=True
-                        )
-                    except:
-                        continue
-                    
-                    mooring = Mooring.objects.create(
-                            mooring_bookings_id=mooring.get("id"), 
-                            name=mooring.get("name"),
-                            mooring_bay = mooring_bay,
-                            vessel_size_limit = mooring.get('vessel_size_limit'),
-                            vessel_draft_limit = mooring.get('vessel_draft_limit'),
-                            vessel_beam_limit = mooring.get('vessel_beam_limit'),
-                            vessel_weight_limit = mooring.get('vessel_weight_limit'),
-                            mooring_bookings_mooring_specification = mooring.get('mooring_specification'),
-                            mooring_bookings_bay_id = mooring.get('marine_park_id')
-                            )
-                    logger.info("Mooring created: {}".format(str(mooring)))
-                    records_updated.append(str(mooring.name))
-
-            logger.info("Moorings updated: {}".format(str(records_updated)))
-            # update active status of any MooringBay records not found in api data
-            for mooring_obj in Mooring.objects.all():
-                if mooring_obj.mooring_bookings_id not in [x.get("id") for x in data]:
-                    mooring_obj.active = False
-                    mooring_obj.save()
-                elif mooring_obj.mooring_bookings_id in [x.get("id") for x in data]:
-                    mooring_obj.active = True
-                    mooring_obj.save()
-            return [], records_updated
+        data = get_mooring_bookings_data("all-mooring/")
+        records_updated, stats = sync_moorings(data)
+        return [], records_updated
 
     except Exception as e:
         logger.error('retrieve_mooring_areas() error', exc_info=True)
@@ -302,39 +402,9 @@ def retrieve_marine_parks():
     records_updated = []
     try:
         # CRON (every night?)  Plus management button for manual control.
-        url = settings.MOORING_BOOKINGS_API_URL + "marine-parks/" + settings.MOORING_BOOKINGS_API_KEY
-        res = requests.get(url)
-        res.raise_for_status()
-        data = res.json().get('data')
-        # update MooringBay records
-        with transaction.atomic():
-            for bay in data:
-                # get mooring_group_id from MB admin Mooring Groups, Rottnest Is Auth and store as env var
-                if not env('MOORING_GROUP_ID'):
-                    raise Exception('You must set MOORING_GROUP_ID env var')
-                else:
-                    mooring_group_id = env('MOORING_GROUP_ID')
-
-                if mooring_group_id != bay.get('mooring_group'):
-                    continue
-                mooring_bay_qs = MooringBay.objects.filter(mooring_bookings_id=bay.get("id"))
-                if mooring_bay_qs.count() > 0:
-                    mb = mooring_bay_qs[0]
-                    if mb.name != bay.get("name"):
-                        mb.name=bay.get("name")
-                        mb.save()
-                        records_updated.append(str(mb.name))
-                else:
-                    mooring_bay = MooringBay.objects.create(mooring_bookings_id=bay.get("id"), name=bay.get("name"))
-                    logger.info("Mooring Bay created: {}".format(str(mooring_bay)))
-                    records_updated.append(str(mooring_bay.name))
-
-            # update active status of any MooringBay records not found in api data
-            for mooring_bay in MooringBay.objects.all():
-                if mooring_bay.mooring_bookings_id not in [x.get("id") for x in data]:
-                    mooring_bay.active = False
-                    mooring_bay.save()
-            return [], records_updated
+        data = get_mooring_bookings_data("marine-parks/")
+        records_updated, stats = sync_mooring_bays(data)
+        return [], records_updated
     except Exception as e:
         logger.error('retrieve_marine_parks() error', exc_info=True)
         return ['check log',], records_updated
@@ -354,18 +424,20 @@ def sticker_export():
     This function exports sticker details data as a spreadsheet file,
     and store it as a StickerPrintingBatch object.
     """
+    from mooringlicensing.components.approvals.utils import refresh_search_documents, refresh_approval_list_summaries
     logger = logging.getLogger('cron_tasks')
 
     stickers = Sticker.objects.filter(
         sticker_printing_batch__isnull=True,
         status=Sticker.STICKER_STATUS_READY,
-    )
+    ).select_related('approval', 'approval__current_proposal', 'fee_season',)
 
     errors = []
     updates = []
     today = timezone.localtime(timezone.now()).date()
 
-    if stickers.count():
+    stickers = list(stickers)
+    if len(stickers):
         try:
 
             data = []
@@ -388,12 +460,12 @@ def sticker_export():
                 'Vessel Length',
                 'Season',
             ])
+
+            stickers_exported = []
+            rows = []
+            approval_histories = []
             for sticker in stickers:
                 try:
-                    # Sticker is being printed.  We assign a new number here.
-                    sticker.number = '{0:07d}'.format(sticker.next_number)
-                    sticker.save()
-
                     moorings = sticker.get_moorings()
                     mooring_names = [mooring.name for mooring in moorings]
                     mooring_names = ', '.join(mooring_names)
@@ -425,26 +497,44 @@ def sticker_export():
                     for i in range (0,len(sticker_batch_property_values)-1):
                         sticker_batch_properties[data[0][i].lower().replace(" ","_")] = sticker_batch_property_values[i]
 
-                    sticker.batch_property_cache = sticker_batch_properties
-                    data.append(sticker_batch_property_values)
-                    logger.info('Sticker: {} details added to the spreadsheet'.format(sticker.number))
-                    updates.append(sticker.number)
-                    sticker.save()
-                    new_approval_history_entry = ApprovalHistory.objects.create(
+                    approval_history = ApprovalHistory(
                         vessel_ownership=sticker.approval.current_proposal.vessel_ownership,
                         approval=sticker.approval,
                         proposal=sticker.approval.current_proposal,
                         start_date=sticker.approval.issue_date,
                         approval_letter=sticker.approval.licence_document,
                     )
-                    new_approval_history_entry.stickers.add(sticker)
-                    new_approval_history_entry.save()
+
+                    sticker.batch_property_cache = sticker_batch_properties
+                    rows.append(sticker_batch_property_values)
+                    stickers_exported.append(sticker)
+                    approval_histories.append(approval_history)
 
                 except Exception as e:
-                    err_msg = 'Error adding sticker: {} details to spreadsheet.'.format(sticker.number)
+                    err_msg = 'Error adding sticker: {} details to spreadsheet.'.format(sticker)
                     logger.error('{}\n{}'.format(err_msg, str(e)))
                     errors.append(err_msg)
 
+            # Sticker is being printed.  We assign a new number here.
+            # Reserve a contiguous block of numbers for the stickers added to the spreadsheet only.
+            sticker_number_index = data[0].index('Sticker Number')
+            first_number = Sticker.reserve_numbers(len(stickers_exported)) if stickers_exported else None
+            for index, (sticker, sticker_batch_property_values) in enumerate(zip(stickers_exported, rows)):
+                sticker.number = '{0:07d}'.format(first_number + index)
+                sticker_batch_property_values[sticker_number_index] = sticker.number
+                sticker.batch_property_cache['sticker_number'] = sticker.number
+                data.append(sticker_batch_property_values)
+                logger.info('Sticker: {} details added to the spreadsheet'.format(sticker.number))
+                updates.append(sticker.number)
+
+            with transaction.atomic():
+                Sticker.objects.bulk_update(stickers_exported, ['number', 'batch_property_cache',])
+                approval_histories = ApprovalHistory.objects.bulk_create(approval_histories)
+                ApprovalHistory.stickers.through.objects.bulk_create([
+                    ApprovalHistory.stickers.through(approvalhistory_id=approval_history.id, sticker_id=sticker.id)
+                    for approval_history, sticker in zip(approval_histories, stickers_exported)
+                ])
+
             batch_obj = StickerPrintingBatch.objects.create()
             filename = 'RIA-{}.csv'.format(batch_obj.uploaded_date.astimezone(pytz.timezone(TIME_ZONE)).strftime('%Y%m%d'))
 
@@ -461,9 +551,12 @@ def sticker_export():
                 logger.info('Sticker printing batch file {} generated successfully.'.format(batch_obj.name))
 
             # Update sticker objects
-            stickers.update(
+            Sticker.objects.filter(id__in=[sticker.id for sticker in stickers]).update(
                 sticker_printing_batch=batch_obj,  # Keep status 'printing' because we still have to wait for the sticker printed.
             )
+            # The bulk writes above don't send post_save
+            refresh_search_documents(sticker_ids=[sticker.id for sticker in stickers_exported])
+            refresh_approval_list_summaries([sticker.approval_id for sticker in stickers_exported])
         except Exception as e:
             err_msg = 'Error generating the sticker printing batch spreadsheet file for the stickers: {}'.format(', '.join([sticker.number for sticker in stickers]))
             logger.error('{}\n{}'.format(err_msg, str(e)))
@@ -532,44 +625,95 @@ def get_client_ip(request):
     return ip
 
 
-def get_dot_vessel_information(request,json_string):
+class DotLookup(object):
+    # A DoT lookup in progress, which the threads asking for the same vessel wait for
+    def __init__(self):
+        self.done = threading.Event()
+        self.response_text = None
+        self.error = None
+
+
+_dot_lookups = {}
+_dot_lookups_lock = threading.Lock()
+
+
+def get_dot_lookup_cache_key(json_string):
+    # The owner is part of the key, as DoT answers whether the owner matches the vessel
+    lookup = json.loads(json_string)
+    rego_no = str(lookup.get('boatRegistrationNumber', '')).strip().upper()
+    owner = str(lookup.get('owner', '')).strip().lower()
+    return settings.CACHE_KEY_DOT_VESSEL_INFORMATION.format(hashlib.sha256('{}|{}'.format(rego_no, owner).encode()).hexdigest())
+
+
+def get_dot_lookup_cache_timeout(response_text):
+    """
+    Return how long the DoT response can be cached for, or None when it must not be cached (errors)
+    """
+    try:
+        response_json = json.loads(response_text)
+    except Exception:
+        return None
+    if not isinstance(response_json, dict) or (response_json.get("status") and not response_json.get("status") == 200) or not isinstance(response_json.get("data"), dict):
+        return None
+    data = response_json.get("data")
+    if data.get("boatFound") == "Y" and data.get("boatOwnerMatch") == "Y":
+        return settings.DOT_CACHE_TIMEOUT
+    # Not found or not matching: the applicant may be sorting it out with DoT, so check again sooner
+    return settings.DOT_CACHE_NEGATIVE_TIMEOUT
+
+
+def request_dot_vessel_information(request, json_string):
     DOT_URL=settings.DOT_URL
     paramGET=parse.quote(json_string.replace("\n", ""))
     client_ip = get_client_ip(request)
     auth=auth=HTTPBasicAuth(settings.DOT_USERNAME,settings.DOT_PASSWORD)
-    r = requests.get(DOT_URL+"?paramGET="+paramGET+"&client_ip="+client_ip, auth=auth)
+    r = requests.get(DOT_URL+"?paramGET="+paramGET+"&client_ip="+client_ip, auth=auth, timeout=settings.DOT_TIMEOUT)
     return r.text
 
-def get_removed_vessels_in_current_season(approval):
 
-    #get all vessel ownership formerly on approval (identified via proposals in seasons)
-    proposal_ids = []
-    vessel_ownership_ids = []
-    continue_loop = True
+def get_dot_vessel_information(request,json_string):
+    """
+    Return the DoT response for the vessel lookup.  Responses are cached by the rego number and the owner, and
+    threads looking up the same vessel at the same time share one request to DoT.
+    """
+    cache_key = get_dot_lookup_cache_key(json_string)
+    response_text = cache.get(cache_key)
+    if response_text is not None:
+        return response_text
+
+    with _dot_lookups_lock:
+        dot_lookup = _dot_lookups.get(cache_key)
+        in_progress = dot_lookup is not None
+        if not in_progress:
+            dot_lookup = DotLookup()
+            _dot_lookups[cache_key] = dot_lookup
+
+    if in_progress:
+        if dot_lookup.done.wait(settings.DOT_TIMEOUT) and dot_lookup.error is None:
+            return dot_lookup.response_text
+        # The other lookup has failed, try again
+        return request_dot_vessel_information(request, json_string)
 
-    proposal = approval.current_proposal
+    try:
+        response_text = request_dot_vessel_information(request, json_string)
+        dot_lookup.response_text = response_text
+        timeout = get_dot_lookup_cache_timeout(response_text)
+        if timeout:
+            cache.set(cache_key, response_text, timeout)
+        return response_text
+    except Exception as e:
+        dot_lookup.error = e
+        raise
+    finally:
+        with _dot_lookups_lock:
+            _dot_lookups.pop(cache_key, None)
+        dot_lookup.done.set()
 
-    while continue_loop:
-        if proposal:
-            if proposal.id in proposal_ids:
-                continue_loop = False
-                break
-            
-            proposal_ids.append(proposal.id)
-            if proposal.vessel_ownership:
-                vessel_ownership_ids.append(proposal.vessel_ownership.id)
-
-            if proposal.proposal_type.code in [PROPOSAL_TYPE_NEW, PROPOSAL_TYPE_RENEWAL]:
-                # Now, 'prev_application' is the very first application for this season
-                # We are not interested in any older applications
-                continue_loop = False
-                break
-            else:
-                # Assign the previous application, then perform checking above again
-                proposal = proposal.previous_application
-        else:
-            continue_loop = False
-            break
+def get_removed_vessels_in_current_season(approval):
+
+    #get all vessel ownership formerly on approval (identified via proposals in seasons)
+    proposal_ids = PaymentChain.get_proposal_ids(approval.current_proposal) if approval.current_proposal else []
+    vessel_ownership_ids = Proposal.objects.filter(id__in=proposal_ids, vessel_ownership__isnull=False).values_list('vessel_ownership_id', flat=True)
 
     vessel_ownership_ids = list(set(vessel_ownership_ids))
 
@@ -582,113 +726,212 @@ def get_removed_vessels_in_current_season(approval):
         current_vooa_ids = list(approval.child_obj.get_current_vessel_ownership_on_approvals().values_list("vessel_ownership_id",flat=True))
         return VesselOwnership.objects.filter(id__in=vessel_ownership_ids).filter(Q(end_date__isnull=False)|~Q(id__in=current_vooa_ids))
 
-def export_to_mooring_booking(approval_id):
+def get_mooring_bookings_export_payloads(approval):
+    """
+    Return {vessel_rego: (vessel, payload)} of the vessel licence updates to be sent to Mooring Bookings for the approval.
+    When a vessel is both on the approval and removed from it during this season, the later (cancelled) one is kept.
+    """
+    licence_type = None
+    if type(approval.child_obj) == MooringLicence:
+        licence_type = 1
+    elif type(approval.child_obj) == AuthorisedUserPermit:
+        licence_type = 2
+    elif type(approval.child_obj) == AnnualAdmissionPermit:
+        licence_type = 3
+
+    def get_payload(vessel, status):
+        return {
+            'vessel_rego': vessel.rego_no,
+            'licence_id': approval.id,
+            'licence_type': licence_type,
+            'start_date': approval.start_date.strftime('%Y-%m-%d') if approval.start_date else '',
+            'expiry_date' : approval.expiry_date.strftime('%Y-%m-%d') if approval.expiry_date else '',
+            'status' : status,
+        }
+
+    payloads = {}
+    status = 'active' if approval.status == 'current' else 'cancelled'
+    if (type(approval.child_obj) in [AnnualAdmissionPermit, AuthorisedUserPermit]
+        and approval.current_proposal
+        and approval.current_proposal.vessel_ownership and not approval.current_proposal.vessel_ownership.end_date and approval.current_proposal.vessel_ownership.vessel):
+        vessel = approval.current_proposal.vessel_ownership.vessel
+        payloads[vessel.rego_no] = (vessel, get_payload(vessel, status))
+    elif type(approval.child_obj) == MooringLicence:
+        for vessel_ownership in approval.child_obj.vessel_ownership_list:
+            if vessel_ownership.vessel:
+                payloads[vessel_ownership.vessel.rego_no] = (vessel_ownership.vessel, get_payload(vessel_ownership.vessel, status))
+
+    for vessel_ownership in get_removed_vessels_in_current_season(approval) or []:
+        if vessel_ownership.vessel:
+            payloads[vessel_ownership.vessel.rego_no] = (vessel_ownership.vessel, get_payload(vessel_ownership.vessel, 'cancelled'))
+    return payloads
+
+
+def enqueue_mooring_bookings_exports(approval_ids):
+    """
+    Put the latest state of the approvals in the Mooring Bookings outbox and clear their export_to_mooring_booking flag.
+    A pending update for the same approval and vessel is replaced rather than queued again.
+    """
+    from mooringlicensing.components.approvals.models import MooringBookingsExport
+
+    num_of_updates = 0
+    for approval in Approval.objects.filter(id__in=approval_ids):
+        payloads = get_mooring_bookings_export_payloads(approval)
+        with transaction.atomic():
+            pending = {export.vessel_rego: export for export in MooringBookingsExport.objects.select_for_update().filter(approval=approval, status=MooringBookingsExport.STATUS_PENDING)}
+            for vessel_rego, (vessel, payload) in payloads.items():
+                export = pending.get(vessel_rego)
+                if export:
+                    export.vessel = vessel
+                    export.payload = payload
+                    export.version += 1
+                    export.attempts = 0
+                    export.next_attempt_at = timezone.now()
+                    export.last_error = None
+                    export.save()
+                else:
+                    MooringBookingsExport.objects.create(approval=approval, vessel=vessel, vessel_rego=vessel_rego, payload=payload)
+                num_of_updates += 1
+            # The flag only, without the side effects of Approval.save()
+            Approval.objects.filter(id=approval.id).update(export_to_mooring_booking=False)
+    return num_of_updates
+
+
+_mooring_bookings_session = None
+_mooring_bookings_session_lock = threading.Lock()
+
+
+def get_mooring_bookings_session():
+    # One session for the process, so that the connections to Mooring Bookings are reused
+    global _mooring_bookings_session
+    with _mooring_bookings_session_lock:
+        if _mooring_bookings_session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=settings.MOORING_BOOKINGS_EXPORT_MAX_WORKERS)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            _mooring_bookings_session = session
+        return _mooring_bookings_session
+
+
+def send_mooring_bookings_export(session, export):
+    """
+    Return None when Mooring Bookings has accepted the update, otherwise the error
+    """
+    url = settings.MOORING_BOOKINGS_API_URL + "licence-create-update/" + settings.MOORING_BOOKINGS_API_KEY + '/'
     try:
-        url = settings.MOORING_BOOKINGS_API_URL + "licence-create-update/" + settings.MOORING_BOOKINGS_API_KEY + '/' 
-        approval = Approval.objects.get(id=approval_id)
-        status = 'active' if approval.status == 'current' else 'cancelled'
-        licence_type = None
-        if type(approval.child_obj) == MooringLicence:
-            licence_type = 1
-        elif type(approval.child_obj) == AuthorisedUserPermit:
-            licence_type = 2
-        elif type(approval.child_obj) == AnnualAdmissionPermit:
-            licence_type = 3
+        resp = session.post(url, data=export.payload, timeout=settings.MOORING_BOOKINGS_EXPORT_TIMEOUT)
+        if not resp or not resp.text:
+            return 'Server unavailable'
+        resp_dict = json.loads(resp.text)
+        if resp_dict.get("status") == 200:
+            return None
+        return resp.text
+    except Exception as e:
+        return str(e)
 
-        errors = []
-        updates = []
-        
-        if (approval 
-            and type(approval.child_obj) in [AnnualAdmissionPermit, AuthorisedUserPermit] 
-            and approval.current_proposal 
-            and approval.current_proposal.vessel_ownership and not approval.current_proposal.vessel_ownership.end_date and approval.current_proposal.vessel_ownership.vessel):
-            myobj = {
-                    'vessel_rego': approval.current_proposal.vessel_ownership.vessel.rego_no,
-                    'licence_id': approval.id,
-                    'licence_type': licence_type,
-                    'start_date': approval.start_date.strftime('%Y-%m-%d') if approval.start_date else '',
-                    'expiry_date' : approval.expiry_date.strftime('%Y-%m-%d') if approval.expiry_date else '',
-                    'status' : status,
-                    }
-            resp = requests.post(url, data = myobj)
-            if not resp or not resp.text:
-                print("Server unavailable")
-                raise Exception("Server unavailable")
-            resp_dict = json.loads(resp.text)
-
-            if resp_dict.get("status") == 200:
-                updates.append('approval_id: {}, vessel_id: {}'.format(approval.id, approval.current_proposal.vessel_ownership.vessel.id))
-            else:
-                errors.append('approval_id: {}, vessel_id: {}, error_message: {}'.format(approval.id, approval.current_proposal.vessel_ownership.vessel.id, resp.text))
-        elif approval and type(approval.child_obj) == MooringLicence:
-            for vessel_ownership in approval.child_obj.vessel_ownership_list:
-                if vessel_ownership.vessel:
-                    myobj = {
-                            'vessel_rego': vessel_ownership.vessel.rego_no,
-                            'licence_id': approval.id,
-                            'licence_type': licence_type,
-                            'start_date': approval.start_date.strftime('%Y-%m-%d') if approval.start_date else '',
-                            'expiry_date' : approval.expiry_date.strftime('%Y-%m-%d') if approval.expiry_date else '',
-                            'status' : status,
-                            }
-                    resp = requests.post(url, data = myobj)
-                    if not resp or not resp.text:
-                        print("Server unavailable")
-                        raise Exception("Server unavailable")
-                    resp_dict = json.loads(resp.text)
-
-                    if resp_dict.get("status") == 200:
-                        updates.append('approval_id: {}, vessel_id: {}'.format(approval.id, vessel_ownership.vessel.id))
-                    else:
-                        errors.append('approval_id: {}, vessel_id: {}, error_message: {}'.format(approval.id, vessel_ownership.vessel.id, resp.text))
-        
-        if approval:
-            status = "cancelled"
-            cancelled_vessel_ownerships = get_removed_vessels_in_current_season(approval)
-            for vessel_ownership in cancelled_vessel_ownerships:
-                if vessel_ownership.vessel:
-                    myobj = {
-                            'vessel_rego': vessel_ownership.vessel.rego_no,
-                            'licence_id': approval.id,
-                            'licence_type': licence_type,
-                            'start_date': approval.start_date.strftime('%Y-%m-%d') if approval.start_date else '',
-                            'expiry_date' : approval.expiry_date.strftime('%Y-%m-%d') if approval.expiry_date else '',
-                            'status' : status,
-                            }
-                    resp = requests.post(url, data = myobj)
-                    if not resp or not resp.text:
-                        print("Server unavailable")
-                        raise Exception("Server unavailable")
-                    resp_dict = json.loads(resp.text)
-
-                    if resp_dict.get("status") == 200:
-                        updates.append('approval_id: {}, vessel_id: {}'.format(approval.id, vessel_ownership.vessel.id))
-                    else:
-                        errors.append('approval_id: {}, vessel_id: {}, error_message: {}'.format(approval.id, vessel_ownership.vessel.id, resp.text))
-            
-        if approval and not errors:
-            approval.export_to_mooring_booking = False
-            approval.save()
 
+def dispatch_mooring_bookings_exports(batch_size=None):
+    """
+    Send one batch of the pending updates which are due, a few at a time.  A failed update is retried after
+    MOORING_BOOKINGS_EXPORT_RETRY_DELAY seconds, doubled on each attempt, and is marked as failed (and no longer
+    retried) after MOORING_BOOKINGS_EXPORT_MAX_ATTEMPTS attempts.
+    """
+    from mooringlicensing.components.approvals.models import MooringBookingsExport
+
+    batch_size = batch_size or settings.MOORING_BOOKINGS_EXPORT_BATCH_SIZE
+    errors = []
+    updates = []
+
+    # Claim the batch, so that another dispatcher running at the same time doesn't send it too
+    now = timezone.now()
+    with transaction.atomic():
+        exports = list(
+            MooringBookingsExport.objects.select_for_update(skip_locked=True)
+            .filter(status=MooringBookingsExport.STATUS_PENDING, next_attempt_at__lte=now)
+            .order_by('next_attempt_at', 'id')[:batch_size]
+        )
+        MooringBookingsExport.objects.filter(id__in=[export.id for export in exports]).update(next_attempt_at=now + datetime.timedelta(seconds=settings.MOORING_BOOKINGS_EXPORT_TIMEOUT * 2 + 60))
+    if not exports:
         return errors, updates
-    except Exception as e:
-        print(str(e))
-        logger.error(str(e))
-        raise e
+
+    session = get_mooring_bookings_session()
+    with ThreadPoolExecutor(max_workers=settings.MOORING_BOOKINGS_EXPORT_MAX_WORKERS) as executor:
+        results = list(executor.map(lambda export: send_mooring_bookings_export(session, export), exports))
+
+    for export, error in zip(exports, results):
+        # Filtered by the version, in case the update has been replaced while it was being sent
+        exports_sent = MooringBookingsExport.objects.filter(id=export.id, version=export.version)
+        if not error:
+            exports_sent.update(status=MooringBookingsExport.STATUS_SENT, attempts=export.attempts + 1, date_sent=timezone.now(), last_error=None)
+            updates.append('approval_id: {}, vessel_id: {}'.format(export.approval_id, export.vessel_id))
+            continue
+
+        attempts = export.attempts + 1
+        if attempts >= settings.MOORING_BOOKINGS_EXPORT_MAX_ATTEMPTS:
+            exports_sent.update(status=MooringBookingsExport.STATUS_FAILED, attempts=attempts, last_error=error)
+            logger.error('Export to Mooring Bookings failed {} times, given up. approval_id: {}, vessel_id: {}, error_message: {}'.format(attempts, export.approval_id, export.vessel_id, error))
+        else:
+            delay = settings.MOORING_BOOKINGS_EXPORT_RETRY_DELAY * 2 ** (attempts - 1)
+            exports_sent.update(attempts=attempts, last_error=error, next_attempt_at=timezone.now() + datetime.timedelta(seconds=delay))
+        errors.append('approval_id: {}, vessel_id: {}, error_message: {}'.format(export.approval_id, export.vessel_id, error))
+    return errors, updates
+
+
+def export_to_mooring_booking(approval_id):
+    """
+    Queue the updates of the approval and send the pending updates which are due
+    """
+    enqueue_mooring_bookings_exports([approval_id])
+    return dispatch_mooring_bookings_exports()
+
+
+def get_max_number_of_increments(amount, start_size, max_number_of_increment, max_amount_paid):
+    """
+    Return the largest number of increments k (0 <= k <= max_number_of_increment) for which an incremental fee item
+    charges no more than max_amount_paid for the vessel size start_size + k, or None when even k = 0 costs more.
+    """
+    def fits(k):
+        return FeeItem.calculate_absolute_amount(amount, True, start_size + float(k)) <= max_amount_paid
+
+    if amount < 0:
+        # Larger vessels are cheaper, which never happens in the configured fees
+        return next((k for k in range(max_number_of_increment, -1, -1) if fits(k)), None)
+    if not fits(0):
+        return None
+    if not amount:
+        return max_number_of_increment
+
+    # The absolute amount never decreases as the vessel gets larger, therefore the increments which fit are 0..k.
+    # Start from the exact answer without rounding, then settle the rounding to cents at the boundary.
+    k = math.floor(Decimal(max_amount_paid) / Decimal(amount) - Decimal(start_size))
+    k = min(max(k, 0), max_number_of_increment)
+    while k < max_number_of_increment and fits(k + 1):
+        k += 1
+    while k > 0 and not fits(k):
+        k -= 1
+    return k
 
 
 def calculate_minimum_max_length(fee_items_interested, max_amount_paid):
     """
     Find out MINIMUM max-length from fee_items_interested by max_amount_paid
     """
+    categories_by_group = {}
+
+    def get_one_larger_category(vessel_size_category):
+        # Same as VesselSizeCategoryGroup.get_one_larger_category(), but the categories are only queried once per group
+        group_id = vessel_size_category.vessel_size_category_group_id
+        if group_id not in categories_by_group:
+            categories_by_group[group_id] = list(VesselSizeCategory.objects.filter(vessel_size_category_group_id=group_id, null_vessel=False).order_by('start_size'))
+        return next((category for category in categories_by_group[group_id] if category.start_size > vessel_size_category.start_size), None)
+
     max_length = 0
     for fee_item in fee_items_interested:
         if fee_item.incremental_amount:
             smallest_vessel_size = float(fee_item.vessel_size_category.start_size)
 
-            larger_category = fee_item.vessel_size_category.vessel_size_category_group.get_one_larger_category(
-                fee_item.vessel_size_category
-            )
+            larger_category = get_one_larger_category(fee_item.vessel_size_category)
             if larger_category:
                 max_number_of_increment = round(
                     larger_category.start_size - fee_item.vessel_size_category.start_size
@@ -696,21 +939,16 @@ def calculate_minimum_max_length(fee_items_interested, max_amount_paid):
             else:
                 max_number_of_increment = 1000  # We probably would like to cap the number of increments
 
-            increment = 0.0
-            while increment <= max_number_of_increment:
-                test_vessel_size = smallest_vessel_size + increment
-                fee_amount_to_pay = fee_item.get_absolute_amount(test_vessel_size)
-                if fee_amount_to_pay <= max_amount_paid:
-                    if not max_length or test_vessel_size > max_length:
-                        max_length = test_vessel_size
-                increment += 1
+            number_of_increments = get_max_number_of_increments(fee_item.amount, smallest_vessel_size, max_number_of_increment, max_amount_paid)
+            if number_of_increments is not None:
+                test_vessel_size = smallest_vessel_size + float(number_of_increments)
+                if not max_length or test_vessel_size > max_length:
+                    max_length = test_vessel_size
         else:
             fee_amount_to_pay = fee_item.get_absolute_amount()
             if fee_amount_to_pay <= max_amount_paid:
                 # Find out start size of one larger category
-                larger_category = fee_item.vessel_size_category.vessel_size_category_group.get_one_larger_category(
-                    fee_item.vessel_size_category
-                )
+                larger_category = get_one_larger_category(fee_item.vessel_size_category)
                 if larger_category:
                     if not max_length or larger_category.start_size > max_length:
                         if larger_category.include_start_size:
@@ -729,18 +967,18 @@ def calculate_minimum_max_length(fee_items_interested, max_amount_paid):
 def calculate_max_length(fee_constructor, max_amount_paid, proposal_type):
     # All the amendment FeeItems interested
     # Ordered by 'start_size' ascending order, which means the cheapest fee_item first.
-    fee_items_interested = fee_constructor.feeitem_set.filter(proposal_type=proposal_type).order_by('vessel_size_category__start_size')
+    fee_items_interested = fee_constructor.feeitem_set.filter(proposal_type=proposal_type).select_related('vessel_size_category').order_by('vessel_size_category__start_size')
     max_length = calculate_minimum_max_length(fee_items_interested, max_amount_paid)
     return max_length
 
 
-def reorder_wla(target_bay):
-    logger.info(f'Checking WLAs for the bay: [{target_bay}]...')
-    place = 1
-
-    bay_wlas = WaitingListAllocation.objects.filter(
+def get_waiting_wlas():
+    """
+    The waiting list allocations holding a position in the waiting list of their preferred bay
+    """
+    return WaitingListAllocation.objects.filter(
         wla_queue_date__isnull=False,
-        current_proposal__preferred_bay=target_bay,
+        current_proposal__preferred_bay__isnull=False,
         status__in=[
             Approval.APPROVAL_STATUS_CURRENT,
             Approval.APPROVAL_STATUS_SUSPENDED,
@@ -748,45 +986,94 @@ def reorder_wla(target_bay):
         internal_status__in=[
             Approval.INTERNAL_STATUS_WAITING,
         ]
-    ).filter(
-        current_proposal__preferred_bay=target_bay
     )
 
-    duplicates = bay_wlas.values('wla_order').annotate(cnt=Count('id')).filter(cnt__gt=1).exists()
 
-    if not duplicates:
-        sequence_check = bay_wlas.aggregate(
-            count=Count('id'),
-            min_seq=Min('wla_order'),
-            max_seq=Max('wla_order'),
-        )
-        print(sequence_check)
+def get_bays_to_reorder(bay_ids):
+    """
+    Return the ids of the bays whose waiting list positions have duplicates or gaps, worked out with one query for
+    all the bays.  The positions are left alone while they are 1 to the number of allocations.
+    """
+    bays_to_reorder = []
+    sequence_checks = get_waiting_wlas().filter(current_proposal__preferred_bay_id__in=bay_ids).values('current_proposal__preferred_bay_id').annotate(
+        count=Count('id'),
+        positions=Count('wla_order', distinct=True),
+        min_seq=Min('wla_order'),
+        max_seq=Max('wla_order'),
+    ).order_by()
+    for sequence_check in sequence_checks:
         is_complete = (
             sequence_check['min_seq'] == 1 and
-            sequence_check['max_seq'] == sequence_check['count']
+            sequence_check['max_seq'] == sequence_check['count'] and
+            sequence_check['positions'] == sequence_check['count']
         )
+        if not is_complete:
+            logger.info(f"Bay: [{sequence_check['current_proposal__preferred_bay_id']}] has duplicate or missing waiting list allocation positions, performing reorder.")
+            bays_to_reorder.append(sequence_check['current_proposal__preferred_bay_id'])
+    return bays_to_reorder
 
-        if is_complete:
-            return
-        else:
-            logger.info(f"{target_bay} has an incomplete sequence of waiting list allocation positions, performing reorder.")
-    else:
-        logger.info(f"{target_bay} has duplicate waiting list allocation positions, performing reorder.")
 
-    # set wla order per bay for current allocations
-    for w in bay_wlas.order_by('wla_queue_date','wla_order'):
-        w.wla_order = place
-        w.save()
-        logger.info(f'Allocation order: [{w.wla_order}] has been set to the WaitingListAllocation: [{w}].')
-        place += 1
+def reorder_wlas(bays):
+    """
+    Number the waiting list allocations of each of the bays needing it from 1, by the queue date.  The new positions
+    are worked out by a window function per bay, and only the allocations whose position changes are updated, in
+    bulk (without the revision and the sanitising of Approval.save(), as only the position changes).
+    Return the number of allocations updated.
+    """
+    bay_ids = get_bays_to_reorder([bay.id for bay in bays])
+    if not bay_ids:
+        return 0
+
+    wlas = get_waiting_wlas().filter(current_proposal__preferred_bay_id__in=bay_ids).annotate(
+        position=Window(
+            expression=RowNumber(),
+            partition_by=[F('current_proposal__preferred_bay_id')],
+            order_by=[F('wla_queue_date').asc(), F('wla_order').asc(nulls_last=True), F('id').asc()],
+        )
+    ).values_list('id', 'lodgement_number', 'wla_order', 'position')
+
+    approvals = []
+    for approval_id, lodgement_number, wla_order, position in wlas:
+        if wla_order != position:
+            approvals.append(Approval(id=approval_id, wla_order=position))
+            logger.info(f'Allocation order: [{position}] has been set to the WaitingListAllocation: [{lodgement_number}].')
+    with transaction.atomic():
+        Approval.objects.bulk_update(approvals, ['wla_order'], batch_size=500)
+    return len(approvals)
+
+
+def reorder_wla(target_bay):
+    logger.info(f'Checking WLAs for the bay: [{target_bay}]...')
+    return reorder_wlas([target_bay])
+
+HTML_TAGS_WRAPPED = re.compile(r'<[^>]+>.+</[^>]+>')
+HTML_TAGS_NO_WRAPPED = re.compile(r'<[^>]+>')
+
+SCRIPT_TAGS_WRAPPED = re.compile(r'(?i)<script[^>]+>.+</script[^>]+>')
+SCRIPT_TAGS_NO_WRAPPED = re.compile(r'(?i)<script[^>]+>')
+
+ATTR_BLACKLIST = ['onresize','onvolumechange','onsuspend','onpopstate','onbeforeunload','oncontextmenu',
+    'ondragstart','oncuechange','onselect','onafterprint','onmouseover','ondragleave','onstorage',
+    'onbeforeprint','onhashchange','onabort','ondragover','onwaiting','onclick','onmousemove','onkeyup',
+    'onmousedown','ononline','onsearch','onprogress','onfocus','onmouseup','onplaying','onstalled','oninvalid',
+    'ontimeupdate','onkeypress','onseeked','onreset','onwheel','onemptied','oninput','onpagehide','onpause',
+    'onloadeddata','onseeking','onunload','onpageshow','onerror','ondrop','oncanplay','oncopy','onended','oncut',
+    'onsubmit','ondrag','onblur','ondragend','onplay','onratechange','onloadedmetadata','oncanplaythrough',
+    'ondurationchange','onchange','ondblclick','onmousewheel','onpaste','onload','onscroll','onkeydown',
+    'ontoggle','onmouseout','onoffline','onloadstart','ondragenter']
+ATTR_BLACKLIST_STR=('|').join(ATTR_BLACKLIST)
+
+HTML_TAGS_WITH_ATTR_WRAPPED = re.compile(r'(?i)<[^>]+('+ATTR_BLACKLIST_STR+')[\\s]*=[^>]+>.+</[^>]+>')
+HTML_TAGS_WITH_ATTR_NO_WRAPPED = re.compile(r'(?i)<[^>]+('+ATTR_BLACKLIST_STR+')[\\s]*=[^>]+>')
 
 def remove_html_tags(text):
 
     if text is None:
         return None
 
-    HTML_TAGS_WRAPPED = re.compile(r'<[^>]+>.+</[^>]+>')
-    HTML_TAGS_NO_WRAPPED = re.compile(r'<[^>]+>')
+    # Every pattern starts with '<', most values have none
+    if '<' not in text:
+        return text
 
     text = HTML_TAGS_WRAPPED.sub('', text)
     text = HTML_TAGS_NO_WRAPPED.sub('', text)
@@ -797,26 +1084,12 @@ def remove_script_tags(text):
     if text is None:
         return None
 
-    SCRIPT_TAGS_WRAPPED = re.compile(r'(?i)<script[^>]+>.+</script[^>]+>')
-    SCRIPT_TAGS_NO_WRAPPED = re.compile(r'(?i)<script[^>]+>')
+    if '<' not in text:
+        return text
 
     text = SCRIPT_TAGS_WRAPPED.sub('', text)
     text = SCRIPT_TAGS_NO_WRAPPED.sub('', text)
 
-    ATTR_BLACKLIST = ['onresize','onvolumechange','onsuspend','onpopstate','onbeforeunload','oncontextmenu',
-        'ondragstart','oncuechange','onselect','onafterprint','onmouseover','ondragleave','onstorage',
-        'onbeforeprint','onhashchange','onabort','ondragover','onwaiting','onclick','onmousemove','onkeyup',
-        'onmousedown','ononline','onsearch','onprogress','onfocus','onmouseup','onplaying','onstalled','oninvalid',
-        'ontimeupdate','onkeypress','onseeked','onreset','onwheel','onemptied','oninput','onpagehide','onpause',
-        'onloadeddata','onseeking','onunload','onpageshow','onerror','ondrop','oncanplay','oncopy','onended','oncut',
-        'onsubmit','ondrag','onblur','ondragend','onplay','onratechange','onloadedmetadata','oncanplaythrough',
-        'ondurationchange','onchange','ondblclick','onmousewheel','onpaste','onload','onscroll','onkeydown',
-        'ontoggle','onmouseout','onoffline','onloadstart','ondragenter']
-    ATTR_BLACKLIST_STR=('|').join(ATTR_BLACKLIST)
-
-    HTML_TAGS_WITH_ATTR_WRAPPED = re.compile(r'(?i)<[^>]+('+ATTR_BLACKLIST_STR+')[\\s]*=[^>]+>.+</[^>]+>')
-    HTML_TAGS_WITH_ATTR_NO_WRAPPED = re.compile(r'(?i)<[^>]+('+ATTR_BLACKLIST_STR+')[\\s]*=[^>]+>')
-
     text = HTML_TAGS_WITH_ATTR_WRAPPED.sub('', text)
     text = HTML_TAGS_WITH_ATTR_NO_WRAPPED.sub('', text)
 
@@ -829,9 +1102,13 @@ def is_json(value):
         return False
     return True
 
-def sanitise_fields(instance, exclude=[], error_on_change=[]):
+def sanitise_fields(instance, exclude=[], error_on_change=[], fields=None):
+    """
+    Remove html tags from the string values of the instance (a model instance or a dict).  When fields is given
+    only those attributes of the instance are checked.
+    """
     if hasattr(instance,"__dict__"):
-        for i in instance.__dict__:
+        for i in (instance.__dict__ if fields is None else [field for field in fields if field in instance.__dict__]):
             #remove html tags for all string fields not in the exclude list
             if not i in exclude and (isinstance(instance.__dict__[i], dict)):
                 instance.__dict__[i] = sanitise_fields(instance.__dict__[i])
@@ -1208,19 +1485,47 @@ def exportModelData(model, filters, num_records):
     else:
         return
 
+def iterExportRows(columns):
+    # Rows are fetched from the database in chunks instead of all at once
+    if hasattr(columns, 'iterator'):
+        return columns.iterator(chunk_size=MODEL_EXPORT_CHUNK_SIZE)
+    return iter(columns)
+
+def withStoredInvoiceProperties(rows, index):
+    # The invoice properties at the index of each row are read from the shared invoice property cache, one query per chunk of rows
+    from mooringlicensing.components.payments_ml.utils import get_stored_invoice_properties
+    chunk = []
+    def replace_chunk(chunk):
+        invoice_ids = set()
+        for row in chunk:
+            invoice_ids.update(int(key) for key in (row[index] or {}).keys())
+        invoice_properties = get_stored_invoice_properties(invoice_ids)
+        for row in chunk:
+            values = list(row)
+            values[index] = {key: invoice_properties.get(int(key), value) for key, value in (row[index] or {}).items()}
+            yield tuple(values)
+
+    for row in iterExportRows(rows):
+        chunk.append(row)
+        if len(chunk) >= MODEL_EXPORT_CHUNK_SIZE:
+            yield from replace_chunk(chunk)
+            chunk = []
+    yield from replace_chunk(chunk)
+
 def csvExportData(model, header, columns):
     
     csv_file = str(settings.BASE_DIR)+'/tmp/{}_{}_{}.csv'.format(model,uuid.uuid4(),int(datetime.datetime.now().timestamp()*100000))
     with open(csv_file, 'w', newline='') as new_file:
         writer = csv.writer(new_file)
         writer.writerow(header)
-        for i in columns:
+        for i in iterExportRows(columns):
             writer.writerow(i)
     return csv_file
 
 def excelExportData(model, header, columns):
     excel_file = str(settings.BASE_DIR)+'/tmp/{}_{}_{}.xlsx'.format(model,uuid.uuid4(),int(datetime.datetime.now().timestamp()*100000))
-    workbook = xlsxwriter.Workbook(excel_file) 
+    # constant_memory flushes each row to disk once the next row is started
+    workbook = xlsxwriter.Workbook(excel_file, {'constant_memory': True, 'tmpdir': str(settings.BASE_DIR)+'/tmp/'})
     worksheet = workbook.add_worksheet("{} Report".format(model.capitalize()))
     format = workbook.add_format()
 
@@ -1232,20 +1537,21 @@ def excelExportData(model, header, columns):
     for i in header:
         worksheet.write(row, col, str(i), format)
         col_lens[col] = len(str(i))+2
-        worksheet.set_column(col, col, col_lens[col])
         col += 1
     col = 0 
     row += 1
-    for i in columns:
+    for i in iterExportRows(columns):
         for j in i:
             worksheet.write(row, col, str(j), format)
             if len(str(j)) > col_lens[col]:
                 col_lens[col] = len(str(j))+2
-                worksheet.set_column(col, col, col_lens[col])
             col += 1
         col = 0
         row += 1
 
+    for col, col_len in enumerate(col_lens):
+        worksheet.set_column(col, col, col_len)
+
     workbook.close() 
 
     return excel_file
@@ -1253,7 +1559,7 @@ def excelExportData(model, header, columns):
 def getProposalExportFields(data):
     header = ["Lodgement Number", "Type", "Category" , "Applicant", "Status", "Auto Approved","Lodged On", "Application Vessel Rego No", "Application Vessel Length", "Application Vessel Draft", "Application Vessel Weight", "Invoice Properties"]
 
-    columns = list(data.annotate(type=
+    columns = (data.annotate(type=
         Case(
             When(
                 lodgement_number__startswith='ML',
@@ -1296,12 +1602,12 @@ def getProposalExportFields(data):
         )
     )
     
-    return header, columns
+    return header, withStoredInvoiceProperties(columns, 11)
 
 def getApprovalExportFields(data):
     header = ["Number", "Application Number", "Type", "Sticker Number/s" , "Sticker Mailed Date/s", "Holder", "Holder Email", "Holder Mobile Number", "Holder Phone Number", "Status", "Mooring", "Issue Date", "Start Date", "Expiry Date", "Vessel Registration"]
 
-    columns = list(data.annotate(type=
+    columns = (data.annotate(type=
         Case(
             When(
                 lodgement_number__startswith='MOL',
@@ -1393,7 +1699,7 @@ def getApprovalExportFields(data):
 def getComplianceExportFields(data):
     header = ["Lodgement Number", "Type", "Approval Number", "Holder", "Holder Email", "Holder Mobile Number", "Holder Phone Number", "Status", "Due Date"]
 
-    columns = list(data.annotate(type=
+    columns = (data.annotate(type=
         Case(
             When(
                 approval__lodgement_number__startswith='MOL',
@@ -1434,7 +1740,7 @@ def getComplianceExportFields(data):
 def getWaitingListExportFields(data):
     header = ["Lodgement Number", "Holder", "Holder Email", "Holder Mobile Number", "Holder Phone Number", "Status", "Bay", "Issue Date", "Start Date", "Expiry Date", "Vessel Registration"]
 
-    columns = list(data.annotate(
+    columns = (data.annotate(
         holder=Concat(
             'current_proposal__proposal_applicant__first_name',
             Value(" "),
@@ -1469,7 +1775,7 @@ def getWaitingListExportFields(data):
 def getMooringExportFields(data):
     header = ["Mooring", "Bay", "Status", "Holder", "Holder Email", "Holder Mobile Number", "Holder Phone Number", "Authorised User Permits (RIA)", "Authorised User Permits (LIC)", "Max Vessel Length (M)", "Max Vessel Draft (M)"]
 
-    columns = list(data.annotate(
+    columns = (data.annotate(
         holder=Concat(
             'mooring_licence__current_proposal__proposal_applicant__first_name',
             Value(" "),
@@ -1548,7 +1854,7 @@ def getMooringExportFields(data):
 def getDcvPermitExportFields(data):
     header = ["Lodgement Number", "Organisation", "Status", "Invoice Properties", "Season", "Sticker", "Vessel Registration"]
 
-    columns = list(data.annotate(
+    columns = (data.annotate(
         sticker_numbers=ArrayAgg(
             'stickers__number', 
             filter=(
@@ -1567,12 +1873,12 @@ def getDcvPermitExportFields(data):
         )
     )
 
-    return header, columns
+    return header, withStoredInvoiceProperties(columns, 3)
 
 def getDcvAdmissionExportFields(data):
     header = ["Lodgement Number", "Invoice Properties", "Arrival Dates", "Lodgement Date"]
 
-    columns = list(data.annotate(
+    columns = (data.annotate(
         arrival_dates=ArrayAgg(
             Cast('dcv_admission_arrivals__arrival_date', CharField()),
             distinct=True
@@ -1585,7 +1891,7 @@ def getDcvAdmissionExportFields(data):
         )
     )
 
-    return header, columns
+    return header, withStoredInvoiceProperties(columns, 1)
 
 def getStickerExportFields(data):
     header = [
@@ -1622,7 +1928,7 @@ def getStickerExportFields(data):
         ).values('vessel_length')[:1]
     )
 
-    columns = list(
+    columns = (
     data.annotate(
         holder=Concat(
             'approval__current_proposal__proposal_applicant__first_name',
@@ -1751,12 +2057,12 @@ def getStickerExportFields(data):
         )
     )
 
-    return header, columns
+    return header, withStoredInvoiceProperties(columns, 24)
 
 def getSystemUserExportFields(data):
     header = ["Ledger ID", "Account Name", "Legal Name", "Legal DOB", "Email"]
 
-    columns = list(data.annotate(
+    columns = (data.annotate(
         account_name=Concat(
             'first_name',
             Value(" "),
@@ -1792,7 +2098,7 @@ def getInvoiceExportFields(data):
     for i in sticker_action_references:
         sticker_action_references_dict[i["invoice_reference"]] = i["sticker_action_details__approval__lodgement_number"] 
 
-    columns = list(data.annotate(
+    columns = (data.annotate(
         fee_source_type=Case(
             When(
                 reference__in=application_references_dict,
@@ -1834,15 +2140,16 @@ def getInvoiceExportFields(data):
         )
     )
 
-    for i in range(len(columns)):
-        values = list(columns[i])
-        if values[2] == "Application":
-            values[1] = application_references_dict[values[1]]
-        if values[2] == "Sticker Action":
-            values[1] = sticker_action_references_dict[values[1]]
-        columns[i] = tuple(values)
+    def replace_fee_source(rows):
+        for row in iterExportRows(rows):
+            values = list(row)
+            if values[2] == "Application":
+                values[1] = application_references_dict[values[1]]
+            if values[2] == "Sticker Action":
+                values[1] = sticker_action_references_dict[values[1]]
+            yield tuple(values)
 
-    return header, columns
+    return header, replace_fee_source(columns)
 
 def formatExportData(model, data, format):
 
@@ -1874,13 +2181,15 @@ def formatExportData(model, data, format):
 
     if format == "excel":
         file_name = excelExportData(model, header, columns)
-        file_buffer = None
-        with open(file_name, 'rb') as f:
-            file_buffer = f.read()    
-        return ('Mooring Licensing - {} Report.xlsx'.format(model.capitalize()), file_buffer, 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+        return ('Mooring Licensing - {} Report.xlsx'.format(model.capitalize()), readExportFile(file_name), 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
     else:
         file_name =  csvExportData(model, header, columns)
-        file_buffer = None
+        return ('Mooring Licensing - {} Report.csv'.format(model.capitalize()), readExportFile(file_name), 'application/csv')
+
+def readExportFile(file_name):
+    # The content is needed in memory once, for the email attachment; the file itself is not kept
+    try:
         with open(file_name, 'rb') as f:
-            file_buffer = f.read()    
-        return ('Mooring Licensing - {} Report.csv'.format(model.capitalize()), file_buffer, 'application/csv')
+            return f.read()
+    finally:
+        os.remove(file_name)
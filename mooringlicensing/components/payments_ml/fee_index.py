@@ -0,0 +1,148 @@
+import threading
+import time
+import uuid
+
+from dateutil.relativedelta import relativedelta
+from django.core.cache import cache
+from django.db.models import Min
+
+from mooringlicensing import settings
+
+_lock = threading.Lock()
+_state = {
+    'version': None,
+    'checked_at': None,
+    'fee_constructor_indexes': {},
+    'fee_constructors_by_application_type': None,
+    'application_types_by_code': None,
+}
+
+
+def get_fee_configuration_version():
+    version = cache.get(settings.CACHE_KEY_FEE_CONFIGURATION_VERSION)
+    if version is None:
+        version = uuid.uuid4().hex
+        cache.set(settings.CACHE_KEY_FEE_CONFIGURATION_VERSION, version, None)
+    return version
+
+
+def invalidate_fee_index():
+    """
+    Called when the fee configuration is changed.  The index of this process is dropped at once, and the other
+    processes drop theirs when they see the new version.
+    """
+    cache.set(settings.CACHE_KEY_FEE_CONFIGURATION_VERSION, uuid.uuid4().hex, None)
+    with _lock:
+        _state['checked_at'] = None
+
+
+def _get_state():
+    with _lock:
+        now = time.monotonic()
+        if _state['checked_at'] is None or now - _state['checked_at'] >= settings.FEE_INDEX_VERSION_CHECK_INTERVAL:
+            version = get_fee_configuration_version()
+            if version != _state['version']:
+                _state['version'] = version
+                _state['fee_constructor_indexes'] = {}
+                _state['fee_constructors_by_application_type'] = None
+                _state['application_types_by_code'] = None
+            _state['checked_at'] = now
+        return _state
+
+
+def _pk(value):
+    return value.pk if hasattr(value, 'pk') else value
+
+
+class FeeConstructorIndex(object):
+    """
+    The fee periods, vessel size categories and fee items of one fee constructor, loaded with three queries
+    """
+    def __init__(self, fee_constructor):
+        from mooringlicensing.components.payments_ml.models import FeePeriod, FeeItem
+
+        self.fee_constructor = fee_constructor
+        self.fee_periods = list(FeePeriod.objects.filter(fee_season_id=fee_constructor.fee_season_id, start_date__isnull=False).order_by('start_date'))
+
+        categories = list(fee_constructor.vessel_size_category_group.vessel_size_categories.all())
+        self.null_vessel_categories = [category for category in categories if category.null_vessel]
+        self.vessel_size_categories = sorted([category for category in categories if not category.null_vessel], key=lambda category: category.start_size)
+
+        self.fee_items = {}
+        for fee_item in FeeItem.objects.filter(fee_constructor_id=fee_constructor.id).order_by('id'):
+            fee_item.fee_constructor = fee_constructor
+            key = (fee_item.fee_period_id, fee_item.vessel_size_category_id, fee_item.proposal_type_id, fee_item.age_group_id, fee_item.admission_type_id)
+            self.fee_items.setdefault(key, fee_item)
+
+    def get_fee_period(self, target_date):
+        fee_period = None
+        for period in self.fee_periods:
+            if period.start_date <= target_date:
+                fee_period = period
+        return fee_period
+
+    def get_null_vessel_category(self):
+        if len(self.null_vessel_categories) == 1:
+            return self.null_vessel_categories[0]
+        return None
+
+    def get_vessel_size_category(self, vessel_length):
+        vessel_size_category = None
+        for category in self.vessel_size_categories:
+            if category.start_size <= vessel_length:
+                vessel_size_category = category
+        if vessel_size_category and float(vessel_size_category.start_size) == vessel_length and not vessel_size_category.include_start_size:
+            vessel_size_category = self.get_one_smaller_category(vessel_size_category)
+        return vessel_size_category
+
+    def get_one_smaller_category(self, vessel_size_category):
+        smaller_categories = [category for category in self.vessel_size_categories if category.start_size < vessel_size_category.start_size]
+        return smaller_categories[-1] if smaller_categories else None
+
+    def get_fee_item(self, vessel_size_category, fee_period, proposal_type=None, age_group=None, admission_type=None):
+        return self.fee_items.get((_pk(fee_period), _pk(vessel_size_category), _pk(proposal_type), _pk(age_group), _pk(admission_type)))
+
+
+def get_fee_constructor_index(fee_constructor):
+    state = _get_state()
+    index = state['fee_constructor_indexes'].get(fee_constructor.id)
+    if index is None:
+        index = FeeConstructorIndex(fee_constructor)
+        with _lock:
+            state['fee_constructor_indexes'][fee_constructor.id] = index
+    return index
+
+
+def get_fee_constructors_by_application_type(application_type):
+    """
+    Return [(start date, end date, fee constructor)] of the enabled fee constructors of the application type,
+    ordered by the start date
+    """
+    from mooringlicensing.components.payments_ml.models import FeeConstructor
+
+    state = _get_state()
+    fee_constructors_by_application_type = state['fee_constructors_by_application_type']
+    if fee_constructors_by_application_type is None:
+        fee_constructors_by_application_type = {}
+        fee_constructors = FeeConstructor.objects.filter(enabled=True).annotate(s_date=Min('fee_season__fee_periods__start_date')).filter(s_date__isnull=False).select_related('application_type', 'fee_season', 'vessel_size_category_group').order_by('s_date')
+        for fee_constructor in fee_constructors:
+            end_date = fee_constructor.s_date + relativedelta(years=1) - relativedelta(days=1)
+            fee_constructors_by_application_type.setdefault(fee_constructor.application_type_id, []).append((fee_constructor.s_date, end_date, fee_constructor))
+        with _lock:
+            state['fee_constructors_by_application_type'] = fee_constructors_by_application_type
+    return fee_constructors_by_application_type.get(_pk(application_type), [])
+
+
+def get_application_type_by_code(code):
+    from mooringlicensing.components.main.models import ApplicationType
+
+    state = _get_state()
+    application_types_by_code = state['application_types_by_code']
+    if application_types_by_code is None:
+        application_types_by_code = {}
+        for application_type in ApplicationType.objects.order_by('-id'):
+            # The first one wins, as ApplicationType.objects.filter(code=code)[0] does
+            application_types_by_code[application_type.code] = application_type
+        with _lock:
+            state['application_types_by_code'] = application_types_by_code
+    return application_types_by_code.get(code)
@@ -8,12 +8,14 @@ import pytz
 from dateutil.relativedelta import relativedelta
 from django.core.exceptions import ValidationError
 from django.db import models
-from django.db.models import Min
+from django.contrib.postgres.fields import ArrayField
+from django.db.models import Min, Sum
 from ledger_api_client.ledger_models import Invoice
 from mooringlicensing.settings import TIME_ZONE
 
 from mooringlicensing import settings
 from mooringlicensing.components.main.models import ApplicationType, VesselSizeCategoryGroup, VesselSizeCategory
+from mooringlicensing.components.payments_ml.fee_index import get_fee_constructor_index, get_fee_constructors_by_application_type, get_application_type_by_code
 from mooringlicensing.components.proposals.models import (
     ProposalType, AnnualAdmissionApplication, 
     AuthorisedUserApplication, VesselDetails, Proposal
@@ -321,48 +323,33 @@ class FeeConstructor(models.Model):
         return 'ApplicationType: {}, Season: {}, VesselSizeCategoryGroup: {}'.format(self.application_type.description, self.fee_season, self.vessel_size_category_group)
 
     def get_fee_item(self, vessel_length, proposal_type=None, target_date=datetime.datetime.now(pytz.timezone(TIME_ZONE)).date(), age_group=None, admission_type=None, accept_null_vessel=False):
-        logger.info(f'Getting FeeItem for vessel_length:[{vessel_length}], proposal_type: [{proposal_type}], target_date: [{target_date}], accept_null_vessel: [{accept_null_vessel}], age_group: [{age_group}], admission_type: [{admission_type}]...')
-        fee_period = self.fee_season.fee_periods.filter(start_date__lte=target_date).order_by('start_date').last()
+        logger.debug(f'Getting FeeItem for vessel_length:[{vessel_length}], proposal_type: [{proposal_type}], target_date: [{target_date}], accept_null_vessel: [{accept_null_vessel}], age_group: [{age_group}], admission_type: [{admission_type}]...')
+        fee_index = get_fee_constructor_index(self)
+        fee_period = fee_index.get_fee_period(target_date)
         if accept_null_vessel:
-            vessel_size_category = self.vessel_size_category_group.vessel_size_categories.filter(null_vessel=True)
-            if vessel_size_category.count() == 1:
-                vessel_size_category = vessel_size_category[0]
-            else:
+            vessel_size_category = fee_index.get_null_vessel_category()
+            if not vessel_size_category:
                 msg = f'Null vessel size category not found under the vessel size category group: {self.vessel_size_category_group}'
                 logger.error(msg)
                 raise ValueError(msg)
         else:
-            vessel_size_category = self.vessel_size_category_group.vessel_size_categories.filter(start_size__lte=vessel_length, null_vessel=False).order_by('start_size').last()
+            vessel_size_category = fee_index.get_vessel_size_category(vessel_length)
             if not vessel_size_category:
                 raise ValueError("Provided vessel dimensions do not fit any existing vessel size categories.")
-            if float(vessel_size_category.start_size) == vessel_length and not vessel_size_category.include_start_size:
-                vessel_size_category = vessel_size_category.get_one_smaller_category()
-        fee_item = self.get_fee_item_for_adjustment(vessel_size_category, fee_period, proposal_type=proposal_type, age_group=age_group, admission_type=admission_type)
+        fee_item = fee_index.get_fee_item(vessel_size_category, fee_period, proposal_type=proposal_type, age_group=age_group, admission_type=admission_type)
 
         if fee_item:
-            logger.info(f'FeeItem: [{fee_item}] has been retrieved.')
+            logger.debug(f'FeeItem: [{fee_item}] has been retrieved.')
         else:
-            logger.exception(f'FeeItem not found for  vessel_length:[{vessel_length}], proposal_type: [{proposal_type}], target_date: [{target_date}], accept_null_vessel: [{accept_null_vessel}], age_group: [{age_group}], admission_type: [{admission_type}]...')
+            logger.error(f'FeeItem not found for  vessel_length:[{vessel_length}], proposal_type: [{proposal_type}], target_date: [{target_date}], accept_null_vessel: [{accept_null_vessel}], age_group: [{age_group}], admission_type: [{admission_type}]...')
         return fee_item
 
     def get_fee_item_for_adjustment(self, vessel_size_category, fee_period, proposal_type=None, age_group=None, admission_type=None):
-        logger.info(f'Getting fee_item for the fee_constructor: [{self}], fee_period: [{fee_period}], vessel_size_category: [{vessel_size_category}], proposal_type: [{proposal_type}], age_group: [{age_group}], admission_type: [{admission_type}]')
-
-        fee_item = FeeItem.objects.filter(
-            fee_constructor=self,
-            fee_period=fee_period,
-            vessel_size_category=vessel_size_category,
-            proposal_type=proposal_type,
-            age_group=age_group,
-            admission_type=admission_type,
-        )
-
-        if fee_item:
-            return fee_item[0]
-        else:
+        fee_item = get_fee_constructor_index(self).get_fee_item(vessel_size_category, fee_period, proposal_type=proposal_type, age_group=age_group, admission_type=admission_type)
+        if not fee_item:
             # Fees are probably not configured yet...
-            logger.info(f'FeeItem not found for the fee_constructor: [{self}], fee_period: [{fee_period}], vessel_size_category: [{vessel_size_category}], proposal_type: [{proposal_type}], age_group: [{age_group}], admission_type: [{admission_type}]')
-            return None
+            logger.debug(f'FeeItem not found for the fee_constructor: [{self}], fee_period: [{fee_period}], vessel_size_category: [{vessel_size_category}], proposal_type: [{proposal_type}], age_group: [{age_group}], admission_type: [{admission_type}]')
+        return fee_item
 
     @property
     def is_editable(self):
@@ -446,26 +433,17 @@ class FeeConstructor(models.Model):
     @classmethod
     def get_fee_constructor_by_date(self, target_date=datetime.datetime.now(pytz.timezone(TIME_ZONE)).date()):
         fee_constructors = []
-        for item in Proposal.__subclasses__():
-            if hasattr(item, 'code'):
-                myType = ApplicationType.objects.filter(code=item.code)
-                if myType:
-                    try:
-                        fc = self.get_fee_constructor_by_application_type_and_date(myType[0], target_date)
-                        fee_constructors.append(fc)
-                    except:
-                        logger.warning(f'FeeConstructor of the ApplicationType: {myType[0]} for the time: {target_date} may not have been configured yet.')
-        for app_type in settings.APPLICATION_TYPES:
-            if not app_type['fee_by_fee_constructor']:
-                continue
-            myType = ApplicationType.objects.filter(code=app_type['code'])
+        codes = [item.code for item in Proposal.__subclasses__() if hasattr(item, 'code')]
+        codes += [app_type['code'] for app_type in settings.APPLICATION_TYPES if app_type['fee_by_fee_constructor']]
+        for code in codes:
+            myType = get_application_type_by_code(code)
             if myType:
                 try:
-                    fc = self.get_fee_constructor_by_application_type_and_date(myType[0], target_date)
+                    fc = self.get_fee_constructor_by_application_type_and_date(myType, target_date)
                     fee_constructors.append(fc)
                 except:
-                    logger.warning(f'FeeConstructor of the ApplicationType: {myType[0]} for the time: {target_date} may not have been configured yet.')
-        logger.info(fee_constructors)
+                    logger.warning(f'FeeConstructor of the ApplicationType: {myType} for the time: {target_date} may not have been configured yet.')
+        logger.debug(fee_constructors)
         return fee_constructors
 
 
@@ -475,19 +453,15 @@ class FeeConstructor(models.Model):
 
         # Select a fee_constructor object which has been started most recently for the application_type
         try:
-            fee_constructor = None
-            fee_constructor_qs = cls.objects.filter(application_type=application_type,)\
-                .annotate(s_date=Min("fee_season__fee_periods__start_date"))\
-                .filter(s_date__lte=target_date, enabled=True).order_by('s_date')
+            started = [(start_date, end_date, fee_constructor) for start_date, end_date, fee_constructor in get_fee_constructors_by_application_type(application_type) if start_date <= target_date]
 
             # Validation
-            if not fee_constructor_qs:
+            if not started:
                 raise Exception('No fees are configured for the application type: {} on the date: {}'.format(application_type, target_date))
-            else:
-                # One or more fee constructors found
-                fee_constructor = fee_constructor_qs.last()
 
-            if target_date <= fee_constructor.fee_season.end_date:
+            # One or more fee constructors found
+            start_date, end_date, fee_constructor = started[-1]
+            if target_date <= end_date:
                 # Found. fee_constructor object selected above has not ended yet
                 return fee_constructor
             else:
@@ -655,17 +629,18 @@ class FeeItem(models.Model):
             raise Exception('FeeItem for fee_period: {}, vessel_size_category: {}, proposal_type: {} not found.'.format(self.fee_period, self.vessel_size_category, self.proposal_type))
 
     def get_absolute_amount(self, vessel_size=None):
-        logger.info(f'Calculating the absolute amount of the FeeItem: [{self}].')
+        absolute_amount = FeeItem.calculate_absolute_amount(self.amount, self.incremental_amount, vessel_size)
+        logger.debug(f'Absolute amount calculated: $[{absolute_amount}] from the FeeItem: [{self}] and the vessel_size: [{vessel_size}].')
+        return absolute_amount
 
-        if not self.incremental_amount or not vessel_size:
-            logger.info(f'Absolute amount calculated: $[{self.amount}] from the FeeItem: [{self}] and the vessel_size: [{vessel_size}].')
-            return self.amount
+    @staticmethod
+    def calculate_absolute_amount(amount, incremental_amount, vessel_size=None):
+        if not incremental_amount or not vessel_size:
+            return amount
         else:
-            # This self.amount is the incremental amount.
+            # This amount is the incremental amount.
             vessel_size = float(vessel_size)
-            absolute_amount = Decimal(round(Decimal(self.amount) * Decimal(vessel_size),2))
-            logger.info(f'Absolute amount calculated: $[{absolute_amount}] from the FeeItem: [{self}] and the vessel_size: [{vessel_size}].')
-            return absolute_amount
+            return Decimal(round(Decimal(amount) * Decimal(vessel_size),2))
 
     @property
     def is_editable(self):
@@ -694,4 +669,145 @@ class FeeCalculation(models.Model):
     data = models.JSONField(blank=True, null=True)
 
     class Meta:
-        app_label = 'mooringlicensing'
\ No newline at end of file
+        app_label = 'mooringlicensing'
+
+
+class InvoicePropertyCache(models.Model):
+    '''
+    Shared cache of the invoice properties retrieved from the ledger.
+    Saving a Proposal/Sticker/DcvAdmission/DcvPermit only flags the related entries as stale,
+    the entries are re-fetched in batches by refresh_invoice_properties()
+    '''
+    invoice_id = models.IntegerField(unique=True)
+    properties = models.JSONField(blank=True, null=True, default=dict)
+    stale = models.BooleanField(default=True, db_index=True)
+    date_refreshed = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        app_label = 'mooringlicensing'
+
+    def __str__(self):
+        return f'Invoice: [{self.invoice_id}] (stale: {self.stale})'
+
+
+class PaymentChain(models.Model):
+    '''
+    The proposals whose payments count towards a proposal: the proposal itself and its previous applications back to
+    the first application of its season (a new or a renewal application).
+    '''
+    proposal = models.OneToOneField(Proposal, on_delete=models.CASCADE, related_name='payment_chain')
+    proposal_ids = ArrayField(models.IntegerField(), default=list, blank=True)
+    date_updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        app_label = 'mooringlicensing'
+
+    def __str__(self):
+        return f'Proposal: [{self.proposal_id}] {self.proposal_ids}'
+
+    @classmethod
+    def get_proposal_ids(cls, proposal):
+        proposal_ids = cls.objects.filter(proposal_id=proposal.id).values_list('proposal_ids', flat=True).first()
+        if proposal_ids is None:
+            # Not stored yet (it is stored when the proposal is saved), work it out without saving it
+            proposal_ids = cls.build_proposal_ids(proposal)
+        return proposal_ids
+
+    @classmethod
+    def build_proposal_ids(cls, proposal):
+        proposal_ids = []
+        while proposal and proposal.id not in proposal_ids:
+            proposal_ids.append(proposal.id)
+            if proposal.proposal_type.code in [settings.PROPOSAL_TYPE_NEW, settings.PROPOSAL_TYPE_RENEWAL,]:
+                # This is the very first application for this season
+                break
+            previous_ids = cls.objects.filter(proposal_id=proposal.previous_application_id).values_list('proposal_ids', flat=True).first() if proposal.previous_application_id else None
+            if previous_ids is not None:
+                # The rest of the chain has been built already
+                for proposal_id in previous_ids:
+                    if proposal_id in proposal_ids:
+                        break
+                    proposal_ids.append(proposal_id)
+                break
+            proposal = proposal.previous_application
+        return proposal_ids
+
+    @classmethod
+    def refresh(cls, proposal):
+        '''
+        Store the chain of the proposal.  Return True when it has been created or has changed, in which case the chains
+        built on top of it need to be refreshed too (see refresh_with_later_chains())
+        '''
+        proposal_ids = cls.build_proposal_ids(proposal)
+        payment_chain, created = cls.objects.get_or_create(proposal_id=proposal.id, defaults={'proposal_ids': proposal_ids})
+        if not created and payment_chain.proposal_ids != proposal_ids:
+            payment_chain.proposal_ids = proposal_ids
+            payment_chain.save()
+            return True
+        return created
+
+    @classmethod
+    def refresh_with_later_chains(cls, proposal):
+        '''
+        Store the chain of the proposal and, when it has changed, the chains of the later applications built on top of it
+        '''
+        refreshed_ids = set()
+        proposals = [proposal]
+        while proposals:
+            proposal = proposals.pop()
+            refreshed_ids.add(proposal.id)
+            if cls.refresh(proposal):
+                proposals.extend(Proposal.objects.filter(previous_application_id=proposal.id).exclude(id__in=refreshed_ids))
+
+
+class PaymentHistory(models.Model):
+    '''
+    The amount paid for each FeeItemApplicationFee with the proposal and fee component (application type) it has been
+    paid for, so that the amounts paid through a payment chain are added up with one query.
+    The vessel is filtered on through the fee_item_application_fee, whose vessel_details are set with update(),
+    which does not refresh the payment history.
+    '''
+    fee_item_application_fee = models.OneToOneField(FeeItemApplicationFee, on_delete=models.CASCADE, related_name='payment_history')
+    proposal = models.ForeignKey(Proposal, null=True, blank=True, on_delete=models.CASCADE, related_name='payment_histories')
+    application_type = models.ForeignKey(ApplicationType, null=True, blank=True, on_delete=models.SET_NULL, related_name='payment_histories')
+    amount_paid = models.DecimalField(max_digits=8, decimal_places=2, null=True, blank=True, default=None)
+    date_updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        app_label = 'mooringlicensing'
+        verbose_name_plural = 'payment histories'
+        indexes = [
+            models.Index(fields=['proposal', 'application_type'], name='payment_history_proposal_idx'),
+        ]
+
+    def __str__(self):
+        return f'FeeItemApplicationFee: [{self.fee_item_application_fee_id}], amount_paid: {self.amount_paid}'
+
+    @classmethod
+    def refresh(cls, fee_item_application_fee_ids):
+        fee_item_application_fees = FeeItemApplicationFee.objects.filter(id__in=fee_item_application_fee_ids).select_related(
+            'application_fee__proposal', 'fee_item__fee_constructor',
+        )
+        for fee_item_application_fee in fee_item_application_fees:
+            proposal = fee_item_application_fee.application_fee.proposal
+            fee_item = fee_item_application_fee.fee_item
+            cls.objects.update_or_create(
+                fee_item_application_fee=fee_item_application_fee,
+                defaults={
+                    'proposal': proposal,
+                    'application_type_id': fee_item.fee_constructor.application_type_id if fee_item.fee_constructor else None,
+                    'amount_paid': fee_item_application_fee.amount_paid,
+                }
+            )
+
+    @classmethod
+    def get_amounts_paid(cls, proposal, **filters):
+        '''
+        Return {application_type_id: amount} paid through the payment chain of the proposal
+        '''
+        if not proposal:
+            return {}
+        proposal_ids = PaymentChain.get_proposal_ids(proposal)
+        amounts_paid = cls.objects.filter(proposal_id__in=proposal_ids, application_type__isnull=False, **filters)\
+            .order_by().values('application_type_id').annotate(total=Sum('amount_paid')).values_list('application_type_id', 'total')
+        return {application_type_id: total for application_type_id, total in amounts_paid if total}
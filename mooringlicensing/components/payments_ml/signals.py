@@ -1,7 +1,15 @@
 import logging
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
 from django.dispatch import receiver
-from mooringlicensing.components.payments_ml.models import FeeConstructor
+from mooringlicensing.components.main.models import ApplicationType, VesselSizeCategoryGroup, VesselSizeCategory
+from mooringlicensing.components.payments_ml.fee_index import invalidate_fee_index
+from mooringlicensing.components.payments_ml.models import (
+    FeeConstructor, FeeSeason, FeePeriod, FeeItem, ApplicationFee, FeeItemApplicationFee, PaymentChain, PaymentHistory,
+)
+from mooringlicensing.components.proposals.models import (
+    Proposal, WaitingListApplication, AnnualAdmissionApplication, AuthorisedUserApplication, MooringLicenceApplication,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -11,3 +19,71 @@ class FeeConstructorListener(object):
     @receiver(post_save, sender=FeeConstructor)
     def _post_save(sender, instance, **kwargs):
         instance.reconstruct_fees()
+
+
+class FeeIndexListener(object):
+    """
+    Any change to the fee configuration drops the fee index built from it.  It is dropped again on commit, in case
+    another process has rebuilt it from the data before the change was committed.
+    """
+    @staticmethod
+    def _invalidate(sender, instance, **kwargs):
+        invalidate_fee_index()
+        transaction.on_commit(invalidate_fee_index)
+
+
+for model in (ApplicationType, VesselSizeCategoryGroup, VesselSizeCategory, FeeSeason, FeePeriod, FeeConstructor, FeeItem):
+    post_save.connect(FeeIndexListener._invalidate, sender=model, dispatch_uid='fee_index_post_save_{}'.format(model.__name__))
+    post_delete.connect(FeeIndexListener._invalidate, sender=model, dispatch_uid='fee_index_post_delete_{}'.format(model.__name__))
+
+
+class PaymentHistoryListener(object):
+    """
+    Keeps the payment chains and the payment histories up to date with the proposals and the fees paid for them
+    """
+    @staticmethod
+    @receiver(post_save, sender=FeeItemApplicationFee)
+    def _post_save_fee_item_application_fee(sender, instance, **kwargs):
+        PaymentHistory.refresh([instance.id])
+
+    @staticmethod
+    @receiver(post_save, sender=ApplicationFee)
+    def _post_save_application_fee(sender, instance, **kwargs):
+        if not kwargs.get('created'):
+            PaymentHistory.refresh(list(instance.feeitemapplicationfee_set.values_list('id', flat=True)))
+
+    # The fields of a proposal its payment chain is built from
+    PROPOSAL_FIELDS = ('previous_application', 'proposal_type',)
+
+    @staticmethod
+    def _payment_chain_changed(instance, update_fields):
+        attnames = tuple(field + '_id' for field in PaymentHistoryListener.PROPOSAL_FIELDS)
+        if update_fields is not None and not set(update_fields) & set(PaymentHistoryListener.PROPOSAL_FIELDS + attnames):
+            return False
+        if instance._state.adding:
+            return True
+        # Compared with the stored row so that loading a proposal costs nothing
+        stored_values = Proposal.objects.filter(id=instance.id).values_list(*attnames).first()
+        # Read from __dict__ so that a deferred field is not loaded
+        return stored_values != tuple(instance.__dict__.get(attname) for attname in attnames)
+
+    @staticmethod
+    @receiver(pre_save, sender=Proposal)
+    @receiver(pre_save, sender=WaitingListApplication)
+    @receiver(pre_save, sender=AnnualAdmissionApplication)
+    @receiver(pre_save, sender=AuthorisedUserApplication)
+    @receiver(pre_save, sender=MooringLicenceApplication)
+    def _pre_save_proposal(sender, instance, update_fields=None, **kwargs):
+        instance._payment_chain_changed = PaymentHistoryListener._payment_chain_changed(instance, update_fields)
+
+    @staticmethod
+    @receiver(post_save, sender=Proposal)
+    @receiver(post_save, sender=WaitingListApplication)
+    @receiver(post_save, sender=AnnualAdmissionApplication)
+    @receiver(post_save, sender=AuthorisedUserApplication)
+    @receiver(post_save, sender=MooringLicenceApplication)
+    def _post_save_proposal(sender, instance, **kwargs):
+        if not kwargs.get('created') and not getattr(instance, '_payment_chain_changed', True):
+            # Most saves of a proposal don't change what its payments are counted with
+            return
+        transaction.on_commit(lambda: PaymentChain.refresh_with_later_chains(instance))
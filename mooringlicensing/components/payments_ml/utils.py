@@ -1,14 +1,16 @@
 import logging
 import decimal
 import datetime
+from concurrent.futures import ThreadPoolExecutor
 
 import pytz
 from django.http import HttpResponse
 from django.urls import reverse
-from ledger_api_client.utils import create_basket_session, create_checkout_session, calculate_excl_gst
+from django.utils import timezone
+from ledger_api_client.utils import create_basket_session, create_checkout_session, calculate_excl_gst, get_invoice_properties
 from ledger_api_client.settings_base import *
 from mooringlicensing import settings
-from mooringlicensing.components.payments_ml.models import OracleCodeItem
+from mooringlicensing.components.payments_ml.models import OracleCodeItem, InvoicePropertyCache
 
 logger = logging.getLogger(__name__)
 
@@ -116,4 +118,185 @@ def make_serializable(line_items):
             if isinstance(line[key], decimal.Decimal):
                 # Convert Decimal to str
                 line[key] = float(line[key])
-    return line_items
\ No newline at end of file
+    return line_items
+
+
+def mark_invoice_properties_stale(invoice_ids):
+    """
+    Flag the cached properties of the invoices as stale.  No call to the ledger is made here.
+    """
+    invoice_ids = [invoice_id for invoice_id in invoice_ids if invoice_id]
+    if not invoice_ids:
+        return 0
+    return InvoicePropertyCache.objects.filter(invoice_id__in=invoice_ids, stale=False).update(stale=True)
+
+
+INVOICE_PROPERTY_KEYS = ('payment_status', 'reference', 'amount', 'settlement_date',)
+
+
+def _fetch_invoice_properties(invoice_id):
+    try:
+        inv_props = get_invoice_properties(invoice_id)
+        return invoice_id, {key: inv_props['data']['invoice'][key] for key in INVOICE_PROPERTY_KEYS}
+    except Exception as e:
+        logger.error(f'Failed to retrieve the properties of the invoice: [{invoice_id}] from the ledger.  Error: [{e}]')
+        return invoice_id, None
+
+
+def refresh_invoice_properties(invoice_ids):
+    """
+    Retrieve the properties of the invoices from the ledger in batches of INVOICE_PROPERTY_CACHE_BATCH_SIZE,
+    each batch is fetched concurrently, then the cache is updated with a single bulk write per batch.
+    Return a dict {invoice_id: properties} of the invoices successfully refreshed.
+    """
+    invoice_ids = list(dict.fromkeys(invoice_id for invoice_id in invoice_ids if invoice_id))
+    refreshed = {}
+    batch_size = settings.INVOICE_PROPERTY_CACHE_BATCH_SIZE
+
+    for i in range(0, len(invoice_ids), batch_size):
+        batch = invoice_ids[i:i + batch_size]
+        with ThreadPoolExecutor(max_workers=min(settings.INVOICE_PROPERTY_CACHE_MAX_WORKERS, len(batch))) as executor:
+            results = {invoice_id: props for invoice_id, props in executor.map(_fetch_invoice_properties, batch) if props is not None}
+        if not results:
+            continue
+
+        now = timezone.now()
+        existing = InvoicePropertyCache.objects.in_bulk(list(results.keys()), field_name='invoice_id')
+        to_update = []
+        to_create = []
+        for invoice_id, props in results.items():
+            cache = existing.get(invoice_id)
+            if cache:
+                cache.properties = props
+                cache.stale = False
+                cache.date_refreshed = now
+                to_update.append(cache)
+            else:
+                to_create.append(InvoicePropertyCache(invoice_id=invoice_id, properties=props, stale=False, date_refreshed=now))
+        InvoicePropertyCache.objects.bulk_update(to_update, ['properties', 'stale', 'date_refreshed'])
+        InvoicePropertyCache.objects.bulk_create(to_create, ignore_conflicts=True)
+        update_invoice_property_cache_columns(results)
+        refreshed.update(results)
+
+    logger.info(f'Invoice properties refreshed for {len(refreshed)} out of {len(invoice_ids)} invoice(s).')
+    return refreshed
+
+
+def get_invoice_property_cache_models():
+    from mooringlicensing.components.proposals.models import Proposal
+    from mooringlicensing.components.approvals.models import DcvAdmission, DcvPermit, Sticker
+    return [Proposal, DcvAdmission, DcvPermit, Sticker,]
+
+
+def update_invoice_property_cache_columns(invoice_properties):
+    """
+    Write the refreshed invoice properties {invoice_id: properties} to the invoice_property_cache of the records
+    holding those invoices, with one query and one bulk update per model.  save() is not called.
+    """
+    if not invoice_properties:
+        return
+    keys = [str(invoice_id) for invoice_id in invoice_properties.keys()]
+    for model in get_invoice_property_cache_models():
+        instances = list(model.objects.filter(invoice_property_cache__has_any_keys=keys).only('id', 'invoice_property_cache'))
+        for instance in instances:
+            for key in list(instance.invoice_property_cache.keys()):
+                if int(key) in invoice_properties:
+                    instance.invoice_property_cache[key] = invoice_properties[int(key)]
+        model.objects.bulk_update(instances, ['invoice_property_cache',])
+
+
+def get_stored_invoice_properties(invoice_ids):
+    """
+    Return a dict {invoice_id: properties} of the invoices found in the shared cache, stale or not, without calling
+    the ledger
+    """
+    invoice_ids = [invoice_id for invoice_id in invoice_ids if invoice_id]
+    if not invoice_ids:
+        return {}
+    return dict(InvoicePropertyCache.objects.filter(invoice_id__in=invoice_ids).values_list('invoice_id', 'properties'))
+
+
+def get_cached_invoice_properties(invoice_ids):
+    """
+    Return a dict {invoice_id: properties} for the invoices.
+    Entries which are missing or stale are refreshed from the ledger in one batch.
+    """
+    invoice_ids = list(dict.fromkeys(invoice_id for invoice_id in invoice_ids if invoice_id))
+    if not invoice_ids:
+        return {}
+
+    cached = InvoicePropertyCache.objects.in_bulk(invoice_ids, field_name='invoice_id')
+    invoice_properties = {invoice_id: cache.properties for invoice_id, cache in cached.items() if not cache.stale}
+    to_be_refreshed = [invoice_id for invoice_id in invoice_ids if invoice_id not in invoice_properties]
+    if to_be_refreshed:
+        invoice_properties.update(refresh_invoice_properties(to_be_refreshed))
+        for invoice_id in to_be_refreshed:
+            if invoice_id not in invoice_properties and invoice_id in cached:
+                # Ledger not reachable, fall back to the stale values
+                invoice_properties[invoice_id] = cached[invoice_id].properties
+
+    # Keep the order of the invoices passed in
+    return {invoice_id: invoice_properties[invoice_id] for invoice_id in invoice_ids if invoice_id in invoice_properties}
+
+
+def sync_invoice_property_cache(instance, invoices, save=True):
+    """
+    Populate instance.invoice_property_cache from the shared InvoicePropertyCache.
+    When save is True and the values have changed, only the invoice_property_cache column is written,
+    so that the instance's save() (which marks the cache stale) is not triggered.
+    """
+    invoice_property_cache = get_cached_invoice_properties([inv.id for inv in invoices])
+    # Keys of a JSONField are str once loaded from the database
+    has_changed = {str(key): value for key, value in (instance.invoice_property_cache or {}).items()} != {str(key): value for key, value in invoice_property_cache.items()}
+    instance.invoice_property_cache = invoice_property_cache
+    if save and has_changed and instance.pk:
+        type(instance).objects.filter(pk=instance.pk).update(invoice_property_cache=invoice_property_cache)
+    return invoice_property_cache
+
+
+def read_invoice_property_cache(instance, get_invoices):
+    """
+    Return instance.invoice_property_cache keyed by the invoice ids.
+    It is filled in from get_invoices() when empty.  The invoices not retrieved yet, or flagged stale since (e.g. by
+    the save() of the instance once paid), are retrieved again before being returned, for those invoices only.
+    Invoices whose properties could not be retrieved are left out.
+    """
+    if not instance.invoice_property_cache:
+        return sync_invoice_property_cache(instance, get_invoices())
+
+    invoice_property_cache = {int(key): value for key, value in instance.invoice_property_cache.items()}
+    to_be_refreshed = {invoice_id for invoice_id, properties in invoice_property_cache.items() if not properties}
+    to_be_refreshed.update(InvoicePropertyCache.objects.filter(invoice_id__in=invoice_property_cache.keys(), stale=True).values_list('invoice_id', flat=True))
+    if to_be_refreshed:
+        # The invoice_property_cache column of the instance is updated by refresh_invoice_properties()
+        invoice_property_cache.update(get_cached_invoice_properties(to_be_refreshed))
+        instance.invoice_property_cache = invoice_property_cache
+    return {invoice_id: properties for invoice_id, properties in invoice_property_cache.items() if properties}
+
+
+def mark_invoice_property_cache_stale(instance, invoices):
+    """
+    Called from the save() of the models holding an invoice_property_cache instead of retrieving the invoice properties from the ledger.
+    The invoices already held are flagged as stale.  The invoices new to the instance are taken from the shared cache
+    when found there, otherwise they are held without properties.  No call to the ledger is made here, the invoices
+    are retrieved when read next (see read_invoice_property_cache()) or by the refresh_invoice_property_cache command.
+    """
+    invoice_property_cache = instance.invoice_property_cache or {}
+    invoice_ids = []
+    for key in invoice_property_cache.keys():
+        try:
+            invoice_ids.append(int(key))
+        except (TypeError, ValueError):
+            pass
+
+    new_invoice_ids = list(dict.fromkeys(inv.id for inv in invoices if inv.id and inv.id not in invoice_ids))
+    mark_invoice_properties_stale(invoice_ids + new_invoice_ids)
+    if new_invoice_ids:
+        stored = get_stored_invoice_properties(new_invoice_ids)
+        InvoicePropertyCache.objects.bulk_create(
+            [InvoicePropertyCache(invoice_id=invoice_id, stale=True) for invoice_id in new_invoice_ids if invoice_id not in stored],
+            ignore_conflicts=True,
+        )
+        for invoice_id in new_invoice_ids:
+            invoice_property_cache[invoice_id] = stored.get(invoice_id) or None
+        instance.invoice_property_cache = invoice_property_cache
@@ -39,7 +39,7 @@ from mooringlicensing.components.payments_ml.models import (
     OracleCodeItem
 )
 from mooringlicensing.components.payments_ml.utils import (
-    checkout
+    checkout, mark_invoice_properties_stale
 )
 from mooringlicensing.components.proposals.models import (
     Proposal, ProposalUserAction, 
@@ -333,6 +333,8 @@ class StickerReplacementFeeSuccessViewPreload(APIView):
                     else:
                         logger.info(f'Invoice with invoice_reference: {invoice_reference} exist.')
                     invoice = Invoice.objects.get(reference=invoice_reference)
+                    # Just paid, the cached properties of the invoice are retrieved again when read next
+                    mark_invoice_properties_stale([invoice.id])
 
                     sticker_action_fee.invoice_reference = invoice.reference
                     sticker_action_fee.save()
@@ -705,6 +707,8 @@ class DcvAdmissionFeeSuccessViewPreload(APIView):
             else:
                 logger.info(f'Invoice with invoice_reference: {invoice_reference} exist.')
             invoice = Invoice.objects.get(reference=invoice_reference)
+            # Just paid, the cached properties of the invoice are retrieved again when read next
+            mark_invoice_properties_stale([invoice.id])
 
             if not FeeCalculation.objects.filter(uuid=uuid).exists():
                 logger.info(f'FeeCalculation with uuid: {uuid} does not exist.  Redirecting user to dashboard page.')
@@ -801,6 +805,8 @@ class DcvPermitFeeSuccessViewPreload(APIView):
             else:
                 logger.info(f'Invoice with invoice_reference: {invoice_reference} exist.')
             invoice = Invoice.objects.get(reference=invoice_reference)
+            # Just paid, the cached properties of the invoice are retrieved again when read next
+            mark_invoice_properties_stale([invoice.id])
 
             if not FeeCalculation.objects.filter(uuid=uuid).exists():
                 logger.info(f'FeeCalculation with uuid: {uuid} does not exist.  Redirecting user to dashboard page.')
@@ -898,6 +904,8 @@ class ApplicationFeeSuccessViewPreload(APIView):
                 else:
                     logger.info(f'Invoice with invoice_reference: {invoice_reference} exist.')
                 invoice = Invoice.objects.get(reference=invoice_reference)
+                # Just paid, the cached properties of the invoice are retrieved again when read next
+                mark_invoice_properties_stale([invoice.id])
 
                 if not FeeCalculation.objects.filter(uuid=uuid).exists():
                     logger.info(f'FeeCalculation with uuid: {uuid} does not exist.  Redirecting user to dashboard page.')
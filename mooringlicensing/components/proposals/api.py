@@ -28,7 +28,8 @@ from mooringlicensing.components.proposals.utils import (
 from mooringlicensing.components.proposals.models import (
     ElectoralRollDocument, HullIdentificationNumberDocument, InsuranceCertificateDocument, 
     MooringReportDocument, VesselOwnershipCompanyOwnership,
-    ProposalType, ProposalApplicant, VesselRegistrationDocument, ProposalSiteLicenseeMooringRequest
+    ProposalType, ProposalApplicant, VesselRegistrationDocument, ProposalSiteLicenseeMooringRequest,
+    ProposalSearchDocument,
 )
 from mooringlicensing.components.main.utils import (
     get_bookings, calculate_max_length,
@@ -536,17 +537,9 @@ class ProposalFilterBackend(DatatablesFilterBackend):
         search_text = request.GET.get('search[value]')
         if search_text:
             #the search conducted by the superclass only accomodates the ProposalApplicant users
-            #this misses any new draft proposals, which do not yet have a ProposalApplicant record assigned - so we will do that here
-            system_user_ids = list(SystemUser.objects.annotate(full_name=Concat('legal_first_name',Value(" "),'legal_last_name',output_field=CharField()))
-            .filter(
-                Q(legal_first_name__icontains=search_text) | Q(legal_last_name__icontains=search_text) | Q(email__icontains=search_text) | Q(full_name__icontains=search_text)
-            ).values_list("ledger_id", flat=True))
-            #the search also does not accomodate combining first names and last names even with ProposalApplicant - so we will also do that here
-            proposal_applicant_proposals = list(ProposalApplicant.objects.annotate(full_name=Concat('first_name',Value(" "),'last_name',output_field=CharField()))
-            .filter(
-                Q(first_name__icontains=search_text) | Q(last_name__icontains=search_text) | Q(email__icontains=search_text) | Q(full_name__icontains=search_text)
-            ).values_list("proposal_id", flat=True))
-            queryset = queryset.filter(Q(id__in=proposal_applicant_proposals)|Q(submitter__in=system_user_ids))
+            #this misses any new draft proposals, which do not yet have a ProposalApplicant record assigned,
+            #and does not accomodate combining first names and last names - the search document has both the submitter and the applicant
+            queryset = queryset.filter(id__in=ProposalSearchDocument.search(search_text, fields=('people',)).values('proposal_id'))
             queryset = queryset.distinct() | super_queryset    
 
         mla_list = MooringLicenceApplication.objects.all()
@@ -31,6 +31,7 @@ from django.db.models.signals import pre_delete
 from django.core.exceptions import ValidationError, ObjectDoesNotExist, ImproperlyConfigured
 from django.db.models import JSONField
 from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex
 from django.utils import timezone
 from django.urls import reverse
 from ledger_api_client.ledger_models import EmailUserRO
@@ -40,7 +41,7 @@ from mooringlicensing.components.main.models import (
     CommunicationsLogEntry,
     GlobalSettings,
     UserAction,
-    Document, ApplicationType, NumberOfDaysType, NumberOfDaysSetting, RevisionedMixin, SanitiseMixin
+    Document, ApplicationType, NumberOfDaysType, NumberOfDaysSetting, RevisionedMixin, SanitiseMixin, SearchDocument
 )
 
 import requests
@@ -382,6 +383,10 @@ class Proposal(RevisionedMixin):
         app_label = 'mooringlicensing'
         verbose_name = "Application"
         verbose_name_plural = "Applications"
+        indexes = [
+            # The invoice properties refreshed are written back to the records holding the invoices
+            GinIndex(fields=['invoice_property_cache'], name='proposal_invoice_props_gin'),
+        ]
     
     def bypass_payment(self, request):
         logger.info(f'Bypassing payment for Proposal: [{self}].')
@@ -956,7 +961,7 @@ class Proposal(RevisionedMixin):
         return mapped_rego_nos
 
     def get_amount_paid_so_far_for_aa_through_this_proposal(self, proposal, vessel):
-        from mooringlicensing.components.payments_ml.models import FeeItemApplicationFee
+        from mooringlicensing.components.payments_ml.models import FeeItemApplicationFee, PaymentChain
         from mooringlicensing.components.payments_ml.models import FeeConstructor
         from mooringlicensing.components.approvals.models import MooringLicence, AuthorisedUserPermit, VesselOwnershipOnApproval, ApprovalHistory
         logger.info(f'Calculating the amount paid so far for the AA component through the proposal(s) which leads to the proposal: [{self}]...')
@@ -971,275 +976,223 @@ class Proposal(RevisionedMixin):
         target_date = target_datetime.date()
         annual_admission_type = ApplicationType.objects.get(code=AnnualAdmissionApplication.code)
 
-        proposal_id_list = []
-        continue_loop = True
-
         target_proposal = proposal
         #NOTE: due to unexpected migration behaviour sometimes multiple valid VO records will exist for one vessel - we need to ensure that all non-sold valid VO records are able to be used for VO validation
         latest_vessel_ownerships = VesselOwnership.objects.filter(vessel=vessel,end_date=None).order_by('-id')
 
+        # The proposal and its previous applications back to the first application for this season
+        proposal_ids = PaymentChain.get_proposal_ids(target_proposal) if target_proposal else []
+        proposals = Proposal.objects.select_related('proposal_type', 'vessel_ownership__vessel', 'approval').in_bulk(proposal_ids)
+        if target_proposal:
+            proposals[target_proposal.id] = target_proposal
+        proposals = [proposals[proposal_id] for proposal_id in proposal_ids if proposal_id in proposals]
+
+        # The AA components paid through those proposals
+        fee_item_application_fees = {proposal_id: [] for proposal_id in proposal_ids}
+        for fee_item_application_fee in FeeItemApplicationFee.objects.filter(
+                payment_history__proposal_id__in=proposal_ids, payment_history__application_type=annual_admission_type
+        ).select_related('payment_history', 'vessel_details__vessel', 'fee_item__fee_period').order_by('id'):
+            fee_item_application_fees[fee_item_application_fee.payment_history.proposal_id].append(fee_item_application_fee)
+
+        # The correct vessels of the AA components of the ML renewals
+        fee_item_application_fee_vessels = {}
+        for proposal in proposals:
+            if proposal.proposal_type.code == PROPOSAL_TYPE_RENEWAL and type(proposal.child_obj) == MooringLicenceApplication:
+                #specialised function to get CORRECT fee_item_application_fee vessels 
+                fee_item_application_fee_vessels.update(self.get_AA_fee_item_application_vessels(proposal))
+
         # run loop to first find BASE AMOUNT PAID FOR THE TARGET VESSEL
         # run a second loop to find VALID DEDUCTIONS
         # run a third loop to find PREVIOUSLY APPLIED DEDUCTIONS
         # Subtract third loop results from second loop - add second loop results to first loop
 
         # first loop - payments for the target vessel
-        while continue_loop:
-            if proposal:
-                if proposal.id in proposal_id_list:
-                    continue_loop = False
-                    break
-                proposal_id_list.append(proposal.id)
+        for proposal in proposals:
+            for fee_item_application_fee in fee_item_application_fees[proposal.id]:
+                # We are interested only in the AnnualAdmission component
+                logger.info(f'FeeItemApplicationFee: [{fee_item_application_fee}] found through the proposal: [{proposal}]')
+                try:
+                    target_vessel = fee_item_application_fee.vessel_details.vessel
+                    if proposal.proposal_type.code == PROPOSAL_TYPE_RENEWAL and type(proposal.child_obj) == MooringLicenceApplication:
+                        incorrect_vessel = target_vessel
+                        target_vessel = fee_item_application_fee_vessels[fee_item_application_fee.id]
+                        if incorrect_vessel != target_vessel:
+                            logger.warning(f"FeeItemApplicationFee: [{fee_item_application_fee}] incorrectly recorded {incorrect_vessel.rego_no} as vessel. Correct vessel should be {target_vessel.rego_no} which has been substituted for calculations.")
+                except:
+                    logger.warning("Application fee missing vessel details - invoices may require review")
+                    target_vessel = None
 
-                fee_item_application_fee_vessels = []
-                if proposal.proposal_type.code == PROPOSAL_TYPE_RENEWAL and type(proposal.child_obj) == MooringLicenceApplication:
-                    #specialised function to get CORRECT fee_item_application_fee vessels 
-                    fee_item_application_fee_vessels = self.get_AA_fee_item_application_vessels(proposal)
+                # Retrieve the current approvals of the target_vessel
+                if target_vessel:
+                    current_approvals = target_vessel.get_current_approvals(target_date)
+                    logger.info(f'Current approvals for the vessel: [{target_vessel}]: {current_approvals}')
 
-                for fee_item_application_fee in FeeItemApplicationFee.objects.filter(application_fee__proposal=proposal, fee_item__fee_constructor__application_type=annual_admission_type):
-                    # We are interested only in the AnnualAdmission component
-                    logger.info(f'FeeItemApplicationFee: [{fee_item_application_fee}] found through the proposal: [{proposal}]')
-                    try:
-                        target_vessel = fee_item_application_fee.vessel_details.vessel
-                        if proposal.proposal_type.code == PROPOSAL_TYPE_RENEWAL and type(proposal.child_obj) == MooringLicenceApplication:
-                            incorrect_vessel = target_vessel
-                            target_vessel = fee_item_application_fee_vessels[fee_item_application_fee.id]
-                            if incorrect_vessel != target_vessel:
-                                logger.warning(f"FeeItemApplicationFee: [{fee_item_application_fee}] incorrectly recorded {incorrect_vessel.rego_no} as vessel. Correct vessel should be {target_vessel.rego_no} which has been substituted for calculations.")
-                    except:
-                        logger.warning("Application fee missing vessel details - invoices may require review")
-                        target_vessel = None
-
-                    # Retrieve the current approvals of the target_vessel
-                    if target_vessel:
-                        current_approvals = target_vessel.get_current_approvals(target_date)
-                        logger.info(f'Current approvals for the vessel: [{target_vessel}]: {current_approvals}')
-
-                        if (not proposal.vessel_ownership and vessel == target_vessel) or proposal.vessel_ownership in latest_vessel_ownerships:
-                            # This is paid for AA component for a target_vessel
-                            # In this case, we can transfer this amount
-                            amount_paid = fee_item_application_fee.amount_paid if fee_item_application_fee.amount_paid else 0
-        
-                            max_amount_paid += amount_paid
-                            logger.info(f'Amount: [{amount_paid}] has been factored in to the current max AA amount paid.')
-                            if amount_paid > 0:
-                                logger.info(f'Transferable amount: [{fee_item_application_fee}], which already has been paid.')
+                    if (not proposal.vessel_ownership and vessel == target_vessel) or proposal.vessel_ownership in latest_vessel_ownerships:
+                        # This is paid for AA component for a target_vessel
+                        # In this case, we can transfer this amount
+                        amount_paid = fee_item_application_fee.amount_paid if fee_item_application_fee.amount_paid else 0
+    
+                        max_amount_paid += amount_paid
+                        logger.info(f'Amount: [{amount_paid}] has been factored in to the current max AA amount paid.')
+                        if amount_paid > 0:
+                            logger.info(f'Transferable amount: [{fee_item_application_fee}], which already has been paid.')
+                    else:
+                        #for tracking max payments of other vessels - used to determine potential deductions where no payment exists (for all but the vessel on this proposal)
+                        amount_paid = fee_item_application_fee.amount_paid if fee_item_application_fee.amount_paid else 0
+                        if target_vessel.rego_no in max_amount_paid_per_vessel:
+                            max_amount_paid_per_vessel[target_vessel.rego_no] += amount_paid
                         else:
-                            #for tracking max payments of other vessels - used to determine potential deductions where no payment exists (for all but the vessel on this proposal)
-                            amount_paid = fee_item_application_fee.amount_paid if fee_item_application_fee.amount_paid else 0
-                            if target_vessel.rego_no in max_amount_paid_per_vessel:
-                                max_amount_paid_per_vessel[target_vessel.rego_no] += amount_paid
-                            else:
-                                max_amount_paid_per_vessel[target_vessel.rego_no] = amount_paid
-             
-                if proposal.proposal_type.code in [PROPOSAL_TYPE_NEW, PROPOSAL_TYPE_RENEWAL, ]:
-                    # Now, 'prev_application' is the very first application for this season
-                    # We are not interested in any older applications
-                    continue_loop = False
-                    break
-                else:
-                    # Assign the previous application, then perform checking above again
-                    proposal = proposal.previous_application
-            else:
-                continue_loop = False
-                break
+                            max_amount_paid_per_vessel[target_vessel.rego_no] = amount_paid
 
-        proposal = target_proposal
-        proposal_id_list = []
-        continue_loop = True
         # second loop - applicable deductions from all valid approval proposals
-        while continue_loop:
-            if proposal:
-                if proposal.id in proposal_id_list:
-                    continue_loop = False
-                    break
-                proposal_id_list.append(proposal.id)
-
-                fee_item_application_fee_vessels = []
-                if proposal.proposal_type.code == PROPOSAL_TYPE_RENEWAL and type(proposal.child_obj) == MooringLicenceApplication:
-                    #specialised function to get CORRECT fee_item_application_fee vessels 
-                    fee_item_application_fee_vessels = self.get_AA_fee_item_application_vessels(proposal)
+        for proposal in proposals:
+            for fee_item_application_fee in fee_item_application_fees[proposal.id]:
+                # We are interested only in the AnnualAdmission component
+                logger.info(f'FeeItemApplicationFee: [{fee_item_application_fee}] found through the proposal: [{proposal}]')
+                try:
+                    target_vessel = fee_item_application_fee.vessel_details.vessel
+                    if proposal.proposal_type.code == PROPOSAL_TYPE_RENEWAL and type(proposal.child_obj) == MooringLicenceApplication:
+                        incorrect_vessel = target_vessel
+                        target_vessel = fee_item_application_fee_vessels[fee_item_application_fee.id]
+                        if incorrect_vessel != target_vessel:
+                            logger.warning(f"FeeItemApplicationFee: [{fee_item_application_fee}] incorrectly recorded {incorrect_vessel.rego_no} as vessel. Correct vessel should be {target_vessel.rego_no} which has been substituted for calculations.")
+                except:
+                    logger.warning("Application fee missing vessel details - invoices may require review")
+                    target_vessel = None
+
+                # Retrieve the current approvals of the target_vessel
+                if target_vessel and target_proposal and target_proposal.proposal_applicant:
+                    current_approvals = target_vessel.get_current_approvals(target_date)
+                    logger.info(f'Current approvals for the vessel: [{target_vessel}]: {current_approvals}')
+
+                    #filter the current approvals to only match those of the current user
+                    current_approvals['aaps'] = current_approvals['aaps'].filter(current_proposal__proposal_applicant__email_user_id=target_proposal.proposal_applicant.email_user_id)
+                    current_approvals['aups'] = current_approvals['aups'].filter(current_proposal__proposal_applicant__email_user_id=target_proposal.proposal_applicant.email_user_id)
+                    current_approvals['mls'] = current_approvals['mls'].filter(current_proposal__proposal_applicant__email_user_id=target_proposal.proposal_applicant.email_user_id)
+                
+                    logger.info(f'Current approvals for the vessel belonging to the same applicant: [{target_vessel}]: {current_approvals}')
 
-                for fee_item_application_fee in FeeItemApplicationFee.objects.filter(application_fee__proposal=proposal, fee_item__fee_constructor__application_type=annual_admission_type):
-                    # We are interested only in the AnnualAdmission component
-                    logger.info(f'FeeItemApplicationFee: [{fee_item_application_fee}] found through the proposal: [{proposal}]')
-                    try:
-                        target_vessel = fee_item_application_fee.vessel_details.vessel
-                        if proposal.proposal_type.code == PROPOSAL_TYPE_RENEWAL and type(proposal.child_obj) == MooringLicenceApplication:
-                            incorrect_vessel = target_vessel
-                            target_vessel = fee_item_application_fee_vessels[fee_item_application_fee.id]
-                            if incorrect_vessel != target_vessel:
-                                logger.warning(f"FeeItemApplicationFee: [{fee_item_application_fee}] incorrectly recorded {incorrect_vessel.rego_no} as vessel. Correct vessel should be {target_vessel.rego_no} which has been substituted for calculations.")
-                    except:
-                        logger.warning("Application fee missing vessel details - invoices may require review")
-                        target_vessel = None
-
-                    # Retrieve the current approvals of the target_vessel
-                    if target_vessel and target_proposal and target_proposal.proposal_applicant:
-                        current_approvals = target_vessel.get_current_approvals(target_date)
-                        logger.info(f'Current approvals for the vessel: [{target_vessel}]: {current_approvals}')
-
-                        #filter the current approvals to only match those of the current user
-                        current_approvals['aaps'] = current_approvals['aaps'].filter(current_proposal__proposal_applicant__email_user_id=target_proposal.proposal_applicant.email_user_id)
-                        current_approvals['aups'] = current_approvals['aups'].filter(current_proposal__proposal_applicant__email_user_id=target_proposal.proposal_applicant.email_user_id)
-                        current_approvals['mls'] = current_approvals['mls'].filter(current_proposal__proposal_applicant__email_user_id=target_proposal.proposal_applicant.email_user_id)
+                deduct = False
+                #For when the vessel on the currently observed proposal is NOT the target vessel
+                #We calculate deductions here to factor instances where another vessel has been removed from the approval, to discount from the total cost
+                if target_vessel and target_vessel != vessel:
                     
-                        logger.info(f'Current approvals for the vessel belonging to the same applicant: [{target_vessel}]: {current_approvals}')
-
-                    deduct = False
-                    #For when the vessel on the currently observed proposal is NOT the target vessel
-                    #We calculate deductions here to factor instances where another vessel has been removed from the approval, to discount from the total cost
-                    if target_vessel and target_vessel != vessel:
-                        
-                        if proposal.approval and proposal.approval.child_obj and type(proposal.approval.child_obj) == MooringLicence:
-                            # When ML, customer is adding a new vessel to the ML
-                            if not current_approvals['aaps'] and not current_approvals['aups'] and not current_approvals['mls']:
-                                # However, old vessel (target vessel) is no longer on any licence/permit.
-                                logger.info(f'Vessel: [{vessel}] is being added to the approval: [{proposal.approval}], however the vessel [{target_vessel}] is no longer on any permit/licence.  We can transfer the amount paid: [{fee_item_application_fee}].')
-                                deduct = True
-                            else:
-                                # We have to charge full amount  --> Go to next loop
-                                logger.info(f'Vessel: [{vessel}] is being added to the approval: [{proposal.approval}] and the vessel: [{target_vessel}] is still on another licence/permit.  We cannot transfer the amount paid: [{fee_item_application_fee}] for the vessel: [{vessel}].')
-                                deduct = False
-                                #continue
-                        if proposal.approval and proposal.approval.child_obj and type(proposal.approval.child_obj) == AuthorisedUserPermit:
-                            # When AU, customer is replacing the current vessel
-                            for key, qs in current_approvals.items():
-                                # We want to exclude the approval being amended(modified) because the target_vessel is being removed from it.
-                                current_approvals[key] = qs.exclude(id=self.approval.id)
-                                deduct = True
-                            if current_approvals['aaps'] or current_approvals['aups'] or current_approvals['mls']:
-                                # When the current vessel is still used for other approvals --> Go to next loop
-                                # But this fee_item_application_fee is still used for other approval(s)
-                                logger.info(f'Existing Vessel: [{target_vessel}] still has current approval(s): [{current_approvals}].  We don\'t transfer the amount paid: [{fee_item_application_fee}].')
-                                deduct = False
-                                #continue
-
-                    potential_deduction = fee_item_application_fee.amount_paid if fee_item_application_fee.amount_paid else 0
-
-                    if (potential_deduction < 0 and not deduct) or (deduct and potential_deduction > 0):
-                        valid_deductions += potential_deduction
-                        logger.info(f'Amount: [{potential_deduction}] has been factored in to the current max AA amount paid.')
-                        if valid_deductions > 0:
-                            logger.info(f'Transferable amount: [{fee_item_application_fee}], which already has been paid.')
+                    if proposal.approval and proposal.approval.child_obj and type(proposal.approval.child_obj) == MooringLicence:
+                        # When ML, customer is adding a new vessel to the ML
+                        if not current_approvals['aaps'] and not current_approvals['aups'] and not current_approvals['mls']:
+                            # However, old vessel (target vessel) is no longer on any licence/permit.
+                            logger.info(f'Vessel: [{vessel}] is being added to the approval: [{proposal.approval}], however the vessel [{target_vessel}] is no longer on any permit/licence.  We can transfer the amount paid: [{fee_item_application_fee}].')
+                            deduct = True
+                        else:
+                            # We have to charge full amount  --> Go to next loop
+                            logger.info(f'Vessel: [{vessel}] is being added to the approval: [{proposal.approval}] and the vessel: [{target_vessel}] is still on another licence/permit.  We cannot transfer the amount paid: [{fee_item_application_fee}] for the vessel: [{vessel}].')
+                            deduct = False
+                            #continue
+                    if proposal.approval and proposal.approval.child_obj and type(proposal.approval.child_obj) == AuthorisedUserPermit:
+                        # When AU, customer is replacing the current vessel
+                        for key, qs in current_approvals.items():
+                            # We want to exclude the approval being amended(modified) because the target_vessel is being removed from it.
+                            current_approvals[key] = qs.exclude(id=self.approval.id)
+                            deduct = True
+                        if current_approvals['aaps'] or current_approvals['aups'] or current_approvals['mls']:
+                            # When the current vessel is still used for other approvals --> Go to next loop
+                            # But this fee_item_application_fee is still used for other approval(s)
+                            logger.info(f'Existing Vessel: [{target_vessel}] still has current approval(s): [{current_approvals}].  We don\'t transfer the amount paid: [{fee_item_application_fee}].')
+                            deduct = False
+                            #continue
+
+                potential_deduction = fee_item_application_fee.amount_paid if fee_item_application_fee.amount_paid else 0
+
+                if (potential_deduction < 0 and not deduct) or (deduct and potential_deduction > 0):
+                    valid_deductions += potential_deduction
+                    logger.info(f'Amount: [{potential_deduction}] has been factored in to the current max AA amount paid.')
+                    if valid_deductions > 0:
+                        logger.info(f'Transferable amount: [{fee_item_application_fee}], which already has been paid.')
 
-                if proposal.proposal_type.code in [PROPOSAL_TYPE_NEW, PROPOSAL_TYPE_RENEWAL, ]:
-                    # Now, 'prev_application' is the very first application for this season
-                    # We are not interested in any older applications
-                    continue_loop = False
-                    break
-                else:
-                    # Assign the previous application, then perform checking above again
-                    proposal = proposal.previous_application
-            else:
-                continue_loop = False
-                break
-                    
-        proposal = target_proposal
-        proposal_id_list = []
-        continue_loop = True
         # third loop - deductions that have already been applied
-        while continue_loop:
-            if proposal:
-                if proposal.id in proposal_id_list:
-                    continue_loop = False
-                    break
-                proposal_id_list.append(proposal.id)
-
-                if proposal != target_proposal:
-
-                    #This fee items was charged 0 meaning that the entire sum for the AA was deducted for the target vessel OR the fee was bypassed for having already been paid
-                    #To determine which:
-                    # - get pertaining vessel for (missing) line item
-                    # - find max paid (actual) for the specific vessel
-                    # - get expected full amount for vessel
-                    # - subtract payment from expected full amount
-                    # - any remainder is a former deduction
-                    if (not FeeItemApplicationFee.objects.filter(application_fee__proposal=proposal,fee_item__fee_constructor__application_type=annual_admission_type).exists() and proposal.vessel_ownership):
-
-                        target_vessel = proposal.vessel_ownership.vessel
-                        max_paid_for_vessel = 0
-                        if target_vessel and target_vessel.rego_no and target_vessel.rego_no in max_amount_paid_per_vessel:
-                            max_paid_for_vessel = max_amount_paid_per_vessel[target_vessel.rego_no]
-
-                        if not proposal.vessel_ownership in latest_vessel_ownerships:
-                            try:
-                                paid_date = ApprovalHistory.objects.filter(proposal=proposal).first().start_date.date()
-                                fee_constructor_for_aa = FeeConstructor.get_fee_constructor_by_application_type_and_date(annual_admission_type, paid_date)
-                                fee_item = fee_constructor_for_aa.get_fee_item(proposal.vessel_length, proposal.proposal_type, paid_date)
-                                logger.info(f'Proposal: [{proposal}] AA would have cost ${fee_item.get_absolute_amount(proposal.vessel_length)} if paid for')
-
-                                deduction_for_zero_payment = fee_item.get_absolute_amount(proposal.vessel_length) - max_paid_for_vessel
-                                logger.info(f'Proposal: Vessel on [{proposal}] was charged ${max_paid_for_vessel}')
-
-                                if deduction_for_zero_payment > 0:
-                                    logger.info(f'Proposal: [{proposal}] was deducted ${deduction_for_zero_payment}')
-                                    previously_applied_deductions += deduction_for_zero_payment
-
-                            except:
-                                logger.warning(f'Unable to determine proposal approval start date - will be unable to determine how much would have been paid for it')
-                        
-                    #Here a fee item exists. A deduction may have been made for one of three reasons:
-                    # - Another vessel ownership is no longer valid
-                    # - A valid AA payment is no longer applied
-                    # - A vessel increased in size and the former total has been removed
-                    # - In the case of the first two items, deductions SHOULD be factored and removed from future deductions
-                    # - In the last case, the original payment for the vessel should be factored before any potential former deductions are determined as the "deduction" in those cases have actually been paid for and are still valid
-                    # - To do this, we must use the max paid value for the vessel in question, and subtract the payment from expected full amount
-                    for fee_item_application_fee in FeeItemApplicationFee.objects.filter(application_fee__proposal=proposal, fee_item__fee_constructor__application_type=annual_admission_type):
-                        
-                        # We are interested only in the AnnualAdmission component
-                        logger.info(f'FeeItemApplicationFee: [{fee_item_application_fee}] found through the proposal: [{proposal}]')
+        for proposal in proposals:
+            if proposal == target_proposal:
+                continue
+
+            #This fee items was charged 0 meaning that the entire sum for the AA was deducted for the target vessel OR the fee was bypassed for having already been paid
+            #To determine which:
+            # - get pertaining vessel for (missing) line item
+            # - find max paid (actual) for the specific vessel
+            # - get expected full amount for vessel
+            # - subtract payment from expected full amount
+            # - any remainder is a former deduction
+            if (not fee_item_application_fees[proposal.id] and proposal.vessel_ownership):
+
+                target_vessel = proposal.vessel_ownership.vessel
+                max_paid_for_vessel = 0
+                if target_vessel and target_vessel.rego_no and target_vessel.rego_no in max_amount_paid_per_vessel:
+                    max_paid_for_vessel = max_amount_paid_per_vessel[target_vessel.rego_no]
+
+                if not proposal.vessel_ownership in latest_vessel_ownerships:
+                    try:
+                        paid_date = ApprovalHistory.objects.filter(proposal=proposal).first().start_date.date()
+                        fee_constructor_for_aa = FeeConstructor.get_fee_constructor_by_application_type_and_date(annual_admission_type, paid_date)
+                        fee_item = fee_constructor_for_aa.get_fee_item(proposal.vessel_length, proposal.proposal_type, paid_date)
+                        logger.info(f'Proposal: [{proposal}] AA would have cost ${fee_item.get_absolute_amount(proposal.vessel_length)} if paid for')
 
-                        try:
-                            target_vessel = fee_item_application_fee.vessel_details.vessel
-                        except:
-                            logger.warning("Application fee missing vessel details - invoices may require review")
-                            target_vessel = None
-
-                        if proposal.vessel_ownership in latest_vessel_ownerships:
-                            continue
-                        
-                        # Retrieve the current approvals of the target_vessel
-                        if target_vessel:
-                            current_approvals = target_vessel.get_current_approvals(target_date)
-                            logger.info(f'Current approvals for the vessel: [{target_vessel}]: {current_approvals}')
-                        
-                        # This is paid for AA component for a target_vessel, but that vessel is no longer on any permit/licence
-                        # In this case, we can transfer this amount
-                        amount_paid = fee_item_application_fee.amount_paid if fee_item_application_fee.amount_paid else 0
-                        if target_vessel and target_vessel.rego_no and target_vessel.rego_no in max_amount_paid_per_vessel:
-                            full_amount_paid = max_amount_paid_per_vessel[target_vessel.rego_no]
-                        else:
-                            full_amount_paid = amount_paid
+                        deduction_for_zero_payment = fee_item.get_absolute_amount(proposal.vessel_length) - max_paid_for_vessel
+                        logger.info(f'Proposal: Vessel on [{proposal}] was charged ${max_paid_for_vessel}')
 
-                        #factor in discounted payments (subtract difference between cost and paid (deduction-(cost-paid)))
-                        if fee_item_application_fee.fee_item and fee_item_application_fee.fee_item.fee_period and fee_item_application_fee.fee_item.fee_period.start_date:
-                            fee_constructor_for_aa = FeeConstructor.get_fee_constructor_by_application_type_and_date(annual_admission_type, fee_item_application_fee.fee_item.fee_period.start_date)
-                            fee_item = fee_constructor_for_aa.get_fee_item(proposal.vessel_length, proposal.proposal_type, fee_item_application_fee.fee_item.fee_period.start_date)
+                        if deduction_for_zero_payment > 0:
+                            logger.info(f'Proposal: [{proposal}] was deducted ${deduction_for_zero_payment}')
+                            previously_applied_deductions += deduction_for_zero_payment
 
-                            amount_paid_deduction = fee_item.get_absolute_amount(proposal.vessel_length) - full_amount_paid
-                            #only show logs if a) the deduction has been reduced but there is still an amount to apply or b) a prior deduction needs to taken away from a total deduction
-                            if amount_paid_deduction > 0:
-                                logger.info(f'Proposal: [{proposal}] AA would have cost ${fee_item.get_absolute_amount(proposal.vessel_length)} if paid for in full')
-                                logger.info(f'Proposal: [{proposal}] AA had ${amount_paid_deduction} deducted from its cost')
-                                previously_applied_deductions += amount_paid_deduction
+                    except:
+                        logger.warning(f'Unable to determine proposal approval start date - will be unable to determine how much would have been paid for it')
+                
+            #Here a fee item exists. A deduction may have been made for one of three reasons:
+            # - Another vessel ownership is no longer valid
+            # - A valid AA payment is no longer applied
+            # - A vessel increased in size and the former total has been removed
+            # - In the case of the first two items, deductions SHOULD be factored and removed from future deductions
+            # - In the last case, the original payment for the vessel should be factored before any potential former deductions are determined as the "deduction" in those cases have actually been paid for and are still valid
+            # - To do this, we must use the max paid value for the vessel in question, and subtract the payment from expected full amount
+            for fee_item_application_fee in fee_item_application_fees[proposal.id]:
+                
+                # We are interested only in the AnnualAdmission component
+                logger.info(f'FeeItemApplicationFee: [{fee_item_application_fee}] found through the proposal: [{proposal}]')
 
-                        else:
-                            logger.warning(f'Fee Item has no fee period start date - will be unable to determine how much would have been paid for it')
+                try:
+                    target_vessel = fee_item_application_fee.vessel_details.vessel
+                except:
+                    logger.warning("Application fee missing vessel details - invoices may require review")
+                    target_vessel = None
 
-                if proposal.proposal_type.code in [PROPOSAL_TYPE_NEW, PROPOSAL_TYPE_RENEWAL, ]:
-                    # Now, 'prev_application' is the very first application for this season
-                    # We are not interested in any older applications
-                    continue_loop = False
-                    break
+                if proposal.vessel_ownership in latest_vessel_ownerships:
+                    continue
+                
+                # Retrieve the current approvals of the target_vessel
+                if target_vessel:
+                    current_approvals = target_vessel.get_current_approvals(target_date)
+                    logger.info(f'Current approvals for the vessel: [{target_vessel}]: {current_approvals}')
+                
+                # This is paid for AA component for a target_vessel, but that vessel is no longer on any permit/licence
+                # In this case, we can transfer this amount
+                amount_paid = fee_item_application_fee.amount_paid if fee_item_application_fee.amount_paid else 0
+                if target_vessel and target_vessel.rego_no and target_vessel.rego_no in max_amount_paid_per_vessel:
+                    full_amount_paid = max_amount_paid_per_vessel[target_vessel.rego_no]
                 else:
-                    # Assign the previous application, then perform checking above again
-                    proposal = proposal.previous_application
-            else:
-                continue_loop = False
-                break    
+                    full_amount_paid = amount_paid
+
+                #factor in discounted payments (subtract difference between cost and paid (deduction-(cost-paid)))
+                if fee_item_application_fee.fee_item and fee_item_application_fee.fee_item.fee_period and fee_item_application_fee.fee_item.fee_period.start_date:
+                    fee_constructor_for_aa = FeeConstructor.get_fee_constructor_by_application_type_and_date(annual_admission_type, fee_item_application_fee.fee_item.fee_period.start_date)
+                    fee_item = fee_constructor_for_aa.get_fee_item(proposal.vessel_length, proposal.proposal_type, fee_item_application_fee.fee_item.fee_period.start_date)
+
+                    amount_paid_deduction = fee_item.get_absolute_amount(proposal.vessel_length) - full_amount_paid
+                    #only show logs if a) the deduction has been reduced but there is still an amount to apply or b) a prior deduction needs to taken away from a total deduction
+                    if amount_paid_deduction > 0:
+                        logger.info(f'Proposal: [{proposal}] AA would have cost ${fee_item.get_absolute_amount(proposal.vessel_length)} if paid for in full')
+                        logger.info(f'Proposal: [{proposal}] AA had ${amount_paid_deduction} deducted from its cost')
+                        previously_applied_deductions += amount_paid_deduction
 
+                else:
+                    logger.warning(f'Fee Item has no fee period start date - will be unable to determine how much would have been paid for it')
         
         deductions_to_be_factored = valid_deductions - previously_applied_deductions
         logger.info(f"${max_amount_paid} has been paid for this vessel. There are ${valid_deductions} worth of potential deductions on this approval. ${previously_applied_deductions} has already been applied (or specified deductions must be applied again).")
@@ -1252,81 +1205,27 @@ class Proposal(RevisionedMixin):
         return max_amount_paid
 
     def get_amounts_paid_so_far(self, proposal):
-        from mooringlicensing.components.payments_ml.models import FeeItemApplicationFee
-
-        max_amounts_paid = {
-            ApplicationType.objects.get(code=WaitingListApplication.code): Decimal('0.0'),
-            ApplicationType.objects.get(code=AnnualAdmissionApplication.code): Decimal('0.0'),
-            ApplicationType.objects.get(code=AuthorisedUserApplication.code): Decimal('0.0'),
-            ApplicationType.objects.get(code=MooringLicenceApplication.code): Decimal('0.0'),
-        }
-
-        proposal_id_list = []
-        continue_loop = True
+        from mooringlicensing.components.payments_ml.models import PaymentHistory
 
-        while continue_loop:
-            if proposal:
-                if proposal.id in proposal_id_list:
-                    continue_loop = False
-                    break
-                proposal_id_list.append(proposal.id)
+        application_types = ApplicationType.objects.filter(code__in=[
+            WaitingListApplication.code,
+            AnnualAdmissionApplication.code,
+            AuthorisedUserApplication.code,
+            MooringLicenceApplication.code,
+        ])
+        max_amounts_paid = {application_type: Decimal('0.0') for application_type in application_types}
 
-                for fee_item_application_fee in FeeItemApplicationFee.objects.filter(
-                    application_fee__proposal=proposal):
-                        # When not for AAP component
-                        # or for AAP component and fee_item paid is for this vessel
-                        amount_paid = fee_item_application_fee.amount_paid
-                        if amount_paid:
-                            max_amounts_paid[fee_item_application_fee.application_type] += amount_paid
-                if proposal.proposal_type.code in [PROPOSAL_TYPE_NEW, PROPOSAL_TYPE_RENEWAL, ]:
-                    # Now, 'prev_application' is the very first application for this season
-                    # We are not interested in any older applications
-                    continue_loop = False
-                    break
-                else:
-                    # Assign the previous application, then perform checking above again
-                    proposal = proposal.previous_application
-            else:
-                continue_loop = False
-                break
+        # Amounts paid through the proposal and its previous applications back to the first application for this season
+        amounts_paid = PaymentHistory.get_amounts_paid(proposal)
+        for application_type in max_amounts_paid:
+            max_amounts_paid[application_type] += amounts_paid.get(application_type.id, Decimal('0.0'))
         return max_amounts_paid
 
     def get_amounts_paid_so_far_for_aa_through_other_approvals(self, proposal, vessel):
-        from mooringlicensing.components.payments_ml.models import FeeItemApplicationFee
-        annual_admission_type = ApplicationType.objects.get(code=AnnualAdmissionApplication.code)
+        from mooringlicensing.components.payments_ml.models import PaymentHistory
 
-        max_amount_paid = 0
-        proposal_id_list = []
-        continue_loop = True
-
-        while continue_loop:
-            if proposal:
-                if proposal.id in proposal_id_list:
-                    continue_loop = False
-                    break
-                proposal_id_list.append(proposal.id)
-
-                for fee_item_application_fee in FeeItemApplicationFee.objects.filter(
-                    application_fee__proposal=proposal,
-                    fee_item__fee_constructor__application_type=annual_admission_type,
-                    vessel_details__vessel=vessel):
-                    # When not for AAP component
-                    # or for AAP component and fee_item paid is for this vessel
-                    amount_paid = fee_item_application_fee.amount_paid
-                    if amount_paid:
-                        max_amount_paid += amount_paid
-                if proposal.proposal_type.code in [PROPOSAL_TYPE_NEW, PROPOSAL_TYPE_RENEWAL, ]:
-                    # Now, 'prev_application' is the very first application for this season
-                    # We are not interested in any older applications
-                    continue_loop = False
-                    break
-                else:
-                    # Assign the previous application, then perform checking above again
-                    proposal = proposal.previous_application
-            else:
-                continue_loop = False
-                break
-        return max_amount_paid
+        amounts_paid = PaymentHistory.get_amounts_paid(proposal, application_type__code=AnnualAdmissionApplication.code, fee_item_application_fee__vessel_details__vessel=vessel)
+        return sum(amounts_paid.values(), 0)
 
     @property
     def latest_vessel_details(self):
@@ -1336,24 +1235,16 @@ class Proposal(RevisionedMixin):
             return None
 
     def get_invoice_property_cache(self):
-        if len(self.invoice_property_cache) == 0:
-            self.update_invoice_property_cache()
-        return self.invoice_property_cache
-    
+        from mooringlicensing.components.payments_ml.utils import read_invoice_property_cache
+        return read_invoice_property_cache(self, self.invoices_display)
+
     def update_invoice_property_cache(self, save=True):
-        for inv in self.invoices_display():
-            inv_props = get_invoice_properties(inv.id)
-
-            self.invoice_property_cache[inv.id] = {
-                'payment_status': inv_props['data']['invoice']['payment_status'],
-                'reference': inv_props['data']['invoice']['reference'],
-                'amount': inv_props['data']['invoice']['amount'],
-                'settlement_date': inv_props['data']['invoice']['settlement_date'],
-            }
-            
-        if save:
-           self.save()
-        return self.invoice_property_cache
+        from mooringlicensing.components.payments_ml.utils import sync_invoice_property_cache
+        return sync_invoice_property_cache(self, self.invoices_display(), save=save)
+
+    def mark_invoice_property_cache_stale(self):
+        from mooringlicensing.components.payments_ml.utils import mark_invoice_property_cache_stale
+        mark_invoice_property_cache_stale(self, self.invoices_display())
 
     def invoices_display(self):
         invoice_references = [item.invoice_reference for item in self.application_fees.filter(cancelled=False).filter(system_invoice=False)]
@@ -1532,7 +1423,7 @@ class Proposal(RevisionedMixin):
         self.update_customer_status()
         self.rego_no_uppercase()
         if self.pk:
-            self.update_invoice_property_cache(save=False)
+            self.mark_invoice_property_cache_stale()
         super(Proposal, self).save(**kwargs)
         if type(self) == Proposal:
             self.child_obj.refresh_from_db()
@@ -1688,7 +1579,8 @@ class Proposal(RevisionedMixin):
             group = self.__approver_group()
         else:
             group = self.__assessor_group()
-        return True if group and request.user.id in group.get_system_group_member_ids() else False
+        from mooringlicensing.helpers import get_user_group_names
+        return True if group and group.name in get_user_group_names(request.user) else False
 
     @property
     def can_officer_process(self):
@@ -6174,6 +6066,34 @@ class ProposalRequirement(OrderedModel):
     def requirement(self):
         return self.standard_requirement.text if self.standard else self.free_requirement
 
+class ProposalSearchDocument(SearchDocument):
+    proposal = models.OneToOneField(Proposal, on_delete=models.CASCADE, related_name='search_document')
+
+    class Meta:
+        app_label = 'mooringlicensing'
+        indexes = [
+            GinIndex(fields=['people'], name='proposal_search_people_trgm', opclasses=['gin_trgm_ops']),
+            GinIndex(fields=['vessels'], name='proposal_search_vessels_trgm', opclasses=['gin_trgm_ops']),
+        ]
+
+    @classmethod
+    def refresh(cls, proposal_ids):
+        proposals = list(Proposal.objects.filter(id__in=proposal_ids).select_related('proposal_applicant', 'vessel_details__vessel'))
+        system_users = cls.get_system_user_values([proposal.submitter for proposal in proposals])
+
+        documents = {}
+        for proposal in proposals:
+            people = system_users.get(proposal.submitter, [])[:]
+            applicant = getattr(proposal, 'proposal_applicant', None)
+            if applicant:
+                people += cls.person_values(applicant.first_name, applicant.last_name, applicant.email)
+            vessels = [proposal.rego_no]
+            if proposal.vessel_details and proposal.vessel_details.vessel:
+                vessels.append(proposal.vessel_details.vessel.rego_no)
+            documents[proposal.id] = (people, vessels)
+        cls.save_documents('proposal', documents)
+
+
 @receiver(pre_delete, sender=Proposal)
 def delete_documents(sender, instance, *args, **kwargs):
     for document in instance.documents.all():
@@ -32,7 +32,7 @@ from mooringlicensing.components.proposals.models import (
 from mooringlicensing.components.main.models import GlobalSettings, ApplicationType
 from mooringlicensing.ledger_api_utils import retrieve_email_userro
 from mooringlicensing.components.approvals.models import MooringLicence, MooringOnApproval, Approval, VesselOwnershipOnApproval
-from mooringlicensing.components.main.serializers import CommunicationLogEntrySerializer
+from mooringlicensing.components.main.serializers import CommunicationLogEntrySerializer, IdentityResolverMixin, IdentityPrefetchListSerializer
 from mooringlicensing.components.users.serializers import UserSerializer, ProposalApplicantSerializer
 from ledger_api_client.managed_models import SystemUser
 from rest_framework import serializers
@@ -467,7 +467,7 @@ class ListProposalSiteLicenseeMooringRequestSerializer(serializers.ModelSerializ
         return False
 
 
-class ListProposalSerializer(BaseProposalSerializer):
+class ListProposalSerializer(IdentityResolverMixin, BaseProposalSerializer):
     submitter = serializers.SerializerMethodField(read_only=True)
     applicant = serializers.SerializerMethodField(read_only=True)
     processing_status = serializers.SerializerMethodField()
@@ -536,11 +536,18 @@ class ListProposalSerializer(BaseProposalSerializer):
             'invoice_links',
             'mooring_authorisation_preference',
         )
+        list_serializer_class = IdentityPrefetchListSerializer
+
+    def get_identity_ids(self, obj):
+        system_user_ids = [obj.submitter,]
+        if obj.proposal_applicant:
+            system_user_ids.append(obj.proposal_applicant.email_user_id)
+        return system_user_ids, [obj.assigned_officer, obj.assigned_approver,]
 
     def get_submitter(self, obj):
         request = self.context.get("request")
         if obj.submitter and is_internal(request):             
-            user = retrieve_system_user(obj.submitter)
+            user = self.identity_resolver.get_system_user(obj.submitter)
             return UserSerializer(user).data
         else:
             return ""
@@ -548,7 +555,7 @@ class ListProposalSerializer(BaseProposalSerializer):
     def get_applicant(self, obj):
         try:
             if obj.proposal_applicant:
-                user = retrieve_system_user(obj.proposal_applicant.email_user_id)
+                user = self.identity_resolver.get_system_user(obj.proposal_applicant.email_user_id)
                 return UserSerializer(user).data
             else:
                 return ""
@@ -601,12 +608,12 @@ class ListProposalSerializer(BaseProposalSerializer):
 
     def get_assigned_officer(self,obj):
         if obj.assigned_officer:
-            return retrieve_email_userro(obj.assigned_officer).get_full_name() if obj.assigned_officer else ''
+            return self.identity_resolver.get_email_userro(obj.assigned_officer).get_full_name() if obj.assigned_officer else ''
         return None
 
     def get_assigned_approver(self,obj):
         if obj.assigned_approver:
-            return retrieve_email_userro(obj.assigned_approver).get_full_name() if obj.assigned_approver else ''
+            return self.identity_resolver.get_email_userro(obj.assigned_approver).get_full_name() if obj.assigned_approver else ''
         return None
 
     def get_assessor_process(self,obj):
@@ -619,7 +626,7 @@ class ListProposalSerializer(BaseProposalSerializer):
             if obj.assigned_officer:
                 if obj.assigned_officer == user.id:
                     return True
-            elif user in obj.allowed_assessors:
+            elif obj.allowed_assessors_user(request):
                 return True
         return False
 
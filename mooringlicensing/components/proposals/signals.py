@@ -1,7 +1,13 @@
 import logging
 from django.db.models.signals import post_save
 from django.dispatch import receiver
-from mooringlicensing.components.proposals.models import MooringLicenceApplication, Proposal, CompanyOwnership, VesselOwnershipCompanyOwnership
+from mooringlicensing.components.proposals.models import (
+    MooringLicenceApplication, Proposal, CompanyOwnership, VesselOwnershipCompanyOwnership,
+    WaitingListApplication, AnnualAdmissionApplication, AuthorisedUserApplication, ProposalApplicant,
+    Mooring, VesselOwnership,
+)
+from mooringlicensing.components.approvals.utils import refresh_search_documents, refresh_approval_list_summaries
+from mooringlicensing.components.approvals.models import Approval, VesselOwnershipOnApproval
 
 logger = logging.getLogger(__name__)
 
@@ -63,3 +69,52 @@ class ProposalListener(object):
                         voco_approved.status = VesselOwnershipCompanyOwnership.COMPANY_OWNERSHIP_STATUS_OLD
                         voco_approved.save()
                         logger.info(f'Status: [{VesselOwnershipCompanyOwnership.COMPANY_OWNERSHIP_STATUS_OLD}] has been set to the VesselOwnershipCompanyOwnership: [{voco_approved}].')
+
+
+class ProposalSearchDocumentListener(object):
+    """
+    Keep the search documents of the proposal (and the approvals/stickers built from it) up to date
+    """
+    @staticmethod
+    @receiver(post_save, sender=Proposal)
+    @receiver(post_save, sender=WaitingListApplication)
+    @receiver(post_save, sender=AnnualAdmissionApplication)
+    @receiver(post_save, sender=AuthorisedUserApplication)
+    @receiver(post_save, sender=MooringLicenceApplication)
+    def _proposal_post_save(sender, instance, **kwargs):
+        refresh_search_documents(proposal_ids=[instance.id])
+
+    @staticmethod
+    @receiver(post_save, sender=ProposalApplicant)
+    def _proposal_applicant_post_save(sender, instance, **kwargs):
+        if instance.proposal_id:
+            refresh_search_documents(proposal_ids=[instance.proposal_id])
+
+
+class ApprovalListSummaryListener(object):
+    """
+    Keep the approvals dashboard summaries which are built from proposals, moorings and vessel ownerships up to date
+    """
+    @staticmethod
+    @receiver(post_save, sender=Proposal)
+    @receiver(post_save, sender=WaitingListApplication)
+    @receiver(post_save, sender=AnnualAdmissionApplication)
+    @receiver(post_save, sender=AuthorisedUserApplication)
+    @receiver(post_save, sender=MooringLicenceApplication)
+    def _proposal_post_save(sender, instance, **kwargs):
+        # The mooring offered to a waiting list allocation is the allocated mooring of the proposal generated for it
+        approval_ids = list(Approval.objects.filter(current_proposal=instance).values_list('id', flat=True))
+        if instance.waiting_list_allocation_id:
+            approval_ids.append(instance.waiting_list_allocation_id)
+        refresh_approval_list_summaries(approval_ids)
+
+    @staticmethod
+    @receiver(post_save, sender=Mooring)
+    def _mooring_post_save(sender, instance, **kwargs):
+        if instance.mooring_licence_id:
+            refresh_approval_list_summaries([instance.mooring_licence_id])
+
+    @staticmethod
+    @receiver(post_save, sender=VesselOwnership)
+    def _vessel_ownership_post_save(sender, instance, **kwargs):
+        refresh_approval_list_summaries(VesselOwnershipOnApproval.objects.filter(vessel_ownership=instance).values_list('approval_id', flat=True))
@@ -0,0 +1,47 @@
+import logging
+from django.db.models.signals import post_save, post_delete
+from ledger_api_client import managed_models
+from mooringlicensing.helpers import invalidate_group_membership_cache, invalidate_profile_completeness
+from mooringlicensing.components.approvals.utils import refresh_search_documents_for_user
+
+logger = logging.getLogger(__name__)
+
+
+class SystemGroupListener(object):
+
+    @staticmethod
+    def _membership_changed(sender, instance, **kwargs):
+        logger.info(f'SystemGroup membership changed by: [{instance}].  Invalidating the cached group memberships.')
+        invalidate_group_membership_cache()
+
+
+# The membership of a SystemGroup is stored in the SystemGroupPermission when the ledger_api_client provides it
+for model_name in ('SystemGroup', 'SystemGroupPermission',):
+    model = getattr(managed_models, model_name, None)
+    if model:
+        post_save.connect(SystemGroupListener._membership_changed, sender=model, dispatch_uid=f'mooringlicensing_{model_name}_post_save')
+        post_delete.connect(SystemGroupListener._membership_changed, sender=model, dispatch_uid=f'mooringlicensing_{model_name}_post_delete')
+
+
+class SystemUserListener(object):
+
+    @staticmethod
+    def _post_save(sender, instance, **kwargs):
+        # The names and the email of the user are in the search documents of the proposals/approvals submitted by the user
+        refresh_search_documents_for_user(instance.ledger_id_id)
+        invalidate_profile_completeness(instance.ledger_id_id)
+
+
+post_save.connect(SystemUserListener._post_save, sender=managed_models.SystemUser, dispatch_uid='mooringlicensing_SystemUser_post_save')
+
+
+class SystemUserAddressListener(object):
+
+    @staticmethod
+    def _address_changed(sender, instance, **kwargs):
+        if instance.system_user_id:
+            invalidate_profile_completeness(instance.system_user.ledger_id_id)
+
+
+post_save.connect(SystemUserAddressListener._address_changed, sender=managed_models.SystemUserAddress, dispatch_uid='mooringlicensing_SystemUserAddress_post_save')
+post_delete.connect(SystemUserAddressListener._address_changed, sender=managed_models.SystemUserAddress, dispatch_uid='mooringlicensing_SystemUserAddress_post_delete')
@@ -1,11 +1,13 @@
 from mooringlicensing import settings
-from ledger_api_client import utils as ledger_api_utils
+from mooringlicensing.helpers import get_ledger_totals
+from django.utils.functional import SimpleLazyObject
 import hashlib
 
 def mooringlicensing_processor(request):
 
     web_url = request.META.get('HTTP_HOST', None)
-    lt = ledger_api_utils.get_ledger_totals()
+    # Only the staff menus show the ledger totals, so they are looked up when a template uses them
+    lt = SimpleLazyObject(get_ledger_totals)
 
     checkouthash = None
     if 'payment_model' in request.session and 'payment_pk' in request.session:
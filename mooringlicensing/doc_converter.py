@@ -0,0 +1,175 @@
+import atexit
+import importlib.util
+import logging
+import os
+import queue
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# The UNO bindings come from python3-uno, which the venv of the image sees through its system site packages.
+# They are only used by the doc_converter_client run in its own process.
+UNO_AVAILABLE = importlib.util.find_spec('uno') is not None
+DOC_CONVERTER_CLIENT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'doc_converter_client.py')
+
+
+class DocConversionError(Exception):
+    pass
+
+
+class DocConverter(object):
+    """
+    One LibreOffice instance with its own user profile.
+
+    When the UNO bindings are available the instance is kept running in the background, listening on a local pipe, and
+    documents are converted by it without starting LibreOffice again.  Otherwise LibreOffice is started for each
+    conversion, but with this converter's own profile, which is only initialised once and is never shared with another
+    conversion running at the same time.
+
+    Either way the conversion is run in a subprocess with a timeout, which does not block the other greenlets of a
+    gevent worker while waiting.
+    """
+    def __init__(self, index):
+        self.index = index
+        # Both are per process, the worker processes of gunicorn must not share a profile (LibreOffice locks it)
+        self.profile_directory = os.path.join(settings.DOC_CONVERTER_DIRECTORY, 'profile_{}_{}'.format(os.getpid(), index))
+        self.pipe_name = 'mooringlicensing_doc_converter_{}_{}'.format(os.getpid(), index)
+        self.process = None
+
+    @property
+    def profile_url(self):
+        return 'file://' + self.profile_directory
+
+    def start(self):
+        os.makedirs(self.profile_directory, exist_ok=True)
+        self.process = subprocess.Popen(
+            [
+                settings.DOC_CONVERTER_BINARY,
+                '-env:UserInstallation=' + self.profile_url,
+                '--headless', '--invisible', '--nologo', '--norestore', '--nodefault',
+                '--accept=pipe,name={};urp;StarOffice.ComponentContext'.format(self.pipe_name),
+            ],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        logger.info('Document converter {} started (pid: {}).'.format(self.index, self.process.pid))
+
+    def stop(self):
+        if self.process and self.process.poll() is None:
+            self.process.kill()
+            self.process.wait()
+        self.process = None
+
+    def remove_profile(self):
+        shutil.rmtree(self.profile_directory, ignore_errors=True)
+
+    def is_running(self):
+        return self.process is not None and self.process.poll() is None
+
+    def convert(self, source_file, pdf_file, timeout):
+        if UNO_AVAILABLE:
+            self._convert_with_listener(source_file, pdf_file, timeout)
+        else:
+            self._convert_with_command(source_file, pdf_file, timeout)
+        if not os.path.exists(pdf_file):
+            raise DocConversionError('{} has not been converted to pdf.'.format(os.path.basename(source_file)))
+
+    def _convert_with_command(self, source_file, pdf_file, timeout):
+        try:
+            subprocess.run(
+                [
+                    settings.DOC_CONVERTER_BINARY,
+                    '-env:UserInstallation=' + self.profile_url,
+                    '--headless', '--convert-to', 'pdf', '--outdir', os.path.dirname(pdf_file), source_file,
+                ],
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                timeout=timeout,
+            )
+        except subprocess.TimeoutExpired:
+            raise DocConversionError('Converting {} to pdf took more than {} seconds.'.format(os.path.basename(source_file), timeout))
+
+    def _convert_with_listener(self, source_file, pdf_file, timeout):
+        connect_timeout = 0
+        if not self.is_running():
+            self.stop()
+            self.start()
+            connect_timeout = settings.DOC_CONVERTER_STARTUP_TIMEOUT
+
+        try:
+            result = subprocess.run(
+                [sys.executable, DOC_CONVERTER_CLIENT, self.pipe_name, str(connect_timeout), source_file, pdf_file],
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.PIPE,
+                timeout=connect_timeout + timeout,
+            )
+        except subprocess.TimeoutExpired:
+            # LibreOffice can't be interrupted through UNO, therefore kill it.  It is started again for the next conversion.
+            self.stop()
+            raise DocConversionError('Converting {} to pdf took more than {} seconds.'.format(os.path.basename(source_file), timeout))
+        if result.returncode != 0:
+            raise DocConversionError('Converting {} to pdf failed: {}'.format(os.path.basename(source_file), result.stderr.decode(errors='replace').strip()))
+
+
+class DocConverterPool(object):
+    """
+    A fixed number of converters shared by the threads of this process.  A conversion waits in the queue for a free
+    converter, so no more than DOC_CONVERTER_POOL_SIZE conversions run at once.
+    """
+    def __init__(self, size):
+        self._converters = [DocConverter(index) for index in range(size)]
+        self._idle = queue.Queue()
+        for converter in self._converters:
+            self._idle.put(converter)
+
+    def convert_to_pdf_bytes(self, doc, file_name):
+        """
+        Save the docx (a docxtpl.DocxTemplate or python-docx Document) and return the bytes of it converted to pdf.
+        Every conversion uses its own temporary directory.
+        """
+        try:
+            converter = self._idle.get(timeout=settings.DOC_CONVERTER_QUEUE_TIMEOUT)
+        except queue.Empty:
+            raise DocConversionError('No document converter became available within {} seconds.'.format(settings.DOC_CONVERTER_QUEUE_TIMEOUT))
+
+        os.makedirs(settings.DOC_CONVERTER_DIRECTORY, exist_ok=True)
+        working_directory = tempfile.mkdtemp(dir=settings.DOC_CONVERTER_DIRECTORY)
+        try:
+            new_doc_file = os.path.join(working_directory, file_name + '.docx')
+            new_pdf_file = os.path.join(working_directory, file_name + '.pdf')
+            doc.save(new_doc_file)
+            converter.convert(new_doc_file, new_pdf_file, settings.DOC_CONVERTER_TIMEOUT)
+            with open(new_pdf_file, 'rb') as f:
+                return f.read()
+        finally:
+            shutil.rmtree(working_directory, ignore_errors=True)
+            self._idle.put(converter)
+
+    def stop(self):
+        for converter in self._converters:
+            converter.stop()
+            converter.remove_profile()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_doc_converter_pool():
+    # Created on first use so that each (forked) worker process has its own LibreOffice instances
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = DocConverterPool(settings.DOC_CONVERTER_POOL_SIZE)
+            atexit.register(_pool.stop)
+        return _pool
+
+
+def convert_to_pdf_bytes(doc, file_name):
+    return get_doc_converter_pool().convert_to_pdf_bytes(doc, file_name)
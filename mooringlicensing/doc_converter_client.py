@@ -0,0 +1,49 @@
+"""
+Convert a document to pdf through a LibreOffice instance listening on a local pipe.
+
+Run by mooringlicensing.doc_converter in its own process, so that a conversion blocking in UNO can be stopped by the
+timeout of the subprocess without blocking the (gevent) worker which requested it.  Django is not loaded here.
+
+    python doc_converter_client.py <pipe name> <connect timeout> <source file> <pdf file>
+"""
+import sys
+import time
+
+import uno
+
+
+def _property(name, value):
+    prop = uno.createUnoStruct('com.sun.star.beans.PropertyValue')
+    prop.Name = name
+    prop.Value = value
+    return prop
+
+
+def connect(pipe_name, connect_timeout):
+    local_context = uno.getComponentContext()
+    resolver = local_context.ServiceManager.createInstanceWithContext('com.sun.star.bridge.UnoUrlResolver', local_context)
+    deadline = time.monotonic() + connect_timeout
+    while True:
+        try:
+            context = resolver.resolve('uno:pipe,name={};urp;StarOffice.ComponentContext'.format(pipe_name))
+            break
+        except Exception:
+            # LibreOffice may still be starting
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.2)
+    return context.ServiceManager.createInstanceWithContext('com.sun.star.frame.Desktop', context)
+
+
+def convert(pipe_name, connect_timeout, source_file, pdf_file):
+    desktop = connect(pipe_name, connect_timeout)
+    document = desktop.loadComponentFromURL(uno.systemPathToFileUrl(source_file), '_blank', 0, (_property('Hidden', True),))
+    try:
+        document.storeToURL(uno.systemPathToFileUrl(pdf_file), (_property('FilterName', 'writer_pdf_Export'),))
+    finally:
+        document.close(True)
+
+
+if __name__ == '__main__':
+    pipe_name, connect_timeout, source_file, pdf_file = sys.argv[1:]
+    convert(pipe_name, float(connect_timeout), source_file, pdf_file)
@@ -1,8 +1,6 @@
-import os
-
-from django.conf import settings
 from docxtpl import DocxTemplate
 from mooringlicensing.components.main.models import GlobalSettings
+from mooringlicensing.doc_converter import convert_to_pdf_bytes
 
 
 def create_dcv_permit_pdf_bytes(dcv_permit):
@@ -21,24 +19,7 @@ def create_dcv_permit_pdf_bytes(dcv_permit):
         context['p_address_line2'] = '' 
     doc.render(context)
 
-    temp_directory = settings.BASE_DIR + "/tmp/"
-    try:
-        os.stat(temp_directory)
-    except:
-        os.mkdir(temp_directory)
-
-    f_name = temp_directory + 'dcv_permit_' + str(dcv_permit.id)
-    new_doc_file = f_name + '.docx'
-    new_pdf_file = f_name + '.pdf'
-    doc.save(new_doc_file)
-    os.system("libreoffice --headless --convert-to pdf " + new_doc_file + " --outdir " + temp_directory)
-
-    file_contents = None
-    with open(new_pdf_file, 'rb') as f:
-        file_contents = f.read()
-    os.remove(new_doc_file)
-    os.remove(new_pdf_file)
-    return file_contents
+    return convert_to_pdf_bytes(doc, 'dcv_permit_' + str(dcv_permit.id))
 
 
 def create_dcv_admission_pdf_bytes(dcv_admission_arrival):
@@ -54,24 +35,7 @@ def create_dcv_admission_pdf_bytes(dcv_admission_arrival):
     context = dcv_admission_arrival.get_context_for_licence_permit()
     doc.render(context)
 
-    temp_directory = settings.BASE_DIR + "/tmp/"
-    try:
-        os.stat(temp_directory)
-    except:
-        os.mkdir(temp_directory)
-
-    f_name = temp_directory + 'dcv_admission' + str(dcv_admission_arrival.dcv_admission.id)
-    new_doc_file = f_name + '.docx'
-    new_pdf_file = f_name + '.pdf'
-    doc.save(new_doc_file)
-    os.system("libreoffice --headless --convert-to pdf " + new_doc_file + " --outdir " + temp_directory)
-
-    file_contents = None
-    with open(new_pdf_file, 'rb') as f:
-        file_contents = f.read()
-    os.remove(new_doc_file)
-    os.remove(new_pdf_file)
-    return file_contents
+    return convert_to_pdf_bytes(doc, 'dcv_admission' + str(dcv_admission_arrival.dcv_admission.id))
 
 
 def create_authorised_user_summary_doc_bytes(approval):
@@ -89,23 +53,7 @@ def create_authorised_user_summary_doc_bytes(approval):
     context = approval.child_obj.get_context_for_au_summary() if type(approval) == Approval else approval.get_context_for_au_summary()
     doc.render(context)
 
-    temp_directory = settings.BASE_DIR + "/tmp/"
-    try:
-        os.stat(temp_directory)
-    except:
-        os.mkdir(temp_directory)
-
-    f_name = temp_directory + 'approval' + str(approval.id)
-    new_doc_file = f_name + '.docx'
-    new_pdf_file = f_name + '.pdf'
-    doc.save(new_doc_file)
-    os.system("libreoffice --headless --convert-to pdf " + new_doc_file + " --outdir " + temp_directory)
-
-    with open(new_pdf_file, 'rb') as f:
-        file_contents = f.read()
-    os.remove(new_doc_file)
-    os.remove(new_pdf_file)
-    return file_contents
+    return convert_to_pdf_bytes(doc, 'approval' + str(approval.id))
 
 
 def create_approval_doc_bytes(approval):
@@ -127,20 +75,4 @@ def create_approval_doc_bytes(approval):
         context['p_address_line2'] = ''
     doc.render(context)
 
-    temp_directory = settings.BASE_DIR + "/tmp/"
-    try:
-        os.stat(temp_directory)
-    except:
-        os.mkdir(temp_directory)
-
-    f_name = temp_directory + 'approval' + str(approval.id)
-    new_doc_file = f_name + '.docx'
-    new_pdf_file = f_name + '.pdf'
-    doc.save(new_doc_file)
-    os.system("libreoffice --headless --convert-to pdf " + new_doc_file + " --outdir " + temp_directory)
-
-    with open(new_pdf_file, 'rb') as f:
-        file_contents = f.read()
-    os.remove(new_doc_file)
-    os.remove(new_pdf_file)
-    return file_contents
\ No newline at end of file
+    return convert_to_pdf_bytes(doc, 'approval' + str(approval.id))
\ No newline at end of file
@@ -3,7 +3,10 @@ from django.conf import settings
 from django.core.cache import cache
 
 import logging
+import threading
+import time
 import ledger_api_client
+from ledger_api_client import utils as ledger_api_utils
 
 from rest_framework import serializers
 
@@ -11,6 +14,174 @@ from mooringlicensing.components.proposals.models import Proposal
 
 logger = logging.getLogger(__name__)
 
+CACHE_KEY_GROUP_MEMBERSHIP_VERSION = "User-group_membership_version"
+
+
+def get_group_membership_version():
+    version = cache.get(CACHE_KEY_GROUP_MEMBERSHIP_VERSION)
+    if version is None:
+        version = 1
+        cache.set(CACHE_KEY_GROUP_MEMBERSHIP_VERSION, version, None)
+    return version
+
+
+def invalidate_group_membership_cache():
+    """
+    Called when the SystemGroup membership changes.  Bumping the version makes all the cached memberships obsolete.
+    """
+    cache.set(CACHE_KEY_GROUP_MEMBERSHIP_VERSION, get_group_membership_version() + 1, None)
+
+
+def get_user_group_names(user):
+    """
+    Return the names of all the SystemGroups the user is a member of.
+    The result is cached per user (invalidated by invalidate_group_membership_cache())
+    and memoised on the user object, which lives as long as the request.
+    """
+    group_names = getattr(user, '_mooringlicensing_group_names', None)
+    if group_names is not None:
+        return group_names
+
+    cache_key = "User-group_names" + str(user.id) + "version:" + str(get_group_membership_version())
+    group_names = cache.get(cache_key)
+    if group_names is None:
+        system_group_permission = getattr(ledger_api_client.managed_models, 'SystemGroupPermission', None)
+        if system_group_permission:
+            # One query on the membership table instead of the members of every group
+            group_names = set(system_group_permission.objects.filter(
+                emailuser_id=user.id, active=True,
+            ).values_list('system_group__name', flat=True))
+        else:
+            # The ledger_api_client does not provide the membership table
+            group_names = set()
+            for system_group in ledger_api_client.managed_models.SystemGroup.objects.all():
+                if user.id in system_group.get_system_group_member_ids():
+                    group_names.add(system_group.name)
+        cache.set(cache_key, group_names, 3600)
+
+    group_names = frozenset(group_names)
+    try:
+        user._mooringlicensing_group_names = group_names
+    except AttributeError:
+        pass
+    return group_names
+
+
+CACHE_KEY_PROFILE_COMPLETENESS_VERSION = "User-profile_completeness_version"
+SESSION_KEY_PROFILE_COMPLETENESS = "mooringlicensing_profile_completeness"
+
+
+def get_profile_completeness_version(user_id):
+    cache_key = CACHE_KEY_PROFILE_COMPLETENESS_VERSION + str(user_id)
+    version = cache.get(cache_key)
+    if version is None:
+        version = 1
+        cache.set(cache_key, version, None)
+    return version
+
+
+def invalidate_profile_completeness(user_id):
+    """
+    Called when the SystemUser or the addresses of the user are saved.  Bumping the version makes the completeness
+    stored in the sessions of the user obsolete.
+    """
+    cache.set(CACHE_KEY_PROFILE_COMPLETENESS_VERSION + str(user_id), get_profile_completeness_version(user_id) + 1, None)
+
+
+def is_profile_complete(user):
+    """
+    Whether the user has filled in the details asked for on the first time page
+    """
+    from ledger_api_client.managed_models import SystemUser, SystemUserAddress
+
+    system_user = SystemUser.objects.filter(ledger_id=user).first()
+    if (not system_user or
+        not system_user.legal_first_name or
+        not system_user.legal_last_name or
+        not system_user.legal_dob or
+        not system_user.mobile_number
+        ):
+        return False
+
+    address_types = set(SystemUserAddress.objects.filter(system_user=system_user).values_list('address_type', flat=True))
+    return SystemUserAddress.ADDRESS_TYPE[0][0] in address_types and SystemUserAddress.ADDRESS_TYPE[1][0] in address_types
+
+
+def is_profile_complete_for_session(request):
+    """
+    Same as is_profile_complete(), but a complete profile is remembered in the session with the version it was
+    checked at, for up to PROFILE_COMPLETENESS_SESSION_TIMEOUT seconds.  An incomplete profile is checked on every
+    request, because it is completed on the ledger, out of reach of the signals bumping the version.
+    """
+    version = get_profile_completeness_version(request.user.id)
+    checked = request.session.get(SESSION_KEY_PROFILE_COMPLETENESS)
+    if checked and checked.get('version') == version and time.time() - checked.get('checked_at', 0) < settings.PROFILE_COMPLETENESS_SESSION_TIMEOUT:
+        return True
+
+    complete = is_profile_complete(request.user)
+    if complete:
+        request.session[SESSION_KEY_PROFILE_COMPLETENESS] = {'version': version, 'checked_at': time.time()}
+    elif checked:
+        del request.session[SESSION_KEY_PROFILE_COMPLETENESS]
+    return complete
+
+
+CACHE_KEY_LEDGER_TOTALS = "Ledger-totals"
+CACHE_KEY_LEDGER_TOTALS_REFRESHING = "Ledger-totals_refreshing"
+
+
+def refresh_ledger_totals():
+    try:
+        totals = ledger_api_utils.get_ledger_totals()
+        cache.set(CACHE_KEY_LEDGER_TOTALS, {'totals': totals, 'fetched_at': time.time()}, settings.LEDGER_TOTALS_CACHE_TIMEOUT * 10)
+    except Exception as e:
+        logger.warning('Ledger totals could not be fetched: {}'.format(e))
+    finally:
+        cache.delete(CACHE_KEY_LEDGER_TOTALS_REFRESHING)
+
+
+def get_ledger_totals():
+    """
+    Return the ledger totals without waiting for the ledger.  The totals are cached for LEDGER_TOTALS_CACHE_TIMEOUT
+    seconds, after which they are still served while one background thread fetches new ones.  Until the first
+    fetch has finished an empty dict is returned.
+    """
+    cached = cache.get(CACHE_KEY_LEDGER_TOTALS)
+    if cached is None or time.time() - cached['fetched_at'] >= settings.LEDGER_TOTALS_CACHE_TIMEOUT:
+        # Only one process refreshes the totals at a time
+        if cache.add(CACHE_KEY_LEDGER_TOTALS_REFRESHING, True, settings.LEDGER_TOTALS_CACHE_TIMEOUT):
+            threading.Thread(target=refresh_ledger_totals, name='ledger_totals_refresher', daemon=True).start()
+    return cached['totals'] if cached else {}
+
+
+class PermissionContext:
+    """
+    Permissions of the request user resolved once and memoised on the request.
+    """
+    def __init__(self, user):
+        self.user = user
+        self.group_names = get_user_group_names(user) if user.is_authenticated else frozenset()
+
+    def belongs_to(self, group_name):
+        if self.user.is_superuser:
+            return True
+        return group_name in self.group_names
+
+    @property
+    def is_internal(self):
+        return self.user.is_authenticated and any(self.belongs_to(group_name) for group_name in settings.INTERNAL_GROUPS)
+
+
+def get_permission_context(request):
+    # Store the context on the django HttpRequest so that the rest_framework Request wrapping it shares it
+    http_request = getattr(request, '_request', request)
+    permission_context = getattr(http_request, '_mooringlicensing_permission_context', None)
+    if permission_context is None or permission_context.user is not request.user:
+        permission_context = PermissionContext(request.user)
+        http_request._mooringlicensing_permission_context = permission_context
+    return permission_context
+
+
 def belongs_to(user, group_name):
     """
     Check if the user belongs to the given group.
@@ -20,22 +191,7 @@ def belongs_to(user, group_name):
     """
     if user.is_superuser:
         return True
-    
-    belongs_to_value = cache.get(
-        "User-belongs_to" + str(user.id) + "group_name:" + group_name
-    )
-    if belongs_to_value is None:
-        belongs_to_value = False
-        system_group = ledger_api_client.managed_models.SystemGroup.objects.filter(name=group_name)
-        if system_group.exists():
-            if user.id in system_group.first().get_system_group_member_ids():
-                belongs_to_value = True
-            cache.set(
-                "User-belongs_to" + str(user.id) + "group_name:" + group_name,
-                belongs_to_value,
-                3600,
-            )
-    return belongs_to_value
+    return group_name in get_user_group_names(user)
 
 def is_model_backend(request):
     # Return True if user logged in via single sign-on (i.e. an internal)
@@ -46,23 +202,19 @@ def is_email_auth_backend(request):
     return 'EmailAuth' in request.session.get('_auth_user_backend')
 
 def is_system_admin(request):
-    return request.user.is_authenticated and (belongs_to(request.user, settings.GROUP_SYSTEM_ADMIN))
+    return request.user.is_authenticated and (get_permission_context(request).belongs_to(settings.GROUP_SYSTEM_ADMIN))
 
 def is_mooringlicensing_admin(request):
-    return request.user.is_authenticated and (belongs_to(request.user, settings.GROUP_MOORING_LICENSING_ADMIN))
+    return request.user.is_authenticated and (get_permission_context(request).belongs_to(settings.GROUP_MOORING_LICENSING_ADMIN))
 
 def is_account_management_user(request):
-    return request.user.is_authenticated and (belongs_to(request.user, settings.GROUP_ACCOUNT_MANAGEMENT_USER))
+    return request.user.is_authenticated and (get_permission_context(request).belongs_to(settings.GROUP_ACCOUNT_MANAGEMENT_USER))
 
 def is_customer(request):
     return request.user.is_authenticated and (is_model_backend(request) or is_email_auth_backend(request))
 
 def is_internal(request):
-    if request.user.is_authenticated:
-        for i in settings.INTERNAL_GROUPS:
-            if belongs_to(request.user, i):
-                return True
-    return False
+    return get_permission_context(request).is_internal
 
 def is_internal_user(user):
     if user.is_authenticated:
@@ -21,6 +21,73 @@ def retrieve_system_user(email_user_id):
     except Exception as e:
         print(e)
 
+class IdentityResolver:
+    """
+    Resolve SystemUser (by ledger_id) and EmailUserRO (by id) objects for many ids at once.
+    Ids registered with prefetch() are fetched with one query per type, the results are kept
+    so that any serializer sharing the same resolver can look them up without hitting the database.
+    """
+    CONTEXT_KEY = 'identity_resolver'
+
+    def __init__(self):
+        self._system_users = {}
+        self._email_users = {}
+
+    @classmethod
+    def from_context(cls, context):
+        """
+        Return the resolver shared through the serializer context, create one when not there yet.
+        """
+        if context is None:
+            return cls()
+        resolver = context.get(cls.CONTEXT_KEY)
+        if resolver is None:
+            resolver = cls()
+            context[cls.CONTEXT_KEY] = resolver
+        return resolver
+
+    @staticmethod
+    def _clean_ids(ids, resolved):
+        cleaned = set()
+        for id in ids:
+            try:
+                id = int(id)
+            except (TypeError, ValueError):
+                continue
+            if id not in resolved:
+                cleaned.add(id)
+        return cleaned
+
+    def prefetch(self, system_user_ids=(), email_user_ids=()):
+        system_user_ids = self._clean_ids(system_user_ids, self._system_users)
+        if system_user_ids:
+            found = {system_user.ledger_id_id: system_user for system_user in SystemUser.objects.filter(ledger_id__in=system_user_ids)}
+            for id in system_user_ids:
+                self._system_users[id] = found.get(id)
+
+        email_user_ids = self._clean_ids(email_user_ids, self._email_users)
+        if email_user_ids:
+            found = EmailUserRO.objects.in_bulk(list(email_user_ids))
+            for id in email_user_ids:
+                self._email_users[id] = found.get(id)
+
+    def get_system_user(self, email_user_id):
+        if not email_user_id:
+            return None
+        email_user_id = int(email_user_id)
+        if email_user_id not in self._system_users:
+            self._system_users[email_user_id] = retrieve_system_user(email_user_id)
+        return self._system_users[email_user_id]
+
+    def get_email_userro(self, email_user_id):
+        if not email_user_id:
+            return None
+        email_user_id = int(email_user_id)
+        if email_user_id not in self._email_users:
+            self._email_users[email_user_id] = retrieve_email_userro(email_user_id)
+        return self._email_users[email_user_id]
+
+
 def get_invoice_payment_status(invoice_id):
     try:
         inv_props = utils.get_invoice_properties(invoice_id)
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from mooringlicensing.components.approvals.models import Approval, DcvAdmission, DcvPermit, Sticker
+from mooringlicensing.components.main.models import NumberSequence
+
+import logging
+
+logger = logging.getLogger('cron_tasks')
+
+
+class Command(BaseCommand):
+    help = 'Initialise the lodgement number and sticker number sequences from the current maximum numbers'
+
+    def handle(self, *args, **options):
+        logger.info('Running command {}'.format(__name__))
+
+        targets = (
+            (Approval.LODGEMENT_NUMBER_SEQUENCE, Approval.get_max_lodgement_id),
+            (DcvAdmission.LODGEMENT_NUMBER_PREFIX, DcvAdmission.get_max_lodgement_id),
+            (DcvPermit.LODGEMENT_NUMBER_PREFIX, DcvPermit.get_max_lodgement_id),
+            (Sticker.NUMBER_SEQUENCE, Sticker.get_max_number),
+        )
+        for name, get_max_lodgement_id in targets:
+            sequence = NumberSequence.backfill(name, get_max_lodgement_id())
+            logger.info(f'NumberSequence: [{sequence}] has been backfilled.')
+
+        logger.info('Command {} completed'.format(__name__))
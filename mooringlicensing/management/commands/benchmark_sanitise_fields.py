@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+from mooringlicensing.components.main.utils import sanitise_fields, remove_html_tags, remove_script_tags
+from mooringlicensing.components.proposals.models import Vessel
+
+import copy
+import timeit
+
+
+class Command(BaseCommand):
+    help = 'Time sanitise_fields() and the tag removal it is built on, without touching the database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--number', type=int, default=10000, help='Number of calls timed for each case')
+
+    def handle(self, *args, **options):
+        number = options['number']
+        plain_text = 'Mooring 123, Rottnest Island & surrounds ' * 5
+        tagged_text = 'Mooring <b>123</b>, <a href="#" onclick="alert(1)">Rottnest</a> <script src="x.js"></script>'
+        data = {
+            'vessel': {'rego_no': 'AB123', 'vessel_details': {'vessel_name': plain_text, 'vessel_type': 'yacht'}},
+            'moorings': [plain_text, tagged_text, {'name': plain_text}],
+            'comment': tagged_text,
+        }
+        vessel = Vessel(rego_no='AB123')
+
+        cases = [
+            ('remove_html_tags (no tags)', lambda: remove_html_tags(plain_text)),
+            ('remove_html_tags (tags)', lambda: remove_html_tags(tagged_text)),
+            ('remove_script_tags (no tags)', lambda: remove_script_tags(plain_text)),
+            ('remove_script_tags (tags)', lambda: remove_script_tags(tagged_text)),
+            ('sanitise_fields (nested dict)', lambda: sanitise_fields(copy.deepcopy(data))),
+            ('sanitise_fields (model, all fields)', lambda: sanitise_fields(vessel)),
+            ('sanitise_fields (model, one field)', lambda: sanitise_fields(vessel, fields=['rego_no'])),
+        ]
+        for name, func in cases:
+            seconds = timeit.timeit(func, number=number)
+            self.stdout.write('{:<40} {:>10.2f} us/call'.format(name, seconds / number * 1000000))
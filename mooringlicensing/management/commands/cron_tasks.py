@@ -1,8 +1,13 @@
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from django.core.management import call_command
 from django.core.management.base import BaseCommand
 from django.conf import settings
 from django.core.mail import EmailMultiAlternatives
+from django.db import connections
+from django.utils.html import escape
 from pathlib import Path
-import subprocess
+import contextvars
+import time
 import logging
 
 from mooringlicensing.settings import CRON_EMAIL_FILE_NAME
@@ -11,10 +16,74 @@ logger = logging.getLogger('cron_tasks')
 cron_email = logging.getLogger('cron_email')
 LOGFILE = 'logs/' + CRON_EMAIL_FILE_NAME  # This file is used temporarily.  It's cleared whenever this cron starts, then at the end the contents of this file is emailed.
 
+# (command name, commands it runs after, commands it needs to have succeeded)
+# Commands in different chains touch different records and run in parallel.  Within a chain the order is the same as
+# it was when every command was run one after another, and a command still runs when the one before it has failed.
+# It is skipped only when a command it needs the data of has not succeeded.
+TASKS = [
+    # For Compliances
+    ('update_compliance_status', [], []),  # 1. Update status
+    ('send_compliance_reminder', [], ['update_compliance_status']),  # 2. Send notification for the compliances made due/overdue above
+
+    # For Approvals
+    ('send_vessel_nominate_reminder', [], []),
+    ('cancel_approvals_due_to_no_vessels_nominated', ['send_vessel_nominate_reminder'], []),
+    ('expire_mooring_licence_application_due_to_no_documents', ['cancel_approvals_due_to_no_vessels_nominated'], []),
+    ('expire_mooring_licence_application_due_to_no_submit', ['expire_mooring_licence_application_due_to_no_documents'], []),
+    ('update_approval_status', ['expire_mooring_licence_application_due_to_no_submit'], []),
+    ('approval_renewal_notices', ['update_approval_status'], []),
+    ('send_mooring_licence_application_submit_due_reminder', ['update_approval_status'], []),
+
+    # For Proposals
+    ('send_endorser_reminder', [], []),
+    ('check_proposal_endorsements', ['send_endorser_reminder'], []),
+    ('expire_application_due_to_no_payment', ['check_proposal_endorsements'], []),
+    ('send_application_payment_due_reminder', ['expire_application_due_to_no_payment'], []),
+
+    # For DCV
+    ('remove_unpaid_dcv_submissions', [], []),
+    ('expire_dcv_permits_out_of_season', ['remove_unpaid_dcv_submissions'], []),
+]
+
+STATUS_SUCCEEDED = 'succeeded'
+STATUS_FAILED = 'failed'
+STATUS_SKIPPED = 'skipped'
+
+
+class CronEmailCapture(logging.Filter):
+    """
+    Holds back the cron email records logged by each task while it runs, so that the email shows the output of
+    the tasks one after another instead of interleaved.
+
+    The buffer of a task is held in a context variable set by the task, not keyed on the thread: the threads of the
+    pool are reused, and the records are written out later from the main thread.
+    """
+    def __init__(self):
+        super().__init__()
+        self._buffer = contextvars.ContextVar('cron_email_buffer', default=None)
+
+    def start(self):
+        return self._buffer.set([])
+
+    def stop(self, token):
+        records = self._buffer.get()
+        self._buffer.reset(token)
+        return records or []
+
+    def filter(self, record):
+        buffer = self._buffer.get()
+        if buffer is None:
+            return True
+        buffer.append(record)
+        return False
+
 
 class Command(BaseCommand):
     help = 'Run Mooring Licensing Cron tasks'
 
+    def add_arguments(self, parser):
+        parser.add_argument('--max-workers', type=int, default=settings.CRON_TASKS_MAX_WORKERS, help='Number of tasks which can run at the same time')
+
     def handle(self, *args, **options):
         # Empty the cron email log file because this file is used only for the contents of the nightly cron email
         # We don't want to accumulate the contents
@@ -24,34 +93,85 @@ class Command(BaseCommand):
         cron_email.info('<div><strong>Running command: {}</strong></div>'.format(__name__))
         cron_email.info('<div style="margin-left: 1em;">')
 
-        # For Compliances
-        subprocess.call('python manage_ml.py update_compliance_status', shell=True)  # 1. Update status
-        subprocess.call('python manage_ml.py send_compliance_reminder', shell=True)  # 2. Send notification
-
-        # For the others
-        subprocess.call('python manage_ml.py send_endorser_reminder', shell=True)
-        subprocess.call('python manage_ml.py send_vessel_nominate_reminder', shell=True)
-        subprocess.call('python manage_ml.py cancel_approvals_due_to_no_vessels_nominated', shell=True)
-        subprocess.call('python manage_ml.py expire_mooring_licence_application_due_to_no_documents', shell=True)
-        subprocess.call('python manage_ml.py expire_mooring_licence_application_due_to_no_submit', shell=True)
-        subprocess.call('python manage_ml.py update_approval_status', shell=True)
-        subprocess.call('python manage_ml.py approval_renewal_notices', shell=True)
-        #subprocess.call('python manage_ml.py import_mooring_bookings_data', shell=True)
-        #subprocess.call('python manage_ml.py export_and_email_sticker_data', shell=True)
-        #subprocess.call('python manage_ml.py import_sticker_data', shell=True)
-        subprocess.call('python manage_ml.py send_mooring_licence_application_submit_due_reminder', shell=True)
-        subprocess.call('python manage_ml.py remove_unpaid_dcv_submissions', shell=True)
-        subprocess.call('python manage_ml.py expire_dcv_permits_out_of_season', shell=True)
-        subprocess.call('python manage_ml.py check_proposal_endorsements', shell=True)
-        subprocess.call('python manage_ml.py expire_application_due_to_no_payment', shell=True)
-        subprocess.call('python manage_ml.py send_application_payment_due_reminder', shell=True)
+        capture = CronEmailCapture()
+        cron_email.addFilter(capture)
+        try:
+            results = self.run_tasks(capture, max(options['max_workers'], 1))
+        finally:
+            cron_email.removeFilter(capture)
 
-        logger.info('===== Completed command: {} ====='.format(__name__))
         cron_email.info('</div>')
+        self.log_summary(results)
+        logger.info('===== Completed command: {} ====='.format(__name__))
         cron_email.info('<div><strong>Completed command: {}</strong></div>'.format(__name__))
 
         self.send_email()
 
+    def run_tasks(self, capture, max_workers):
+        """
+        Run every task once the tasks it runs after and the tasks it needs have finished.  A failing task is
+        recorded and only the tasks which need it are skipped, while the rest carry on.
+        """
+        results = {}
+        pending = list(TASKS)
+        running = {}
+
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='cron_task') as executor:
+            while pending or running:
+                for task in list(pending):
+                    name, run_after, requires = task
+                    if any(results.get(required, {}).get('status') in (STATUS_FAILED, STATUS_SKIPPED) for required in requires):
+                        pending.remove(task)
+                        results[name] = {'status': STATUS_SKIPPED, 'seconds': 0, 'error': 'A task it needs did not succeed'}
+                        logger.warning(f'Cron task: [{name}] skipped because a task it needs did not succeed.')
+                    elif all(previous in results for previous in run_after + requires):
+                        pending.remove(task)
+                        # Each task runs in a context of its own, see CronEmailCapture
+                        running[executor.submit(contextvars.Context().run, self.run_task, capture, name)] = name
+
+                if not running:
+                    # Nothing left which can start
+                    for name, run_after, requires in pending:
+                        results[name] = {'status': STATUS_SKIPPED, 'seconds': 0, 'error': 'Unknown dependency'}
+                    break
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    result, records = future.result()
+                    results[name] = result
+                    # Write the output of the task to the cron email in one block
+                    for record in records:
+                        cron_email.handle(record)
+        return results
+
+    def run_task(self, capture, name):
+        token = capture.start()
+        started = time.monotonic()
+        try:
+            logger.info(f'Cron task: [{name}] started.')
+            call_command(name)
+            result = {'status': STATUS_SUCCEEDED, 'error': ''}
+            logger.info(f'Cron task: [{name}] completed.')
+        except (Exception, SystemExit) as e:
+            # A command calling sys.exit() fails on its own without stopping the other tasks and the email
+            result = {'status': STATUS_FAILED, 'error': str(e) if isinstance(e, Exception) else f'Exited with the code: [{e.code}]'}
+            logger.exception(f'Cron task: [{name}] failed.')
+        finally:
+            # Each thread opens its own database connection
+            connections.close_all()
+        result['seconds'] = time.monotonic() - started
+        return result, capture.stop(token)
+
+    def log_summary(self, results):
+        rows = ''
+        for name, run_after, requires in TASKS:
+            result = results[name]
+            logger.info(f'Cron task: [{name}] {result["status"]} in {result["seconds"]:.1f}s. {result["error"]}')
+            rows += '<tr><td>{}</td><td>{}</td><td style="text-align: right;">{:.1f}</td><td>{}</td></tr>'.format(name, result['status'], result['seconds'], escape(result['error']))
+        cron_email.info('<div><strong>Summary</strong></div>')
+        cron_email.info('<table style="margin-left: 1em;"><tr><th>Task</th><th>Status</th><th>Seconds</th><th>Error</th></tr>{}</table>'.format(rows))
+
     def send_email(self):
         email_instance = settings.EMAIL_INSTANCE
         contents_of_cron_email = Path(LOGFILE).read_text()
@@ -1,6 +1,6 @@
 from django.core.management.base import BaseCommand
-from mooringlicensing.components.main.utils import export_to_mooring_booking
-from mooringlicensing.components.approvals.models import Approval
+from mooringlicensing.components.main.utils import enqueue_mooring_bookings_exports, dispatch_mooring_bookings_exports
+from mooringlicensing.components.approvals.models import Approval, MooringBookingsExport
 
 import logging
 logger = logging.getLogger(__name__)
@@ -9,18 +9,29 @@ logger = logging.getLogger(__name__)
 class Command(BaseCommand):
     help = 'Export to Mooring Bookings VesselLicence'
 
+    def add_arguments(self, parser):
+        parser.add_argument('--max-batches', type=int, default=10, help='Number of batches sent in this run')
+
     def handle(self, *args, **options):
-        approvals_to_export = Approval.objects.filter(export_to_mooring_booking=True)
-        if approvals_to_export:
-            errors = []
-            updates = []
-            updates.append('Approvals remaining to export: {}'.format(str(Approval.objects.filter(export_to_mooring_booking=True).count())))
-            approvals_to_process = approvals_to_export[:30]
-            for approval in approvals_to_process:
-                approval_errors, approval_updates = export_to_mooring_booking(approval.id)
-                errors.extend(approval_errors)
-                updates.extend(approval_updates)
-            updates.append('Approvals remaining to export: {}'.format(str(Approval.objects.filter(export_to_mooring_booking=True).count())))
+        errors = []
+        updates = []
+
+        # Move the approvals flagged by the workflows into the outbox
+        approval_ids = list(Approval.objects.filter(export_to_mooring_booking=True).values_list('id', flat=True))
+        num_of_queued = enqueue_mooring_bookings_exports(approval_ids)
+        updates.append('Approvals queued: {}, updates queued: {}'.format(len(approval_ids), num_of_queued))
+
+        for i in range(options['max_batches']):
+            batch_errors, batch_updates = dispatch_mooring_bookings_exports()
+            if not batch_errors and not batch_updates:
+                # Nothing due
+                break
+            errors.extend(batch_errors)
+            updates.extend(batch_updates)
+        updates.append('Updates remaining to export: {}'.format(MooringBookingsExport.objects.filter(status=MooringBookingsExport.STATUS_PENDING).count()))
+        updates.append('Updates failed: {}'.format(MooringBookingsExport.objects.filter(status=MooringBookingsExport.STATUS_FAILED).count()))
+
+        if approval_ids or errors or len(updates) > 3:
             # write email
             cmd_name = __name__.split('.')[-1].replace('_', ' ').upper()
             err_str = '<strong style="color: red;">Errors: {}</strong>'.format(len(errors)) if len(errors)>0 else '<strong style="color: green;">Errors: 0</strong>'
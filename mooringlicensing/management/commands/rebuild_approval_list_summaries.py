@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from mooringlicensing.components.approvals.models import Approval, ApprovalListSummary
+
+import logging
+
+logger = logging.getLogger('cron_tasks')
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the sticker and mooring summaries shown on the approvals dashboard'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=200, help='Number of approvals rebuilt in one go')
+        parser.add_argument('--missing-only', action='store_true', help='Only build the summaries of the approvals which do not have one yet')
+
+    def handle(self, *args, **options):
+        logger.info('Running command {}'.format(__name__))
+        batch_size = options['batch_size']
+
+        approvals = Approval.objects.order_by('id')
+        if options['missing_only']:
+            approvals = approvals.filter(list_summary__isnull=True)
+        approval_ids = list(approvals.values_list('id', flat=True))
+        for i in range(0, len(approval_ids), batch_size):
+            ApprovalListSummary.refresh(approval_ids[i:i + batch_size])
+
+        logger.info('Command {} completed.  {} approval summary(ies) rebuilt.'.format(__name__, len(approval_ids)))
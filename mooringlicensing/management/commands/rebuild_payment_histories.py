@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from mooringlicensing.components.payments_ml.models import FeeItemApplicationFee, PaymentChain, PaymentHistory
+from mooringlicensing.components.proposals.models import Proposal
+
+import logging
+
+logger = logging.getLogger('cron_tasks')
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the payment chains of the proposals and the payment histories of the fees paid for them'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Number of fee items rebuilt in one go')
+
+    def handle(self, *args, **options):
+        logger.info('Running command {}'.format(__name__))
+        batch_size = options['batch_size']
+
+        # Oldest first, so that each chain is built on top of the chain of its previous application
+        proposals = Proposal.objects.order_by('id')
+        for proposal in proposals.iterator(chunk_size=batch_size):
+            PaymentChain.refresh(proposal)
+
+        fee_item_application_fee_ids = list(FeeItemApplicationFee.objects.order_by('id').values_list('id', flat=True))
+        for i in range(0, len(fee_item_application_fee_ids), batch_size):
+            PaymentHistory.refresh(fee_item_application_fee_ids[i:i + batch_size])
+
+        logger.info('Command {} completed.  {} payment history(ies) rebuilt.'.format(__name__, len(fee_item_application_fee_ids)))
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from mooringlicensing.components.proposals.models import Proposal, ProposalSearchDocument
+from mooringlicensing.components.approvals.models import Approval, Sticker, ApprovalSearchDocument, StickerSearchDocument
+
+import logging
+
+logger = logging.getLogger('cron_tasks')
+
+
+class Command(BaseCommand):
+    help = 'Build the search documents of all the proposals, approvals and stickers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Number of records built in one go')
+
+    def handle(self, *args, **options):
+        logger.info('Running command {}'.format(__name__))
+        batch_size = options['batch_size']
+
+        for model, document_class in ((Proposal, ProposalSearchDocument), (Approval, ApprovalSearchDocument), (Sticker, StickerSearchDocument),):
+            ids = list(model.objects.order_by('id').values_list('id', flat=True))
+            for i in range(0, len(ids), batch_size):
+                document_class.refresh(ids[i:i + batch_size])
+            logger.info('{} search document(s) of {} built.'.format(len(ids), model.__name__))
+
+        logger.info('Command {} completed.'.format(__name__))
@@ -1,4 +1,5 @@
 from django.core.management.base import BaseCommand
+from django.utils import timezone
 
 from mooringlicensing.components.proposals.models import (
     Proposal
@@ -25,6 +26,8 @@ from mooringlicensing.management.commands.utils import (
     get_stickers_missing_vessel,
     get_approval_moas_with_conflicting_active_end_date,
     get_expired_approvals_with_active_moas,
+    run_record_issue_checks,
+    record_issue_findings,
 )
 
 from mooringlicensing import settings
@@ -50,6 +53,8 @@ class Command(BaseCommand):
     Usage of this script should be only running without date filters sparingly (no more than weekly, for example), running with a from date filter regularly, and running with a to date filter on a case by case basis.
     
     Not all records can be filtered using date values and using date values may exclude some records related to one another that may be involved in a date conflict.
+
+    The checks run in parallel, and their findings are kept with the time they were first and last found. Only a run without date filters resolves the findings no longer found.
     """
     help = 'Report for issues in records such as incorrect record status and duplicate records. A from date and to date can be provided to narrow down a search but may exclude some potential findings.'
 
@@ -126,20 +131,18 @@ class Command(BaseCommand):
             get_expired_approvals_with_active_moas: [examination_querysets[Approval]],
         }
 
-        reports = []
-
         #run examination functions
-        for examination_function, examination_querysets in examination_functions.items():
-            if examination_querysets:
-                reports.append(examination_function(*examination_functions[examination_function]))
-            else:
-                reports.append(examination_function())
+        check_reports = run_record_issue_checks(examination_functions, settings.RECORD_ISSUES_REPORT_MAX_WORKERS)
+        check_results = record_issue_findings(check_reports, full_run=not from_date and not to_date)
+
+        #format: (title, [(finding, first seen)], number of new findings, number of resolved findings)
+        reports = [(check_reports[check_name][0],) + check_results[check_name] for check_name in check_reports]
 
         for report in reports:
-            if report and len(report)>1 and report[1]:
-                print(f"\n{report[0]}")
-                for number in report[1]:
-                    print(number)
+            if report[1]:
+                print(f"\n{report[0]} (new: {report[2]})")
+                for number, first_seen in report[1]:
+                    print(f"{number} (first seen: {timezone.localtime(first_seen):%d/%m/%Y})")
 
         if reports:
             #email to group
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from mooringlicensing.components.payments_ml.models import InvoicePropertyCache
+from mooringlicensing.components.payments_ml.utils import refresh_invoice_properties
+
+import logging
+
+logger = logging.getLogger('cron_tasks')
+
+
+class Command(BaseCommand):
+    help = 'Refresh the invoice properties flagged as stale from the ledger in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Refresh all the cached invoice properties, not only the stale ones')
+
+    def handle(self, *args, **options):
+        logger.info('Running command {}'.format(__name__))
+
+        caches = InvoicePropertyCache.objects.all() if options['all'] else InvoicePropertyCache.objects.filter(stale=True)
+        invoice_ids = list(caches.values_list('invoice_id', flat=True))
+        refreshed = refresh_invoice_properties(invoice_ids)
+
+        logger.info('Command {} completed.  {} of {} invoice(s) refreshed.'.format(__name__, len(refreshed), len(invoice_ids)))
@@ -1,36 +1,23 @@
 from django.core.management.base import BaseCommand
 from mooringlicensing.components.main.models import JobQueue
-from django.core import management
-from datetime import datetime
 from mooringlicensing.settings import NUMBER_OF_QUEUE_JOBS
-import json
+import socket
+import os
 
 class Command(BaseCommand):
     def handle(self, *args, **options):
-        #get n number of jobs at top of queue
-        job_queue = JobQueue.objects.filter(status=0)[:NUMBER_OF_QUEUE_JOBS]
+        #get n number of jobs at top of queue, jobs claimed by another run are skipped
+        JobQueue.requeue_stale_jobs()
+        worker = f'{socket.gethostname()}:{os.getpid()}'
 
-        for jq in job_queue:
-            #set to running
-            jq.status = 1
-            jq.save()
-            #run job (catch errors)
-            try:
-                parameters = json.dumps(jq.parameters_json)           
-            except Exception as e:
-                jq.status = 3
-                jq.save()
-                print(e)
-                continue
-
-            #set to complete or error
-            try:     
-                management.call_command(jq.job_cmd, parameters, jq.user)
-                print("Job Completed {}".format(str(jq.id)))                
-                jq.processed_dt = datetime.now()
-                jq.status = 2
-                jq.save()
-            except Exception as e:                
-                print("run_queue_job error",e)
-                jq.status = 3
-                jq.save()
\ No newline at end of file
+        for i in range(NUMBER_OF_QUEUE_JOBS):
+            # Claim one job at a time so that the jobs waiting behind a slow one can be picked up by the other workers
+            job_queue = JobQueue.claim_pending_jobs(worker, 1)
+            if not job_queue:
+                break
+            jq = job_queue[0]
+            #run job (catch errors), set to complete or error
+            if jq.run():
+                print("Job Completed {}".format(str(jq.id)))
+            else:
+                print("run_queue_job error", jq.error)
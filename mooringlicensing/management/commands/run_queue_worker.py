@@ -0,0 +1,100 @@
+from django.core.management.base import BaseCommand
+from django.db import connections
+from mooringlicensing import settings
+from mooringlicensing.components.main.models import JobQueue
+import multiprocessing
+import socket
+import signal
+import time
+import os
+
+import logging
+
+logger = logging.getLogger('cron_tasks')
+
+
+# Seconds given to a job process to exit once terminated, before it is killed
+TERMINATE_GRACE_PERIOD = 10
+
+
+def run_job(job_id):
+    # The signal handlers of the worker are inherited from the parent process, restore the default ones so that
+    # terminate() stops the job
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    # Do not share the database connections of the parent process
+    connections.close_all()
+    job = JobQueue.objects.get(id=job_id)
+    logger.info(f'Running JobQueue: [{job.id}] {job.job_cmd}...')
+    if job.run():
+        logger.info(f'JobQueue: [{job.id}] completed.')
+    else:
+        logger.error(f'JobQueue: [{job.id}] failed: {job.error}')
+
+
+class Command(BaseCommand):
+    help = 'Long running worker claiming the JobQueue jobs and running them in a pool of processes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=settings.JOB_QUEUE_WORKER_PROCESSES, help='Number of jobs run at the same time')
+        parser.add_argument('--poll-interval', type=int, default=settings.JOB_QUEUE_POLL_INTERVAL, help='Seconds between two polls of the queue')
+        parser.add_argument('--timeout', type=int, default=settings.JOB_QUEUE_JOB_TIMEOUT, help='Seconds after which a running job is terminated')
+        parser.add_argument('--once', action='store_true', help='Exit once the queue is empty and all the jobs have finished')
+
+    def handle(self, *args, **options):
+        self.worker_name = f'{socket.gethostname()}:{os.getpid()}'
+        self.stopping = False
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        processes = max(options['processes'], 1)
+        running = {}  # {job_id: (process, started)}
+        logger.info(f'JobQueue worker: [{self.worker_name}] started with {processes} process(es).')
+
+        while True:
+            self.collect_finished_jobs(running, options['timeout'])
+
+            if self.stopping:
+                if not running:
+                    break
+            else:
+                JobQueue.requeue_stale_jobs()
+                for job in JobQueue.claim_pending_jobs(self.worker_name, processes - len(running)):
+                    # Close the connections before forking, the child process opens its own one
+                    connections.close_all()
+                    process = multiprocessing.Process(target=run_job, args=(job.id,), name=f'JobQueue-{job.id}')
+                    process.start()
+                    running[job.id] = (process, time.monotonic())
+
+            if not running and options['once']:
+                break
+
+            time.sleep(options['poll_interval'])
+
+        logger.info(f'JobQueue worker: [{self.worker_name}] stopped.')
+
+    def stop(self, signum, frame):
+        logger.info(f'JobQueue worker: [{self.worker_name}] received signal: [{signum}], waiting for the running jobs to finish...')
+        self.stopping = True
+
+    def collect_finished_jobs(self, running, timeout):
+        for job_id, (process, started) in list(running.items()):
+            if process.is_alive():
+                if time.monotonic() - started < timeout:
+                    continue
+                process.terminate()
+                process.join(TERMINATE_GRACE_PERIOD)
+                if process.is_alive():
+                    process.kill()
+                    process.join(TERMINATE_GRACE_PERIOD)
+                error = f'Terminated after running for more than {timeout} seconds.'
+            else:
+                process.join()
+                error = f'Worker process exited with the code: [{process.exitcode}].'
+
+            del running[job_id]
+            job = JobQueue.objects.get(id=job_id)
+            if job.status == JobQueue.STATUS_RUNNING:
+                # The process did not record the result of the job
+                logger.error(f'JobQueue: [{job.id}] {error}')
+                job.record_failure(error)
@@ -1,11 +1,17 @@
 from django.core.management.base import BaseCommand
-from mooringlicensing.components.main.utils import reorder_wla
+from mooringlicensing.components.main.utils import reorder_wlas
 from mooringlicensing.components.proposals.models import MooringBay
 
+import logging
+
+logger = logging.getLogger('cron_tasks')
+
+
 class Command(BaseCommand):
     def handle(self, *args, **options):
        
         active_bays = MooringBay.objects.filter(active=True)
-        #iterate through bays, run reorder
-        for bay in active_bays:
-            reorder_wla(bay)
\ No newline at end of file
+        # One check for all the bays, the bays whose positions are in sequence are left alone
+        num_of_updates = reorder_wlas(active_bays)
+        if num_of_updates:
+            logger.info(f'{num_of_updates} waiting list allocation position(s) updated.')
@@ -2,9 +2,10 @@ from django.core.management.base import BaseCommand
 from django.db import transaction
 from django.utils import timezone
 from datetime import timedelta
-from django.db.models import Q
+from django.db.models import F
 from django.conf import settings
 from mooringlicensing.components.compliances.models import Compliance, ComplianceUserAction
+from mooringlicensing.components.compliances.utils import get_compliance_reminder_candidates
 from mooringlicensing.components.main.models import NumberOfDaysType, NumberOfDaysSetting
 from django.core.exceptions import ImproperlyConfigured
 from mooringlicensing.settings import CODE_DAYS_FOR_FIRST_REMINDER, CODE_DAYS_FOR_SECOND_REMINDER, CODE_DAYS_FOR_FINAL_REMINDER, CODE_DAYS_FOR_SUBMIT_DOCUMENTS_MLA
@@ -52,23 +53,15 @@ class Command(BaseCommand):
         due_date_second = today + timedelta(days=days_second_reminder) 
         due_date_final = today + timedelta(days=days_final_reminder)
         
-        queries = Q()
-        queries &= Q(processing_status = Compliance.PROCESSING_STATUS_DUE)
-        queries &= (Q(due_date=due_date_first) | Q(due_date=due_date_second) | Q(due_date=due_date_final))
-        compliance_due_reminder = Compliance.objects.filter(queries)
+        compliance_due_reminder, compliance_overdue_reminder = get_compliance_reminder_candidates([due_date_first, due_date_second, due_date_final])
 
-        queries = Q()
-        queries &= Q(processing_status = Compliance.PROCESSING_STATUS_OVERDUE)
-        queries &= Q(post_reminder_sent = False)
-        compliance_overdue_reminder = Compliance.objects.filter(queries)
-                
         for c in compliance_due_reminder:
             with transaction.atomic():
                 try:
                     send_due_email_notification(c)
                     send_internal_due_email_notification(c)
-                    c.due_reminder_count+=1
-                    c.save()
+                    # The counter only, without a revision of the whole compliance
+                    Compliance.objects.filter(id=c.id).update(due_reminder_count=F('due_reminder_count') + 1)
                     updates.append(c.lodgement_number)
                     logger.info('Reminder sent for due compliance {}'.format(c.lodgement_number))
                     ComplianceUserAction.log_action(c, ComplianceUserAction.ACTION_REMINDER_SENT.format(c.id),user=None)
@@ -83,8 +76,7 @@ class Command(BaseCommand):
                 try:
                     send_reminder_email_notification(c)
                     send_internal_reminder_email_notification(c)
-                    c.post_reminder_sent = True
-                    c.save()
+                    Compliance.objects.filter(id=c.id).update(post_reminder_sent=True)
                     updates.append(c.lodgement_number)
                     ComplianceUserAction.log_action(c, ComplianceUserAction.ACTION_OVERDUE_REMINDER_SENT.format(c.id),user=None)
                     logger.info('Post due date reminder sent for Compliance {} '.format(c.lodgement_number))
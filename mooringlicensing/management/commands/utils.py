@@ -1,11 +1,16 @@
-from django.db.models import F, CharField, Q, Value
-from django.db.models.functions import Cast, Concat
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import connections, transaction
+from django.db.models import F, Q, Value, Case, When, DateField, Exists, OuterRef, Func
+from django.db.models.fields.json import KeyTextTransform
+from django.db.models.functions import Concat
+from django.utils import timezone
 
 from ledger_api_client.settings_base import TIME_ZONE
 from ledger_api_client.utils import get_invoice_properties
 from ledger_api_client.ledger_models import Invoice
 
-from mooringlicensing.components.main.models import GlobalSettings
+from mooringlicensing.components.main.models import GlobalSettings, RecordIssue
 
 from mooringlicensing.components.approvals.models import (
     Approval, Sticker, MooringOnApproval
@@ -21,6 +26,9 @@ from mooringlicensing.components.payments_ml.models import (
 
 import pytz
 import datetime
+import logging
+
+logger = logging.getLogger('cron_tasks')
 
 def get_expired_approvals_with_active_moas(approvals):
     
@@ -109,6 +117,37 @@ def get_invalid_stickers_still_current(stickers):
 
     return ("Stickers with invalid current status (due to being replaced, duplicated, or otherwise invalidated). Some numbers may appear in \"Stickers that are not properly assigned to Mooring on Approval records\":", bad_sticker_numbers)
 
+def get_latest_applied_seasons(approvals):
+    """
+    Return {approval id: (end date, name)} of the latest applied season of the approvals (see
+    Approval.latest_applied_season), with two queries instead of several per approval
+    """
+    approved_statuses = [Proposal.PROCESSING_STATUS_APPROVED, Proposal.PROCESSING_STATUS_PRINTING_STICKER]
+    approval_ids = approvals.values('id')
+
+    #seasons of the fee items paid
+    seasons = list(FeeItemApplicationFee.objects.filter(
+        application_fee__cancelled=False,
+        application_fee__proposal__approval_id__in=approval_ids,
+        application_fee__proposal__processing_status__in=approved_statuses,
+    ).values_list('application_fee__proposal__approval_id', 'fee_item__fee_period__fee_season__end_date', 'fee_item__fee_period__fee_season__name'))
+
+    #seasons of the proposals without any fee items
+    active_application_fees = ApplicationFee.objects.filter(proposal=OuterRef('pk'), cancelled=False)
+    seasons += list(Proposal.objects.filter(
+        approval_id__in=approval_ids,
+        processing_status__in=approved_statuses,
+        fee_season__isnull=False,
+    ).filter(
+        ~Exists(active_application_fees) | Exists(active_application_fees.filter(fee_items__isnull=True))
+    ).values_list('approval_id', 'fee_season__end_date', 'fee_season__name'))
+
+    latest_applied_seasons = {}
+    for approval_id, end_date, name in seasons:
+        if approval_id not in latest_applied_seasons or latest_applied_seasons[approval_id][0] < end_date:
+            latest_applied_seasons[approval_id] = (end_date, name)
+    return latest_applied_seasons
+
 def get_approvals_due_for_renewal_without_notice(approvals):
     #get approvals with latest applied season in the last season
 
@@ -156,11 +195,9 @@ def get_approvals_due_for_renewal_without_notice(approvals):
     )
 
     #check remaining approvals - if from last season without a renewal sent it needs to be reported
-    unrenewed_approvals = []
-    for approval in approvals:
-        season = approval.latest_applied_season
-        if season and season.end_date <= prior_date:
-            unrenewed_approvals.append(approval.lodgement_number)
+    latest_applied_seasons = get_latest_applied_seasons(approvals)
+    unrenewed_approval_ids = [approval_id for approval_id, (end_date, name) in latest_applied_seasons.items() if end_date <= prior_date]
+    unrenewed_approvals = list(approvals.filter(id__in=unrenewed_approval_ids).values_list('lodgement_number', flat=True))
 
     return ("Approvals from the prior season that have not been sent renewal notices:", unrenewed_approvals)
 
@@ -189,34 +226,38 @@ def get_incorrect_sticker_seasons(stickers):
     missing_fee_season = list(stickers.filter(fee_season=None).values_list('id',flat=True))
     mismatched_fee_season = []
 
-    for i in stickers.exclude(fee_season=None):
+    stickers_with_fee_season = stickers.exclude(fee_season=None)
+    latest_applied_seasons = get_latest_applied_seasons(Approval.objects.filter(id__in=stickers_with_fee_season.values('approval_id')))
+    for sticker_id, approval_id, fee_season_name in stickers_with_fee_season.values_list('id', 'approval_id', 'fee_season__name'):
         #NOTE originally compared ids here, but that does not account for when fee seasons application types mismatch due to annual admission payments
         #comparing names should be adequate so long as naming conventions are adhered to
-        latest_applied_season = i.approval.latest_applied_season
-        if latest_applied_season and i.fee_season.name != latest_applied_season.name:
-            mismatched_fee_season.append(i.id)     
+        if approval_id in latest_applied_seasons and fee_season_name != latest_applied_seasons[approval_id][1]:
+            mismatched_fee_season.append(sticker_id)
 
     bad_fee_seasons = list(stickers.filter(id__in=mismatched_fee_season+missing_fee_season).values_list('number',flat=True))
 
     return ("Stickers that have a fee season that does not match their approval or are missing a fee season:", bad_fee_seasons)
 
-def convert_and_check_late_date_str(date_str, current_time):
-    """attempts to convert date_str from "%d/%m/%Y" (including quotes) format and then checks if date has elapsed"""
-    try:
-        date_value = datetime.datetime.strptime(date_str,'"%d/%m/%Y"')
-    except Exception as e:
-        print(e)
-        return False
-    
-    return current_time > date_value
+def annotate_details_date(approvals, details_field, key):
+    """
+    Annotate the approvals with the date stored as "dd/mm/yyyy" under the key of the details JSON field as details_date,
+    which is null when the value is not a date
+    """
+    return approvals.annotate(
+        details_date_str=KeyTextTransform(key, details_field)
+    ).annotate(
+        details_date=Case(
+            When(details_date_str__regex=r'^\d{2}/\d{2}/\d{4}$', then=Func(F('details_date_str'), Value('DD/MM/YYYY'), function='TO_DATE', output_field=DateField())),
+            default=None,
+            output_field=DateField(),
+        )
+    )
 
 def get_late_resuming_approvals(approvals):
-    current_time = datetime.datetime.now()
-    current_approvals_to_suspend = approvals.annotate(
-        suspension_date_str=Cast('suspension_details__to_date', output_field=CharField())
-    ).filter(status__in=[Approval.APPROVAL_STATUS_CURRENT],set_to_suspend=True)
+    today = datetime.date.today()
+    current_approvals_to_suspend = annotate_details_date(approvals, 'suspension_details', 'to_date').filter(status__in=[Approval.APPROVAL_STATUS_CURRENT],set_to_suspend=True)
 
-    current_approvals_late_to_suspension = list(map(lambda i: i.lodgement_number,list(filter(lambda i: convert_and_check_late_date_str(i.suspension_date_str,current_time),current_approvals_to_suspend))))
+    current_approvals_late_to_suspension = list(current_approvals_to_suspend.filter(details_date__lte=today).values_list('lodgement_number', flat=True))
 
     return ("Approvals that have a suspension end date and are late to being resumed:", current_approvals_late_to_suspension)
 
@@ -226,22 +267,18 @@ def get_late_cancelled_approvals(approvals):
     return ("Approvals that have a cancellation date and are late to being cancelled:", current_approvals)
 
 def get_late_suspended_approvals(approvals):
-    current_time = datetime.datetime.now()
-    current_approvals_to_suspend = approvals.annotate(
-        suspension_date_str=Cast('suspension_details__from_date', output_field=CharField())
-    ).filter(status__in=[Approval.APPROVAL_STATUS_CURRENT],set_to_suspend=True)
+    today = datetime.date.today()
+    current_approvals_to_suspend = annotate_details_date(approvals, 'suspension_details', 'from_date').filter(status__in=[Approval.APPROVAL_STATUS_CURRENT],set_to_suspend=True)
 
-    current_approvals_late_to_suspension = list(map(lambda i: i.lodgement_number,list(filter(lambda i: convert_and_check_late_date_str(i.suspension_date_str,current_time),current_approvals_to_suspend))))
+    current_approvals_late_to_suspension = list(current_approvals_to_suspend.filter(details_date__lte=today).values_list('lodgement_number', flat=True))
 
     return ("Approvals that have a suspension date and are late to being suspended:", current_approvals_late_to_suspension)
 
 def get_late_surrendered_approvals(approvals):
-    current_time = datetime.datetime.now()
-    current_approvals_to_surrender = approvals.annotate(
-        surrender_date_str=Cast('surrender_details__surrender_date', output_field=CharField())
-    ).filter(status__in=[Approval.APPROVAL_STATUS_CURRENT, Approval.APPROVAL_STATUS_SUSPENDED],set_to_surrender=True)
+    today = datetime.date.today()
+    current_approvals_to_surrender = annotate_details_date(approvals, 'surrender_details', 'surrender_date').filter(status__in=[Approval.APPROVAL_STATUS_CURRENT, Approval.APPROVAL_STATUS_SUSPENDED],set_to_surrender=True)
 
-    current_approvals_late_to_surrender = list(map(lambda i: i.lodgement_number,list(filter(lambda i: convert_and_check_late_date_str(i.surrender_date_str,current_time),current_approvals_to_surrender))))
+    current_approvals_late_to_surrender = list(current_approvals_to_surrender.filter(details_date__lte=today).values_list('lodgement_number', flat=True))
 
     return ("Approvals that have a surrender date and are late to being surrendered:", current_approvals_late_to_surrender)
 
@@ -253,16 +290,16 @@ def get_late_expired_approvals(approvals):
 def get_unaccounted_sold_vessel_ownerships(proposals):
     """Get vessel ownerships for vessels that have been sold but have no end date, excluding records created after the latest sold vessel ownership record"""
     proposals_with_vo = proposals.exclude(vessel_ownership=None)
-    proposal_vo_ids = list(proposals_with_vo.values_list("vessel_ownership_id", flat=True))
-    vessel_ownerships = VesselOwnership.objects.filter(id__in=proposal_vo_ids)
-
-    sold_vessel_ownerships = vessel_ownerships.exclude(end_date=None)
-    unsold_vessel_ownerships = vessel_ownerships.filter(end_date=None)
-    rego_nos = []
-    for svo in sold_vessel_ownerships:
-        if svo.vessel:
-            if unsold_vessel_ownerships.filter(created__lt=svo.created,owner=svo.owner,vessel__rego_no=svo.vessel.rego_no).exists():
-                rego_nos.append(svo.vessel.rego_no)
+    vessel_ownerships = VesselOwnership.objects.filter(id__in=proposals_with_vo.values("vessel_ownership_id"))
+
+    unaccounted_vessel_ownerships = vessel_ownerships.filter(
+        end_date=None,
+        created__lt=OuterRef('created'),
+        owner=OuterRef('owner'),
+        vessel__rego_no=OuterRef('vessel__rego_no'),
+    )
+    sold_vessel_ownerships = vessel_ownerships.exclude(end_date=None).exclude(vessel=None)
+    rego_nos = list(sold_vessel_ownerships.filter(Exists(unaccounted_vessel_ownerships)).values_list('vessel__rego_no', flat=True))
     return ("Vessels that have been marked as sold have unaccounted for vessel ownership records and possibly related records that have not been marked as sold:", rego_nos)
 
 #NOTE: with changes to sales handling this particular report is no longer required but may be useful for debugging
@@ -309,6 +346,70 @@ def check_invalid_expired_approval(approvals):
     numbers = list(expired_approvals_bad_dates.values_list("lodgement_number",flat=True))
     return ("Approvals with an Expired status but still in date:", numbers)
 
+def run_record_issue_checks(examination_functions, max_workers):
+    """
+    Run the record issue checks in worker threads, each with its own database connection.
+    Return {check name: report} in the order of the checks.  A check which fails is logged and left out.
+    """
+    def run_check(examination_function, querysets):
+        try:
+            title, findings = examination_function(*querysets)
+            # Evaluated here, as some checks return a queryset
+            return (title, list(findings))
+        finally:
+            connections.close_all()
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='record_issue_check') as executor:
+        futures = {
+            examination_function.__name__: executor.submit(run_check, examination_function, querysets)
+            for examination_function, querysets in examination_functions.items()
+        }
+
+    reports = {}
+    for check_name, future in futures.items():
+        try:
+            reports[check_name] = future.result()
+        except Exception as e:
+            logger.exception('Record issue check {} failed: {}'.format(check_name, e))
+    return reports
+
+def record_issue_findings(reports, full_run):
+    """
+    Store the findings of the checks: the new ones are created, and the ones found again have their last seen time
+    updated.  On a full run (without date filters) the open findings no longer found are resolved.
+    Return {check name: (findings as [(finding, first seen)], number of new findings, number of resolved findings)}.
+    """
+    now = timezone.now()
+    results = {}
+    with transaction.atomic():
+        open_issues = {
+            (issue.check_name, issue.finding): issue
+            for issue in RecordIssue.objects.select_for_update().filter(check_name__in=reports.keys(), resolved_at=None)
+        }
+        to_create, to_update = [], []
+        for check_name, report in reports.items():
+            findings = []
+            for finding in sorted(set(str(finding)[:255] for finding in report[1])):
+                issue = open_issues.pop((check_name, finding), None)
+                if issue is None:
+                    issue = RecordIssue(check_name=check_name, finding=finding, first_seen=now, last_seen=now)
+                    to_create.append(issue)
+                else:
+                    issue.last_seen = now
+                    to_update.append(issue)
+                findings.append((finding, issue.first_seen))
+            results[check_name] = [findings, len([first_seen for finding, first_seen in findings if first_seen == now]), 0]
+        RecordIssue.objects.bulk_create(to_create)
+        RecordIssue.objects.bulk_update(to_update, ['last_seen',])
+
+        if full_run:
+            resolved_issues = list(open_issues.values())
+            RecordIssue.objects.filter(id__in=[issue.id for issue in resolved_issues]).update(resolved_at=now)
+            for issue in resolved_issues:
+                results[issue.check_name][2] += 1
+
+    return {check_name: tuple(result) for check_name, result in results.items()}
+
 def ml_meet_vessel_requirement(mooring_licence, boundary_date):
     min_length_setting = GlobalSettings.objects.get(key=GlobalSettings.KEY_MINUMUM_MOORING_VESSEL_LENGTH)
     min_length = float(min_length_setting.value)
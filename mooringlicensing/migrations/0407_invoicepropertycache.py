@@ -0,0 +1,23 @@
+# Generated by Django 5.2.15 on 2026-10-18 09:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mooringlicensing', '0406_sticker_batch_property_cache'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InvoicePropertyCache',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('invoice_id', models.IntegerField(unique=True)),
+                ('properties', models.JSONField(blank=True, default=dict, null=True)),
+                ('stale', models.BooleanField(db_index=True, default=True)),
+                ('date_refreshed', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+    ]
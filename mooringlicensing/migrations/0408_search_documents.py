@@ -0,0 +1,56 @@
+# Generated by Django 5.2.15 on 2026-10-18 12:00
+
+import django.contrib.postgres.indexes
+import django.db.models.deletion
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mooringlicensing', '0407_invoicepropertycache'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.CreateModel(
+            name='ProposalSearchDocument',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('people', models.TextField(blank=True, default='')),
+                ('vessels', models.TextField(blank=True, default='')),
+                ('date_updated', models.DateTimeField(auto_now=True)),
+                ('proposal', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='search_document', to='mooringlicensing.proposal')),
+            ],
+            options={
+                'indexes': [django.contrib.postgres.indexes.GinIndex(fields=['people'], name='proposal_search_people_trgm', opclasses=['gin_trgm_ops']), django.contrib.postgres.indexes.GinIndex(fields=['vessels'], name='proposal_search_vessels_trgm', opclasses=['gin_trgm_ops'])],
+            },
+        ),
+        migrations.CreateModel(
+            name='ApprovalSearchDocument',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('people', models.TextField(blank=True, default='')),
+                ('vessels', models.TextField(blank=True, default='')),
+                ('date_updated', models.DateTimeField(auto_now=True)),
+                ('approval', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='search_document', to='mooringlicensing.approval')),
+            ],
+            options={
+                'indexes': [django.contrib.postgres.indexes.GinIndex(fields=['people'], name='approval_search_people_trgm', opclasses=['gin_trgm_ops']), django.contrib.postgres.indexes.GinIndex(fields=['vessels'], name='approval_search_vessels_trgm', opclasses=['gin_trgm_ops'])],
+            },
+        ),
+        migrations.CreateModel(
+            name='StickerSearchDocument',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('people', models.TextField(blank=True, default='')),
+                ('vessels', models.TextField(blank=True, default='')),
+                ('date_updated', models.DateTimeField(auto_now=True)),
+                ('sticker', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='search_document', to='mooringlicensing.sticker')),
+            ],
+            options={
+                'indexes': [django.contrib.postgres.indexes.GinIndex(fields=['people'], name='sticker_search_people_trgm', opclasses=['gin_trgm_ops']), django.contrib.postgres.indexes.GinIndex(fields=['vessels'], name='sticker_search_vessels_trgm', opclasses=['gin_trgm_ops'])],
+            },
+        ),
+    ]
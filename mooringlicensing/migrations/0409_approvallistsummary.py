@@ -0,0 +1,27 @@
+# Generated by Django 5.2.15 on 2026-10-18 13:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mooringlicensing', '0408_search_documents'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ApprovalListSummary',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('has_sticker', models.BooleanField(default=False)),
+                ('is_missing_sticker', models.BooleanField(default=False)),
+                ('missing_sticker_message', models.TextField(blank=True, null=True)),
+                ('mooring_offered', models.JSONField(blank=True, default=dict)),
+                ('moorings', models.JSONField(blank=True, default=list)),
+                ('date_updated', models.DateTimeField(auto_now=True)),
+                ('approval', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='list_summary', to='mooringlicensing.approval')),
+            ],
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.15 on 2026-10-18 15:00
+
+import django.contrib.postgres.fields
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mooringlicensing', '0409_approvallistsummary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PaymentChain',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('proposal_ids', django.contrib.postgres.fields.ArrayField(base_field=models.IntegerField(), blank=True, default=list, size=None)),
+                ('date_updated', models.DateTimeField(auto_now=True)),
+                ('proposal', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='payment_chain', to='mooringlicensing.proposal')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PaymentHistory',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount_paid', models.DecimalField(blank=True, decimal_places=2, default=None, max_digits=8, null=True)),
+                ('date_updated', models.DateTimeField(auto_now=True)),
+                ('application_type', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='payment_histories', to='mooringlicensing.applicationtype')),
+                ('approval', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='payment_histories', to='mooringlicensing.approval')),
+                ('fee_item_application_fee', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='payment_history', to='mooringlicensing.feeitemapplicationfee')),
+                ('fee_season', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='payment_histories', to='mooringlicensing.feeseason')),
+                ('proposal', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='payment_histories', to='mooringlicensing.proposal')),
+                ('vessel', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='payment_histories', to='mooringlicensing.vessel')),
+            ],
+            options={
+                'verbose_name_plural': 'payment histories',
+                'indexes': [models.Index(fields=['proposal', 'application_type', 'vessel'], name='payment_history_proposal_idx'), models.Index(fields=['approval', 'fee_season'], name='payment_history_approval_idx')],
+            },
+        ),
+    ]
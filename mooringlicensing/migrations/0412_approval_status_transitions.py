@@ -0,0 +1,40 @@
+# Generated by Django 5.2.15 on 2026-10-18 18:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mooringlicensing', '0411_mooringbookingsexport'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='approval',
+            index=models.Index(fields=['status', 'expiry_date'], name='approval_status_expiry_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='approval',
+            index=models.Index(condition=models.Q(('set_to_suspend', True), ('set_to_cancel', True), ('set_to_surrender', True), _connector='OR'), fields=['status'], name='approval_scheduled_change_idx'),
+        ),
+        migrations.CreateModel(
+            name='ApprovalStatusTransition',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('transition', models.CharField(choices=[('expire', 'Expire'), ('suspend', 'Suspend'), ('cancel', 'Cancel'), ('surrender', 'Surrender'), ('reinstate', 'Reinstate')], max_length=20)),
+                ('from_status', models.CharField(choices=[('current', 'Current'), ('expired', 'Expired'), ('cancelled', 'Cancelled'), ('surrendered', 'Surrendered'), ('suspended', 'Suspended'), ('fulfilled', 'Fulfilled')], max_length=40)),
+                ('to_status', models.CharField(choices=[('current', 'Current'), ('expired', 'Expired'), ('cancelled', 'Cancelled'), ('surrendered', 'Surrendered'), ('suspended', 'Suspended'), ('fulfilled', 'Fulfilled')], max_length=40)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('processed', 'Processed'), ('failed', 'Failed')], default='pending', max_length=20)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('last_error', models.TextField(blank=True, null=True)),
+                ('date_created', models.DateTimeField(auto_now_add=True)),
+                ('date_processed', models.DateTimeField(blank=True, null=True)),
+                ('approval', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='status_transitions', to='mooringlicensing.approval')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'id'], name='approval_transition_status_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.15 on 2026-10-18 18:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mooringlicensing', '0412_approval_status_transitions'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='compliance',
+            index=models.Index(fields=['processing_status', 'due_date'], name='compliance_status_due_idx'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.15 on 2026-10-18 19:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mooringlicensing', '0413_compliance_status_due_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecordIssue',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('check_name', models.CharField(max_length=100)),
+                ('finding', models.CharField(max_length=255)),
+                ('first_seen', models.DateTimeField()),
+                ('last_seen', models.DateTimeField()),
+                ('resolved_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(condition=models.Q(('resolved_at', None)), fields=('check_name', 'finding'), name='record_issue_open_unique')],
+            },
+        ),
+    ]
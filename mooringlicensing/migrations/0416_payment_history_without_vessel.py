@@ -0,0 +1,25 @@
+# Generated by Django 5.2.15 on 2026-10-18 22:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mooringlicensing', '0414_recordissue'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='paymenthistory',
+            name='payment_history_proposal_idx',
+        ),
+        migrations.RemoveField(
+            model_name='paymenthistory',
+            name='vessel',
+        ),
+        migrations.AddIndex(
+            model_name='paymenthistory',
+            index=models.Index(fields=['proposal', 'application_type'], name='payment_history_proposal_idx'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.15 on 2026-10-19 09:00
+
+import django.contrib.postgres.indexes
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mooringlicensing', '0416_payment_history_without_vessel'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='proposal',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['invoice_property_cache'], name='proposal_invoice_props_gin'),
+        ),
+        migrations.AddIndex(
+            model_name='dcvadmission',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['invoice_property_cache'], name='dcvadmission_invoice_props_gin'),
+        ),
+        migrations.AddIndex(
+            model_name='dcvpermit',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['invoice_property_cache'], name='dcvpermit_invoice_props_gin'),
+        ),
+        migrations.AddIndex(
+            model_name='sticker',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['invoice_property_cache'], name='sticker_invoice_props_gin'),
+        ),
+    ]
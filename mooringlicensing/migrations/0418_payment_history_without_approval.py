@@ -0,0 +1,25 @@
+# Generated by Django 5.2.15 on 2026-10-18 23:40
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mooringlicensing', '0417_invoice_property_cache_gin'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='paymenthistory',
+            name='payment_history_approval_idx',
+        ),
+        migrations.RemoveField(
+            model_name='paymenthistory',
+            name='approval',
+        ),
+        migrations.RemoveField(
+            model_name='paymenthistory',
+            name='fee_season',
+        ),
+    ]
@@ -0,0 +1,39 @@
+from django.db import migrations
+
+BATCH_SIZE = 1000
+
+
+def backfill_payment_histories(apps, schema_editor):
+    # The fees are worked out from the payment histories, store one for each fee already paid.  The payment chains are
+    # worked out when read until they are stored by the rebuild_payment_histories command.
+    FeeItemApplicationFee = apps.get_model('mooringlicensing', 'FeeItemApplicationFee')
+    PaymentHistory = apps.get_model('mooringlicensing', 'PaymentHistory')
+
+    fee_item_application_fees = FeeItemApplicationFee.objects.filter(payment_history__isnull=True).order_by('id').values_list(
+        'id', 'application_fee__proposal_id', 'fee_item__fee_constructor__application_type_id', 'amount_paid',
+    )
+    batch = []
+    for fee_item_application_fee_id, proposal_id, application_type_id, amount_paid in fee_item_application_fees.iterator(chunk_size=BATCH_SIZE):
+        batch.append(PaymentHistory(
+            fee_item_application_fee_id=fee_item_application_fee_id,
+            proposal_id=proposal_id,
+            application_type_id=application_type_id,
+            amount_paid=amount_paid,
+        ))
+        if len(batch) >= BATCH_SIZE:
+            PaymentHistory.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    PaymentHistory.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+    # Each batch is committed on its own rather than in one transaction holding every fee paid so far
+    atomic = False
+
+    dependencies = [
+        ('mooringlicensing', '0418_payment_history_without_approval'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_payment_histories, migrations.RunPython.noop),
+    ]
@@ -1,8 +1,113 @@
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
 import requests
 from django.conf import settings
+from django.core.cache import cache
 from django.http import HttpResponse
 from mooringlicensing.helpers import is_internal
 
+logger = logging.getLogger(__name__)
+
+CACHE_KEY_QUEUE_ANSWER = 'queue-answer-{}'
+# Seconds the answer of the queue service for a visitor is kept for the next request of the visitor
+QUEUE_ANSWER_TIMEOUT = 600
+# Kept for a visitor until the queue service has answered
+QUEUE_ANSWER_PENDING = 'pending'
+
+
+class QueueDecisionCache(object):
+    """
+    What this process has learnt about the queue service from the answers given for its visitors, so that new visitors
+    are let in without waiting for the queue service.
+
+    The queue session of a new visitor is created in the background (create_session_later()), at most
+    QUEUE_BACKGROUND_CHECKS at a time, and its answer is picked up on the next request of the visitor (get_answer()).
+    When the queue service puts a visitor in the waiting room, the queue is taken as full for
+    QUEUE_WAITING_CACHE_SECONDS seconds, during which the next new visitors are checked before being let in so that
+    each of them is sent to its own waiting room.  Any answer letting a visitor in clears it.
+
+    Failures are counted by a circuit breaker: after QUEUE_FAILURE_THRESHOLD failures in a row the queue service is
+    not asked for QUEUE_OPEN_CIRCUIT_SECONDS, and the visitors are let in (fail open) until then.
+
+    All of it is kept per host: the state in this process and the answers in the default cache, which is a file
+    based cache.  A visitor whose next request is served by another host is checked again there.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._session = requests.Session()
+        self._executor = ThreadPoolExecutor(max_workers=settings.QUEUE_BACKGROUND_CHECKS, thread_name_prefix='queue_check')
+        self.queue_full_until = 0
+        self.failures = 0
+        self.circuit_open_until = 0
+        self.checks_in_progress = 0
+
+    def is_circuit_open(self):
+        return time.monotonic() < self.circuit_open_until
+
+    def is_queue_full(self):
+        return time.monotonic() < self.queue_full_until
+
+    def check_create_session(self, session_key):
+        url = settings.QUEUE_BACKEND_URL + "/api/check-create-session/?session_key=" + session_key + "&queue_group=" + settings.QUEUE_GROUP_NAME
+        try:
+            resp = self._session.get(url, data={}, cookies={}, verify=False, timeout=settings.QUEUE_REQUEST_TIMEOUT)
+            queue_json = resp.json()
+            waiting = queue_json['status'] == 'Waiting'
+        except Exception:
+            with self._lock:
+                self.failures += 1
+                if self.failures >= settings.QUEUE_FAILURE_THRESHOLD:
+                    self.circuit_open_until = time.monotonic() + settings.QUEUE_OPEN_CIRCUIT_SECONDS
+            raise
+
+        with self._lock:
+            self.failures = 0
+            self.circuit_open_until = 0
+            self.queue_full_until = time.monotonic() + settings.QUEUE_WAITING_CACHE_SECONDS if waiting else 0
+        return queue_json
+
+    def create_session_later(self):
+        """
+        Ask the queue service for a session for a new visitor in the background.  Return the token under which the
+        answer can be picked up with get_answer(), or None when QUEUE_BACKGROUND_CHECKS sessions are being asked for
+        already, in which case the visitor is asked for on a later request.
+        """
+        with self._lock:
+            if self.checks_in_progress >= settings.QUEUE_BACKGROUND_CHECKS:
+                return None
+            self.checks_in_progress += 1
+        token = uuid.uuid4().hex
+        cache.set(CACHE_KEY_QUEUE_ANSWER.format(token), QUEUE_ANSWER_PENDING, QUEUE_ANSWER_TIMEOUT)
+        self._executor.submit(self._create_session, token)
+        return token
+
+    def _create_session(self, token):
+        try:
+            if self.is_circuit_open():
+                # Failed in the meantime, the visitor stays let in
+                return
+            cache.set(CACHE_KEY_QUEUE_ANSWER.format(token), self.check_create_session(''), QUEUE_ANSWER_TIMEOUT)
+        except Exception as e:
+            logger.warning("ERROR LOADING QUEUE: {}".format(e))
+        finally:
+            with self._lock:
+                self.checks_in_progress -= 1
+
+    def get_answer(self, token):
+        """
+        Return the answer of the queue service for the session created with create_session_later(),
+        QUEUE_ANSWER_PENDING while there is none yet, or None when the session has not been asked for on this host
+        """
+        return cache.get(CACHE_KEY_QUEUE_ANSWER.format(token))
+
+
+queue_decision_cache = QueueDecisionCache()
+
+
 class QueueControl(object):
 
     def __init__(self, get_response):
@@ -10,16 +115,17 @@ class QueueControl(object):
 
     def __call__(self, request):
         session_key = ''
+        pending_token = ''
         if settings.WAITING_QUEUE_ENABLED is True:
             # Required for ledger to send completion signal after payment is received.
             # NOTE: add dcv admission/permit payment views when implemented
-            if (request.path.startswith('/ledger-api-success-callback/') 
-                or request.path.startswith('/success/fee/') 
-                or request.path.startswith('/sticker_replacement_fee_success/') 
+            if (request.path.startswith('/ledger-api-success-callback/')
+                or request.path.startswith('/success/fee/')
+                or request.path.startswith('/sticker_replacement_fee_success/')
                 or request.path.startswith('/sticker_replacement_fee_success_preload/')):
                 response= self.get_response(request)
                 return response
-            
+
             sitequeuesession = request.COOKIES.get('sitequeuesession', None)
             if (request.path.startswith('/') and not is_internal(request)):
                 try:
@@ -28,26 +134,44 @@ class QueueControl(object):
                             if settings.QUEUE_WAITING_URL:
                                 if sitequeuesession is None:
                                     sitequeuesession=''
-                                         
-                                    url = settings.QUEUE_BACKEND_URL+"/api/check-create-session/?session_key="+sitequeuesession+"&queue_group="+settings.QUEUE_GROUP_NAME
-                                    resp = requests.get(url, data = {}, cookies={},  verify=False, timeout=10)
-                                                                 
-                                    queue_json = resp.json()
-                                    if 'session_key' in queue_json:
-                                        session_key = queue_json['session_key']
-                                   
-                                    if queue_json['status'] == 'Waiting': 
-                                        response =HttpResponse("<script>window.location.replace('"+queue_json['queue_waiting_room_url']+"');</script>Redirecting")
-                                        print('You are waiting : '+str(sitequeuesession))
-                                        return response
+                                    sitequeuepending = request.COOKIES.get('sitequeuepending', None)
+                                    queue_json = None
+
+                                    if sitequeuepending:
+                                        queue_json = queue_decision_cache.get_answer(sitequeuepending)
+
+                                    if queue_json is not None:
+                                        # The queue session of the visitor has been asked for on a previous request
+                                        # (when asked for on another host, there is no answer here and it is asked again)
+                                        pass
+                                    elif queue_decision_cache.is_circuit_open():
+                                        # The queue service is failing, let the visitor in
+                                        pass
+                                    elif queue_decision_cache.is_queue_full():
+                                        # Ask now, so that the visitor is sent to its own waiting room
+                                        queue_json = queue_decision_cache.check_create_session(sitequeuesession)
+                                    else:
+                                        # Let the visitor in now, the queue service is asked in the background
+                                        pending_token = queue_decision_cache.create_session_later()
+
+                                    if queue_json and queue_json != QUEUE_ANSWER_PENDING:
+                                        if queue_json['status'] == 'Waiting':
+                                            response =HttpResponse("<script>window.location.replace('"+queue_json['queue_waiting_room_url']+"');</script>Redirecting")
+                                            logger.debug('You are waiting : '+str(sitequeuepending))
+                                            return response
+                                        if 'session_key' in queue_json:
+                                            session_key = queue_json['session_key']
                                 else:
-                                    print('Active Session')
-                                               
+                                    # The session has been let in by the queue service, nothing to check remotely
+                                    pass
+
                 except Exception as e:
-                    print(e)
-                    print("ERROR LOADING QUEUE")
+                    logger.warning("ERROR LOADING QUEUE: {}".format(e))
 
         response = self.get_response(request)
         if len(session_key) > 5:
             response.set_cookie('sitequeuesession', session_key, domain=settings.QUEUE_DOMAIN)
-        return response
\ No newline at end of file
+            response.delete_cookie('sitequeuepending', domain=settings.QUEUE_DOMAIN)
+        elif pending_token:
+            response.set_cookie('sitequeuepending', pending_token, max_age=QUEUE_ANSWER_TIMEOUT, domain=settings.QUEUE_DOMAIN)
+        return response
@@ -20,7 +20,32 @@ SHOW_DEBUG_TOOLBAR = env('SHOW_DEBUG_TOOLBAR', False)
 SHOW_API_ROOT = env('SHOW_API_ROOT', False)
 MAX_RENEWAL_NOTICES_PER_RUN = env('MAX_RENEWAL_NOTICES_PER_RUN', 5)
 NUMBER_OF_QUEUE_JOBS = env('NUMBER_OF_QUEUE_JOBS', 3)
+JOB_QUEUE_WORKER_PROCESSES = env('JOB_QUEUE_WORKER_PROCESSES', 2)
+JOB_QUEUE_POLL_INTERVAL = env('JOB_QUEUE_POLL_INTERVAL', 10)  # seconds
+JOB_QUEUE_JOB_TIMEOUT = env('JOB_QUEUE_JOB_TIMEOUT', 3600)  # seconds
+JOB_QUEUE_HEARTBEAT_TIMEOUT = env('JOB_QUEUE_HEARTBEAT_TIMEOUT', 600)  # seconds
+JOB_QUEUE_MAX_ATTEMPTS = env('JOB_QUEUE_MAX_ATTEMPTS', 3)
+CRON_TASKS_MAX_WORKERS = env('CRON_TASKS_MAX_WORKERS', 4)
+DOC_CONVERTER_BINARY = env('DOC_CONVERTER_BINARY', 'libreoffice')
+DOC_CONVERTER_DIRECTORY = env('DOC_CONVERTER_DIRECTORY', os.path.join(BASE_DIR, 'tmp', 'doc_converter'))
+DOC_CONVERTER_POOL_SIZE = env('DOC_CONVERTER_POOL_SIZE', 2)
+DOC_CONVERTER_QUEUE_TIMEOUT = env('DOC_CONVERTER_QUEUE_TIMEOUT', 120)  # seconds
+DOC_CONVERTER_TIMEOUT = env('DOC_CONVERTER_TIMEOUT', 120)  # seconds
+DOC_CONVERTER_STARTUP_TIMEOUT = env('DOC_CONVERTER_STARTUP_TIMEOUT', 30)  # seconds
 MAX_NUM_ROWS_MODEL_EXPORT = env('MAX_NUM_ROWS_MODEL_EXPORT', 500000)
+MODEL_EXPORT_CHUNK_SIZE = env('MODEL_EXPORT_CHUNK_SIZE', 2000)
+FEE_INDEX_VERSION_CHECK_INTERVAL = env('FEE_INDEX_VERSION_CHECK_INTERVAL', 5)  # seconds
+PROFILE_COMPLETENESS_SESSION_TIMEOUT = env('PROFILE_COMPLETENESS_SESSION_TIMEOUT', 60 * 60)  # seconds
+LEDGER_TOTALS_CACHE_TIMEOUT = env('LEDGER_TOTALS_CACHE_TIMEOUT', 60)  # seconds
+MOORING_BOOKINGS_EXPORT_BATCH_SIZE = env('MOORING_BOOKINGS_EXPORT_BATCH_SIZE', 100)
+MOORING_BOOKINGS_EXPORT_MAX_WORKERS = env('MOORING_BOOKINGS_EXPORT_MAX_WORKERS', 4)
+MOORING_BOOKINGS_EXPORT_MAX_ATTEMPTS = env('MOORING_BOOKINGS_EXPORT_MAX_ATTEMPTS', 8)
+MOORING_BOOKINGS_EXPORT_RETRY_DELAY = env('MOORING_BOOKINGS_EXPORT_RETRY_DELAY', 60)  # seconds, doubled on each attempt
+MOORING_BOOKINGS_EXPORT_TIMEOUT = env('MOORING_BOOKINGS_EXPORT_TIMEOUT', 30)  # seconds
+APPROVAL_STATUS_TRANSITION_MAX_ATTEMPTS = env('APPROVAL_STATUS_TRANSITION_MAX_ATTEMPTS', 3)
+INVOICE_PROPERTY_CACHE_BATCH_SIZE = env('INVOICE_PROPERTY_CACHE_BATCH_SIZE', 50)
+INVOICE_PROPERTY_CACHE_MAX_WORKERS = env('INVOICE_PROPERTY_CACHE_MAX_WORKERS', 5)
+RECORD_ISSUES_REPORT_MAX_WORKERS = env('RECORD_ISSUES_REPORT_MAX_WORKERS', 4)
 
 #Settings for rounding application fee items
 ROUND_FEE_ITEMS = env('ROUND_FEE_ITEMS', False)
@@ -107,6 +132,8 @@ CACHES = {
 
 CACHE_TIMEOUT_2_HOURS = 60 * 60 * 2
 CACHE_KEY_FILE_EXTENSION_WHITELIST = "file-extension-whitelist"
+CACHE_KEY_FEE_CONFIGURATION_VERSION = "fee-configuration-version"
+CACHE_KEY_DOT_VESSEL_INFORMATION = "dot-vessel-information-{}"
 FILE_SIZE_LIMIT_BYTES = env('FILE_SIZE_LIMIT_BYTES' ,128000000)
 
 STATIC_ROOT=os.path.join(BASE_DIR, 'staticfiles_ml')
@@ -489,6 +516,9 @@ DOT_URL=env('DOT_URL',None)
 DOT_USERNAME=env('DOT_USERNAME',None)
 DOT_PASSWORD=env('DOT_PASSWORD',None)
 DO_DOT_CHECK= env('DO_DOT_CHECK', False)
+DOT_TIMEOUT = env('DOT_TIMEOUT', 30)  # seconds
+DOT_CACHE_TIMEOUT = env('DOT_CACHE_TIMEOUT', 60 * 60)  # seconds, for the vessels found with the owner matching
+DOT_CACHE_NEGATIVE_TIMEOUT = env('DOT_CACHE_NEGATIVE_TIMEOUT', 60 * 5)  # seconds, for the vessels not found or not matching
 LOV_CACHE_TIMEOUT=10800
 CSRF_MIDDLEWARE_TOKEN=env('CSRF_MIDDLEWARE_TOKEN', '')
 EMAIL_INSTANCE = env('EMAIL_INSTANCE','DEV')
@@ -564,6 +594,11 @@ QUEUE_DOMAIN = decouple.config('QUEUE_DOMAIN',default='')
 QUEUE_URL = decouple.config('QUEUE_URL',default='')
 QUEUE_BACKEND_URL = decouple.config('QUEUE_BACKEND_URL',default='')
 QUEUE_ACTIVE_HOSTS = decouple.config('QUEUE_ACTIVE_HOSTS',default='')
+QUEUE_WAITING_CACHE_SECONDS = decouple.config('QUEUE_WAITING_CACHE_SECONDS',default=5, cast=int)
+QUEUE_REQUEST_TIMEOUT = decouple.config('QUEUE_REQUEST_TIMEOUT',default=2, cast=float)  # seconds
+QUEUE_FAILURE_THRESHOLD = decouple.config('QUEUE_FAILURE_THRESHOLD',default=3, cast=int)
+QUEUE_OPEN_CIRCUIT_SECONDS = decouple.config('QUEUE_OPEN_CIRCUIT_SECONDS',default=30, cast=int)
+QUEUE_BACKGROUND_CHECKS = decouple.config('QUEUE_BACKGROUND_CHECKS',default=4, cast=int)  # queue sessions asked for at the same time
 ENABLE_QUEUE_MIDDLEWARE = decouple.config('ENABLE_QUEUE_MIDDLEWARE',default=False, cast=bool)
 if ENABLE_QUEUE_MIDDLEWARE is True or ENABLE_QUEUE_MIDDLEWARE == 'True':
     MIDDLEWARE_CLASSES += [
@@ -0,0 +1,41 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeServer(object):
+    """
+    A local stand-in for an external JSON service.  Every GET is answered with respond(path), after waiting delay
+    seconds, and the paths asked for are kept in hits.
+    """
+    def __init__(self, respond, delay=0):
+        self.respond = respond
+        self.delay = delay
+        self.hits = []
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                fake.hits.append(self.path)
+                time.sleep(fake.delay)
+                body = json.dumps(fake.respond(self.path))
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.end_headers()
+                self.wfile.write(body.encode())
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = 'http://127.0.0.1:{}'.format(self.server.server_address[1])
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.server.shutdown()
+        self.server.server_close()
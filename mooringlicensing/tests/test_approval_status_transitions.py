@@ -0,0 +1,50 @@
+import datetime
+
+from django.test import SimpleTestCase
+
+from mooringlicensing.components.approvals.models import Approval, ApprovalStatusTransition
+from mooringlicensing.components.approvals.utils import get_due_approval_status_transition
+
+TODAY = datetime.date(2026, 7, 1)
+
+
+def make_approval(status=Approval.APPROVAL_STATUS_CURRENT, expiry_date=datetime.date(2027, 6, 30), **kwargs):
+    return Approval(status=status, expiry_date=expiry_date, **kwargs)
+
+
+class DueApprovalStatusTransitionTests(SimpleTestCase):
+
+    def test_nothing_due(self):
+        self.assertIsNone(get_due_approval_status_transition(make_approval(), TODAY))
+        self.assertIsNone(get_due_approval_status_transition(make_approval(set_to_cancel=True, cancellation_date=TODAY + datetime.timedelta(days=1)), TODAY))
+        self.assertIsNone(get_due_approval_status_transition(make_approval(status=Approval.APPROVAL_STATUS_EXPIRED, expiry_date=datetime.date(2026, 1, 1)), TODAY))
+
+    def test_expiry_comes_first(self):
+        approval = make_approval(expiry_date=TODAY - datetime.timedelta(days=1), set_to_cancel=True, cancellation_date=TODAY)
+        self.assertEqual(get_due_approval_status_transition(approval, TODAY), (ApprovalStatusTransition.TRANSITION_EXPIRE, []))
+        # Due on the day after the expiry date
+        self.assertIsNone(get_due_approval_status_transition(make_approval(expiry_date=TODAY), TODAY))
+
+    def test_suspension(self):
+        approval = make_approval(set_to_suspend=True, suspension_details={'from_date': '01/07/2026', 'to_date': '31/07/2026'})
+        self.assertEqual(get_due_approval_status_transition(approval, TODAY), (ApprovalStatusTransition.TRANSITION_SUSPEND, ['set_to_suspend']))
+        self.assertIsNone(get_due_approval_status_transition(approval, TODAY - datetime.timedelta(days=1)))
+
+    def test_reinstatement(self):
+        approval = make_approval(status=Approval.APPROVAL_STATUS_SUSPENDED, suspension_details={'from_date': '01/06/2026', 'to_date': '01/07/2026'})
+        self.assertEqual(get_due_approval_status_transition(approval, TODAY), (ApprovalStatusTransition.TRANSITION_REINSTATE, []))
+        approval.expiry_date = TODAY
+        self.assertIsNone(get_due_approval_status_transition(approval, TODAY))
+
+    def test_last_scheduled_change_wins(self):
+        approval = make_approval(
+            set_to_suspend=True, suspension_details={'from_date': '01/06/2026', 'to_date': '31/07/2026'},
+            set_to_cancel=True, cancellation_date=TODAY,
+            set_to_surrender=True, surrender_details={'surrender_date': '02/07/2026'},
+        )
+        self.assertEqual(get_due_approval_status_transition(approval, TODAY), (ApprovalStatusTransition.TRANSITION_CANCEL, ['set_to_suspend', 'set_to_cancel']))
+        self.assertEqual(get_due_approval_status_transition(approval, TODAY + datetime.timedelta(days=1)), (ApprovalStatusTransition.TRANSITION_SURRENDER, ['set_to_suspend', 'set_to_cancel', 'set_to_surrender']))
+
+    def test_suspended_approval_cancelled(self):
+        approval = make_approval(status=Approval.APPROVAL_STATUS_SUSPENDED, suspension_details={'from_date': '01/06/2026', 'to_date': '31/07/2026'}, set_to_cancel=True, cancellation_date=TODAY)
+        self.assertEqual(get_due_approval_status_transition(approval, TODAY), (ApprovalStatusTransition.TRANSITION_CANCEL, ['set_to_cancel']))
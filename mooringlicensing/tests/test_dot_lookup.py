@@ -0,0 +1,93 @@
+import json
+import threading
+import time
+from urllib.parse import parse_qs, urlparse
+
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from mooringlicensing.components.main.utils import get_dot_vessel_information
+from mooringlicensing.tests.fake_server import FakeServer
+
+
+def get_rego_no(path):
+    return json.loads(parse_qs(urlparse(path).query)['paramGET'][0])['boatRegistrationNumber']
+
+
+class FakeDotServer(FakeServer):
+    """
+    A local stand-in for the DoT vessel lookup API.  responses maps a rego number to the 'data' returned for it,
+    a rego number which is not in it is answered with a 500.
+    """
+    def __init__(self, responses, delay=0):
+        super().__init__(self.lookup, delay)
+        self.responses = responses
+        self.url += '/'
+
+    def lookup(self, path):
+        data = self.responses.get(get_rego_no(path))
+        return {'status': 200, 'data': data} if data else {'status': 500}
+
+    @property
+    def rego_nos(self):
+        return [get_rego_no(path) for path in self.hits]
+
+
+FOUND = {'boatFound': 'Y', 'boatOwnerMatch': 'Y', 'boatLength': '6.5'}
+NOT_FOUND = {'boatFound': 'N', 'boatOwnerMatch': 'N', 'boatLength': '0'}
+
+
+@override_settings(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'dot-lookup-tests'}},
+    DOT_USERNAME='user',
+    DOT_PASSWORD='pass',
+    DOT_TIMEOUT=10,
+    DOT_CACHE_TIMEOUT=60,
+    DOT_CACHE_NEGATIVE_TIMEOUT=1,
+)
+class DotLookupTests(SimpleTestCase):
+
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.request = RequestFactory().get('/')
+
+    def lookup(self, rego_no, owner='John%20Smith'):
+        json_string = json.dumps({'boatRegistrationNumber': rego_no, 'owner': owner, 'userId': '1'})
+        return json.loads(get_dot_vessel_information(self.request, json_string))
+
+    def test_repeated_lookup_is_cached(self):
+        with FakeDotServer({'AB123': FOUND}) as server, self.settings(DOT_URL=server.url):
+            self.assertEqual(self.lookup('AB123')['data'], FOUND)
+            self.assertEqual(self.lookup('AB123')['data'], FOUND)
+            self.assertEqual(server.rego_nos, ['AB123'])
+
+            # The owner is part of the lookup
+            self.lookup('AB123', owner='Jane%20Smith')
+            self.assertEqual(server.rego_nos, ['AB123', 'AB123'])
+
+    def test_negative_lookup_expires_sooner(self):
+        with FakeDotServer({'CD456': NOT_FOUND}) as server, self.settings(DOT_URL=server.url):
+            self.lookup('CD456')
+            self.lookup('CD456')
+            self.assertEqual(server.rego_nos, ['CD456'])
+            time.sleep(1.1)
+            self.lookup('CD456')
+            self.assertEqual(server.rego_nos, ['CD456', 'CD456'])
+
+    def test_error_is_not_cached(self):
+        with FakeDotServer({}) as server, self.settings(DOT_URL=server.url):
+            self.assertEqual(self.lookup('EF789')['status'], 500)
+            self.assertEqual(self.lookup('EF789')['status'], 500)
+            self.assertEqual(server.rego_nos, ['EF789', 'EF789'])
+
+    def test_concurrent_lookups_are_coalesced(self):
+        with FakeDotServer({'GH012': FOUND}, delay=0.5) as server, self.settings(DOT_URL=server.url):
+            results = []
+            threads = [threading.Thread(target=lambda: results.append(self.lookup('GH012'))) for i in range(5)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertEqual(len(results), 5)
+            self.assertTrue(all(result['data'] == FOUND for result in results))
+            self.assertEqual(server.rego_nos, ['GH012'])
@@ -0,0 +1,62 @@
+import random
+from decimal import Decimal
+
+from django.test import SimpleTestCase
+
+from mooringlicensing.components.main.utils import get_max_number_of_increments
+from mooringlicensing.components.payments_ml.models import FeeItem
+
+
+def brute_force_max_number_of_increments(amount, start_size, max_number_of_increment, max_amount_paid):
+    # The loop calculate_minimum_max_length() used to run for an incremental fee item
+    number_of_increments = None
+    increment = 0.0
+    while increment <= max_number_of_increment:
+        test_vessel_size = start_size + increment
+        if FeeItem.calculate_absolute_amount(amount, True, test_vessel_size) <= max_amount_paid:
+            number_of_increments = int(increment)
+        increment += 1
+    return number_of_increments
+
+
+class FeeRangeTests(SimpleTestCase):
+    """
+    Checks get_max_number_of_increments() against the brute force search over many generated fee items
+    """
+    NUMBER_OF_CASES = 2000
+
+    def random_cents(self, rng, maximum):
+        return Decimal(rng.randint(0, maximum * 100)) / 100
+
+    def assert_same_as_brute_force(self, amount, start_size, max_number_of_increment, max_amount_paid):
+        expected = brute_force_max_number_of_increments(amount, start_size, max_number_of_increment, max_amount_paid)
+        actual = get_max_number_of_increments(amount, start_size, max_number_of_increment, max_amount_paid)
+        self.assertEqual(actual, expected, 'amount: {}, start_size: {}, max_number_of_increment: {}, max_amount_paid: {}'.format(amount, start_size, max_number_of_increment, max_amount_paid))
+
+    def test_random_fee_items(self):
+        rng = random.Random(20240101)
+        for i in range(self.NUMBER_OF_CASES):
+            amount = self.random_cents(rng, 500)
+            start_size = float(self.random_cents(rng, 30))
+            max_number_of_increment = rng.randint(0, 50)
+            max_amount_paid = self.random_cents(rng, 20000)
+            self.assert_same_as_brute_force(amount, start_size, max_number_of_increment, max_amount_paid)
+
+    def test_amount_paid_on_the_boundary(self):
+        rng = random.Random(20240102)
+        for i in range(self.NUMBER_OF_CASES):
+            amount = self.random_cents(rng, 500)
+            start_size = float(self.random_cents(rng, 30))
+            max_number_of_increment = rng.randint(0, 50)
+            # Exactly the amount of one of the sizes, give or take a cent
+            test_vessel_size = start_size + rng.randint(0, max_number_of_increment)
+            max_amount_paid = FeeItem.calculate_absolute_amount(amount, True, test_vessel_size) + Decimal(rng.choice(['-0.01', '0', '0.01']))
+            self.assert_same_as_brute_force(amount, start_size, max_number_of_increment, max_amount_paid)
+
+    def test_edge_cases(self):
+        self.assert_same_as_brute_force(Decimal('0'), 0.0, 10, Decimal('0'))
+        self.assert_same_as_brute_force(Decimal('12.50'), 0.0, 10, Decimal('12.49'))
+        self.assert_same_as_brute_force(Decimal('12.50'), 0.0, 10, Decimal('12.50'))
+        self.assert_same_as_brute_force(Decimal('12.50'), 8.5, 0, Decimal('100'))
+        self.assert_same_as_brute_force(Decimal('33.33'), 10.3, 1000, Decimal('99999.99'))
+        self.assert_same_as_brute_force(Decimal('-5.00'), 6.0, 10, Decimal('0'))
@@ -0,0 +1,144 @@
+import time
+
+from django.contrib.auth.models import AnonymousUser
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from mooringlicensing.queue_middleware import QueueControl, QueueDecisionCache
+from mooringlicensing.tests.fake_server import FakeServer
+
+
+class FakeQueueServer(FakeServer):
+    """
+    A local stand-in for the queue service, answering every check-create-session with the given status and a waiting
+    room of its own
+    """
+    def __init__(self, status='Active', delay=0):
+        super().__init__(self.check_create_session, delay)
+        self.status = status
+
+    def check_create_session(self, path):
+        return {'status': self.status, 'session_key': 'abcdefghij', 'queue_waiting_room_url': 'https://queue.example.com/waiting/{}'.format(len(self.hits))}
+
+
+@override_settings(
+    WAITING_QUEUE_ENABLED=False,
+    QUEUE_GROUP_NAME='mooringlicensing',
+    QUEUE_WAITING_URL='https://queue.example.com/',
+    QUEUE_ACTIVE_HOSTS='mooring.example.com',
+    QUEUE_DOMAIN='example.com',
+    QUEUE_WAITING_CACHE_SECONDS=5,
+    QUEUE_REQUEST_TIMEOUT=0.2,
+    QUEUE_FAILURE_THRESHOLD=2,
+    QUEUE_OPEN_CIRCUIT_SECONDS=60,
+    QUEUE_BACKGROUND_CHECKS=2,
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+)
+class QueueControlTests(SimpleTestCase):
+
+    def setUp(self):
+        self.middleware = QueueControl(lambda request: HttpResponse('OK'))
+        self.cache = QueueDecisionCache()
+        self.patch_cache()
+
+    def patch_cache(self):
+        import mooringlicensing.queue_middleware as queue_middleware
+        original = queue_middleware.queue_decision_cache
+        queue_middleware.queue_decision_cache = self.cache
+        self.addCleanup(setattr, queue_middleware, 'queue_decision_cache', original)
+
+    def wait_for_checks(self, timeout=5):
+        deadline = time.monotonic() + timeout
+        while self.cache.checks_in_progress and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(self.cache.checks_in_progress, 0)
+
+    def get(self, cookies=None):
+        request = RequestFactory().get('/', HTTP_HOST='mooring.example.com')
+        request.user = AnonymousUser()
+        request.COOKIES.update(cookies or {})
+        with self.settings(WAITING_QUEUE_ENABLED=True):
+            return self.middleware(request)
+
+    def test_new_visitor_is_let_in_and_gets_the_session_cookie_next(self):
+        with FakeQueueServer('Active') as server, self.settings(QUEUE_BACKEND_URL=server.url):
+            response = self.get()
+            self.assertEqual(response.content, b'OK')
+            pending = response.cookies['sitequeuepending'].value
+            self.wait_for_checks()
+            self.assertEqual(len(server.hits), 1)
+
+            response = self.get(cookies={'sitequeuepending': pending})
+            self.assertEqual(response.content, b'OK')
+            self.assertEqual(response.cookies['sitequeuesession'].value, 'abcdefghij')
+            self.assertEqual(len(server.hits), 1)
+
+    def test_session_cookie_is_admitted_locally(self):
+        with FakeQueueServer('Active') as server, self.settings(QUEUE_BACKEND_URL=server.url):
+            response = self.get(cookies={'sitequeuesession': 'abcdefghij'})
+            self.assertEqual(response.content, b'OK')
+            self.assertEqual(len(server.hits), 0)
+
+    def test_waiting_visitor_is_redirected_on_the_next_request(self):
+        with FakeQueueServer('Waiting') as server, self.settings(QUEUE_BACKEND_URL=server.url):
+            pending = self.get().cookies['sitequeuepending'].value
+            self.wait_for_checks()
+            response = self.get(cookies={'sitequeuepending': pending})
+            self.assertIn(b'https://queue.example.com/waiting/1', response.content)
+
+    def test_full_queue_sends_new_visitors_to_their_own_waiting_room(self):
+        with FakeQueueServer('Waiting') as server, self.settings(QUEUE_BACKEND_URL=server.url):
+            self.get()
+            self.wait_for_checks()
+            self.assertTrue(self.cache.is_queue_full())
+            # The next visitors are checked before being let in
+            for i in range(2, 5):
+                response = self.get()
+                self.assertIn('https://queue.example.com/waiting/{}'.format(i).encode(), response.content)
+            self.assertEqual(len(server.hits), 4)
+
+    def test_cached_full_queue_expires(self):
+        with FakeQueueServer('Waiting') as server, self.settings(QUEUE_BACKEND_URL=server.url, QUEUE_WAITING_CACHE_SECONDS=0):
+            self.get()
+            self.wait_for_checks()
+            server.status = 'Active'
+            response = self.get()
+            self.assertEqual(response.content, b'OK')
+            self.wait_for_checks()
+            self.assertEqual(len(server.hits), 2)
+            self.assertFalse(self.cache.is_queue_full())
+
+    def test_background_checks_are_bounded(self):
+        with FakeQueueServer('Active', delay=0.5) as server, self.settings(QUEUE_BACKEND_URL=server.url, QUEUE_REQUEST_TIMEOUT=2):
+            responses = [self.get() for i in range(5)]
+            for response in responses:
+                self.assertEqual(response.content, b'OK')
+            # The visitors over QUEUE_BACKGROUND_CHECKS are asked for on a later request
+            self.assertEqual(len([response for response in responses if 'sitequeuepending' in response.cookies]), 2)
+            self.wait_for_checks()
+            self.assertEqual(len(server.hits), 2)
+
+    def test_visitor_asked_for_on_another_host_is_asked_for_again(self):
+        with FakeQueueServer('Active') as server, self.settings(QUEUE_BACKEND_URL=server.url):
+            response = self.get(cookies={'sitequeuepending': 'unknown'})
+            self.assertEqual(response.content, b'OK')
+            self.assertNotEqual(response.cookies['sitequeuepending'].value, 'unknown')
+            self.wait_for_checks()
+            self.assertEqual(len(server.hits), 1)
+
+    def test_slow_queue_service_does_not_delay_new_visitors(self):
+        with FakeQueueServer('Active', delay=1) as server, self.settings(QUEUE_BACKEND_URL=server.url):
+            started = time.monotonic()
+            for i in range(5):
+                response = self.get()
+                self.assertEqual(response.content, b'OK')
+            self.assertLess(time.monotonic() - started, 0.5)
+
+            # Two timeouts open the circuit, after which the queue service isn't asked
+            self.wait_for_checks()
+            self.assertTrue(self.cache.is_circuit_open())
+            hits = len(server.hits)
+            response = self.get()
+            self.assertEqual(response.content, b'OK')
+            self.wait_for_checks()
+            self.assertEqual(len(server.hits), hits)
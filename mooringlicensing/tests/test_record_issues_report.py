@@ -0,0 +1,34 @@
+from django.test import SimpleTestCase
+
+from mooringlicensing.management.commands.utils import run_record_issue_checks
+
+
+def check_approvals(approvals):
+    return ("Approvals:", (number for number in approvals))
+
+def check_stickers(stickers):
+    return ("Stickers:", stickers)
+
+def check_failing(proposals):
+    raise ValueError('failed')
+
+
+class RunRecordIssueChecksTests(SimpleTestCase):
+
+    def test_reports_in_check_order(self):
+        reports = run_record_issue_checks({
+            check_stickers: [['S1', 'S2']],
+            check_approvals: [['ML1']],
+        }, max_workers=2)
+        self.assertEqual(list(reports), ['check_stickers', 'check_approvals'])
+        self.assertEqual(reports['check_stickers'], ("Stickers:", ['S1', 'S2']))
+        # The findings are evaluated by the worker
+        self.assertEqual(reports['check_approvals'], ("Approvals:", ['ML1']))
+
+    def test_failed_check_left_out(self):
+        with self.assertLogs('cron_tasks', level='ERROR'):
+            reports = run_record_issue_checks({
+                check_failing: [[]],
+                check_approvals: [['ML1']],
+            }, max_workers=2)
+        self.assertEqual(list(reports), ['check_approvals'])
@@ -15,6 +15,12 @@ then
 
 fi
 
+if [ "$ENABLE_QUEUE_WORKER" == "True" ];
+then
+	echo "Starting JobQueue worker"
+	python /app/manage_ml.py run_queue_worker >> /app/logs/run_queue_worker.log 2>&1 &
+fi
+
 if [ $ENABLE_WEB == "True" ];
 	    then
 		    echo "Starting Gunicorn"